@@ -0,0 +1,101 @@
+"""
+Schedule analytics benchmark.
+
+Generates users with many timed events (working-hours meetings with overlaps and back-to-back runs, plus
+some evening ones) and times the report's schedule table: reading the events into arrays, the vectorized
+per-day statistics, and rendering the table.
+
+Usage: python -m benchmarks.bench_analytics [--events 100000] [--days 365] [--iterations 5] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+from calmind.config import AnalyticsConfig
+from calmind.reporting.analytics import analyze_schedule, event_arrays
+
+logger = logging.getLogger(__name__)
+
+
+def make_events(count: int, first_day: date, days: int, timezone: str, seed: int) -> list:
+    """Normalized event JSON lines, as the pipeline spools them."""
+    rng = random.Random(seed)
+    tz = pytz.timezone(timezone)
+    lines = []
+    for i in range(count):
+        day = first_day + timedelta(days=rng.randrange(days))
+        hour = rng.randint(19, 21) if rng.random() < 0.05 else rng.randint(8, 17)
+        start = tz.localize(datetime(day.year, day.month, day.day, hour, rng.choice((0, 15, 30, 45))))
+        end = start + timedelta(minutes=rng.choice((15, 30, 30, 45, 60, 60, 90)))
+        lines.append(json.dumps({"id": f"event-{i}", "summary": "Meeting", "start": start.isoformat(), "end": end.isoformat(),
+                                 "location": None, "description": None}) + "\n")
+    return lines
+
+
+def _timed(function, iterations: int):
+    durations, result = [], None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = function()
+        durations.append((time.perf_counter() - started) * 1000)
+    return result, round(statistics.median(durations), 2)
+
+
+def run(args) -> dict:
+    config = AnalyticsConfig()
+    first_day = date.today()
+    lines = make_events(args.events, first_day, args.days, args.timezone, args.seed)
+    (starts, ends), read_ms = _timed(lambda: event_arrays(lines, args.timezone), args.iterations)
+    analytics, analyze_ms = _timed(lambda: analyze_schedule(starts, ends, first_day, args.days, args.timezone, config), args.iterations)
+    table, render_ms = _timed(lambda: analytics.to_markdown(config.work_days, config.max_table_days), args.iterations)
+    return {
+        "benchmark": "analytics",
+        "params": vars(args),
+        "events": len(starts),
+        "read_ms": read_ms,
+        "analyze_ms": analyze_ms,
+        "render_ms": render_ms,
+        "total_ms": round(read_ms + analyze_ms + render_ms, 2),
+        "meeting_hours": round(float(analytics.meeting_hours.sum()), 1),
+        "focus_hours": round(float(analytics.focus_hours.sum()), 1),
+        "table": table,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100_000, help="Timed events of the user.")
+    parser.add_argument('--days', type=int, default=365, help="Days the events are spread over.")
+    parser.add_argument('--timezone', default="Europe/Berlin")
+    parser.add_argument('--iterations', type=int, default=5, help="Runs per step; the median is reported.")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    result = run(args)
+    print(f"\n{result['events']} events over {args.days} days ({result['meeting_hours']}h of meetings, {result['focus_hours']}h of focus time)\n")
+    print(f"{'step':<26}{'median ms':>10}")
+    for step, key in (("read into arrays", "read_ms"), ("per-day statistics", "analyze_ms"), ("render table", "render_ms"), ("total", "total_ms")):
+        print(f"{step:<26}{result[key]:>10}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
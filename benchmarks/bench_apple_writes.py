@@ -0,0 +1,101 @@
+"""
+Apple Calendar write benchmark.
+
+Imports a schedule into the local CalDAV stand-in (see benchmarks/e2e): creates new events, updates and
+deletes fetched ones, once one call at a time with `create_event`/`update_event`/`delete_event` and once
+as a single `write_events` batch. Reports the time and CalDAV requests each way takes.
+
+Usage: python -m benchmarks.bench_apple_writes [--events 300] [--latency-ms 20] [--max-concurrent-writes 8] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.e2e.datagen import generate_dataset
+from benchmarks.e2e.servers import FakeCalDAVServer
+from calmind.calendars.apple_calendar import AppleCalendar
+from calmind.config import AppleCalendarConfig
+
+logger = logging.getLogger(__name__)
+
+
+def make_operations(existing: list, count: int, seed_time: datetime) -> list:
+    """A third each of creates, updates of existing events and deletes of existing events."""
+    per_action = count // 3
+    starts = [seed_time + timedelta(hours=i) for i in range(per_action)]
+    operations = [{"action": "create", "summary": f"Imported {i}", "start_time": start, "end_time": start + timedelta(minutes=30)}
+                  for i, start in enumerate(starts)]
+    operations += [{"action": "update", "event_id": event_id, "summary": f"Updated {i}"} for i, event_id in enumerate(existing[:per_action])]
+    operations += [{"action": "delete", "event_id": event_id} for event_id in existing[per_action:2 * per_action]]
+    return operations
+
+
+def _write_serially(calendar: AppleCalendar, operations: list):
+    for operation in operations:
+        fields = {key: value for key, value in operation.items() if key != "action"}
+        getattr(calendar, f"{operation['action']}_event")(**fields)
+
+
+def _run(mode: str, args) -> dict:
+    dataset = generate_dataset(1, args.events * 2, 0.0, 1, 0, 30, args.seed)
+    user = dataset.users[0]
+    server = FakeCalDAVServer(dataset, args.latency_ms).start()
+    try:
+        config = AppleCalendarConfig(name="bench", username="bench@example.com", password="bench", url=server.user_url(user.user_id),
+                                     calendar_name=next(iter(user.caldav_calendars)), max_concurrent_writes=args.max_concurrent_writes)
+        calendar = AppleCalendar("bench", config)
+        calendar.authenticate()
+        now = datetime.now(timezone.utc)
+        existing = sorted({event["id"] for event in calendar.iter_events(now - timedelta(days=365), now + timedelta(days=365), include_raw=False)})
+        operations = make_operations(existing, args.events, now.replace(minute=0, second=0, microsecond=0))
+        requests_before = server.request_count
+        started = time.perf_counter()
+        if mode == "serial":
+            _write_serially(calendar, operations)
+            failed = 0
+        else:
+            failed = sum(result["status"] != "success" for result in calendar.write_events(operations))
+        elapsed = time.perf_counter() - started
+        return {"operations": len(operations), "seconds": round(elapsed, 3), "operations_per_second": round(len(operations) / elapsed, 1),
+                "requests": server.request_count - requests_before, "failed": failed}
+    finally:
+        server.stop()
+
+
+def run(args) -> dict:
+    return {"benchmark": "apple_writes", "params": vars(args), "serial": _run("serial", args), "batch": _run("batch", args)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=300, help="Write operations, split evenly between create, update and delete.")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Latency of every CalDAV request.")
+    parser.add_argument('--max-concurrent-writes', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    result = run(args)
+    print(f"\n{result['batch']['operations']} event writes at {args.latency_ms} ms per CalDAV request:\n")
+    print(f"{'mode':<10}{'seconds':>10}{'writes/s':>10}{'requests':>10}{'failed':>8}")
+    for mode in ("serial", "batch"):
+        stats = result[mode]
+        print(f"{mode:<10}{stats['seconds']:>10}{stats['operations_per_second']:>10}{stats['requests']:>10}{stats['failed']:>8}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Local event store benchmark.
+
+Fills an EventStore with the synthetic users' events (the same generator as the e2e harness), then
+times the queries the web app serves: one day of a user's schedule, a week, and full-text searches.
+
+Before timing, it checks that all-day events from Google (via GoogleCalendar's event conversion) and
+CalDAV are returned for their date in several timezones.
+
+Usage: python -m benchmarks.bench_event_store [--users 50] [--events-per-user 400] [--queries 200] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from benchmarks.e2e.datagen import WORDS, generate_dataset
+from calmind.calendars.event_store import EventStore
+from calmind.calendars.google_calendar import GoogleCalendar
+from calmind.reporting.fingerprint import EVENT_FIELDS, normalize_item
+
+logger = logging.getLogger(__name__)
+
+
+def _normalized(event) -> dict:
+    return {"id": event.uid, "summary": event.summary, "start": event.start.isoformat(), "end": event.end.isoformat(),
+            "location": event.location, "description": event.description}
+
+
+def fill(store: EventStore, dataset, days: int) -> float:
+    window_start = datetime.now(timezone.utc) - timedelta(days=1)
+    window_end = window_start + timedelta(days=days + 2)
+    started = time.perf_counter()
+    for user in dataset.users:
+        store.replace_events(user.name, "Google", (_normalized(instance) for event in user.google_events for instance in event.instances()),
+                             window_start, window_end)
+        for calendar, events in user.caldav_calendars.items():
+            store.replace_events(user.name, f"iCloud/{calendar}", (_normalized(instance) for event in events for instance in event.instances()),
+                                 window_start, window_end)
+    return time.perf_counter() - started
+
+
+def check_all_day_events(store: EventStore):
+    """Stores a Google and a CalDAV all-day event the way a fetch does and checks that `events_on` finds both."""
+    day = date(2026, 10, 20)
+    google_event = GoogleCalendar._to_calendar_event({"id": "google-all-day", "summary": "Offsite",
+                                                      "start": {"date": "2026-10-20"}, "end": {"date": "2026-10-21"}})
+    caldav_event = {"id": "caldav-all-day", "summary": "Holiday", "start": day, "end": day + timedelta(days=1)}
+    window_start = datetime(2026, 10, 19, tzinfo=timezone.utc)
+    store.replace_events("all-day-check", "check", [normalize_item(event, EVENT_FIELDS) for event in (google_event, caldav_event)],
+                         window_start, window_start + timedelta(days=3))
+    for timezone_name in ("UTC", "America/New_York", "Asia/Tokyo"):
+        for on_day, expected in ((day - timedelta(days=1), set()), (day, {"google-all-day", "caldav-all-day"}), (day + timedelta(days=1), set())):
+            found = {event.id for event in store.events_on("all-day-check", on_day, timezone_name)}
+            if found != expected:
+                raise RuntimeError(f"All-day events on {on_day} in {timezone_name}: expected {sorted(expected)}, got {sorted(found)}")
+
+
+def time_queries(name: str, queries: list) -> dict:
+    durations, results = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        results += len(query())
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return {
+        "query": name,
+        "count": len(durations),
+        "p50_ms": round(statistics.median(durations), 3),
+        "p99_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.99))], 3),
+        "avg_results": round(results / len(durations), 1),
+    }
+
+
+def run(args) -> dict:
+    dataset = generate_dataset(args.users, args.events_per_user, args.recurrence_density, args.calendars_per_user, 0, args.days, args.seed)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="calmind-events-") as workdir:
+        store = EventStore(os.path.join(workdir, "events.sqlite3"), retention_days=None)
+        check_all_day_events(store)
+        fill_seconds = fill(store, dataset, args.days)
+        total = store.count()
+        today = datetime.now(timezone.utc).date()
+        users = [user.name for user in dataset.users]
+
+        def pick_day():
+            return today + timedelta(days=rng.randrange(args.days))
+
+        results = [
+            time_queries("day", [lambda u=rng.choice(users), d=pick_day(): store.events_on(u, d, "Europe/Berlin")
+                                 for _ in range(args.queries)]),
+            time_queries("week", [lambda u=rng.choice(users), d=pick_day(): store.events_between(
+                                      u, datetime(d.year, d.month, d.day, tzinfo=timezone.utc), datetime(d.year, d.month, d.day, tzinfo=timezone.utc) + timedelta(days=7))
+                                  for _ in range(args.queries)]),
+            time_queries("search 1 word", [lambda u=rng.choice(users), w=rng.choice(WORDS): store.search(u, w)
+                                           for _ in range(args.queries)]),
+            time_queries("search 2 words", [lambda u=rng.choice(users), q=f"{rng.choice(WORDS)} {rng.choice(WORDS)[:4]}": store.search(u, q)
+                                            for _ in range(args.queries)]),
+        ]
+        size_mb = os.path.getsize(store.path) / (1024 * 1024)
+        store.close()
+    return {"benchmark": "event_store", "params": vars(args), "events": total, "fill_seconds": round(fill_seconds, 3),
+            "events_per_second": round(total / fill_seconds), "size_mb": round(size_mb, 2), "queries": results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--events-per-user', type=int, default=400, help="Base events (recurring series count once).")
+    parser.add_argument('--recurrence-density', type=float, default=0.2)
+    parser.add_argument('--calendars-per-user', type=int, default=3)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--queries', type=int, default=200, help="Queries per kind.")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    result = run(args)
+    print(f"\n{result['events']} events for {args.users} users stored in {result['fill_seconds']}s "
+          f"({result['events_per_second']} events/s, {result['size_mb']} MB)\n")
+    print(f"{'query':<16}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'avg results':>13}")
+    for query in result["queries"]:
+        print(f"{query['query']:<16}{query['count']:>7}{query['p50_ms']:>10}{query['p99_ms']:>10}{query['avg_results']:>13}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
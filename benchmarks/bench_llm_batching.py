@@ -0,0 +1,126 @@
+"""
+LLM request packing benchmark.
+
+Runs a nightly batch of small users (a few events and cards each) against the local stand-in servers
+(see benchmarks/e2e) in four modes and reports users per minute and LLM requests:
+
+    sequential  one user at a time, one LLM request per summary (the default configuration)
+    concurrent  `--concurrent-users` users at a time, one LLM request per summary
+    packed      as concurrent, with the summaries of users in flight packed into shared requests (llm.batch)
+    offline     as packed, sent as offline batch jobs that the stand-in finishes after `--batch-latency-ms`
+
+The stand-in's latency is `--llm-latency-ms` per request plus `--output-ms-per-kb` per KB of answer, and it
+serves `--llm-slots` generateContent requests at a time, standing in for the API's rate limits. Packing
+saves the per-request overhead and slots, but not the generation time.
+
+Usage: python -m benchmarks.bench_llm_batching [--users 60] [--concurrent-users 20] [--modes sequential packed] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.e2e.datagen import generate_dataset
+from benchmarks.e2e.harness import write_config
+from benchmarks.e2e.servers import FakeCalDAVServer, FakeGoogleCalendarServer, FakeLLMServer, FakeTrelloServer, SMTPSink
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sequential", "concurrent", "packed", "offline")
+
+
+def _mode_config(mode: str, args):
+    pipeline = {"concurrent_users": 1 if mode == "sequential" else args.concurrent_users}
+    batch = {"enabled": mode in ("packed", "offline"), "offline": mode == "offline", "max_pack_prompts": args.max_pack_prompts,
+             "max_wait_seconds": args.max_wait_seconds, "offline_max_prompts": args.concurrent_users,
+             "offline_wait_seconds": args.max_wait_seconds, "offline_poll_seconds": 0.2}
+    return pipeline, {"batch": batch}
+
+
+def run_mode(mode: str, args) -> dict:
+    from calmind.main import CalMindApp
+    from calmind.monitoring import metrics
+
+    dataset = generate_dataset(args.users, args.events_per_user, 0.0, 1, args.cards_per_user, 30, args.seed)
+    servers = {
+        "google": FakeGoogleCalendarServer(dataset).start(),
+        "caldav": FakeCalDAVServer(dataset).start(),
+        "trello": FakeTrelloServer(dataset).start(),
+        "llm": FakeLLMServer(dataset, args.llm_latency_ms, summary_kb=1, output_ms_per_kb=args.output_ms_per_kb,
+                             batch_latency_ms=args.batch_latency_ms, max_concurrent=args.llm_slots).start(),
+        "smtp": SMTPSink().start(),
+    }
+    packed_before = {result: metrics.LLM_PACKED_PROMPTS.value(mode=mode, result=result) for result in ("answered", "fallback")}
+    try:
+        with tempfile.TemporaryDirectory(prefix="calmind-llm-batch-") as workdir:
+            pipeline, llm = _mode_config(mode, args)
+            # All synthetic users share a mail domain; lift its rate limit so the run times the reports, not the outbox.
+            app = CalMindApp(config_path=write_config(workdir, dataset, servers, pipeline=pipeline, llm=llm,
+                                                      outbox={"rate_per_domain_per_minute": 100_000}))
+            started = time.perf_counter()
+            summary = app.run()
+            elapsed = time.perf_counter() - started
+            if app.email_delivery:
+                app.email_delivery.stop()
+    finally:
+        for server in servers.values():
+            server.stop()
+    llm_server = servers["llm"]
+    return {
+        "users": len(summary.users),
+        "ok": summary.counts()["ok"],
+        "seconds": round(elapsed, 2),
+        "users_per_minute": round(len(summary.users) / elapsed * 60, 1),
+        "llm_http_requests": llm_server.request_count,
+        "llm_generate_requests": llm_server.generate_requests,
+        "llm_batch_jobs": llm_server.batches_created,
+        "packed_answered": int(metrics.LLM_PACKED_PROMPTS.value(mode="offline" if mode == "offline" else "online", result="answered")
+                               - packed_before["answered"]) if mode in ("packed", "offline") else 0,
+    }
+
+
+def run(args) -> dict:
+    return {"benchmark": "llm_batching", "params": vars(args), "modes": {mode: run_mode(mode, args) for mode in args.modes}}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=60)
+    parser.add_argument('--events-per-user', type=int, default=5)
+    parser.add_argument('--cards-per-user', type=int, default=3)
+    parser.add_argument('--concurrent-users', type=int, default=20)
+    parser.add_argument('--max-pack-prompts', type=int, default=10)
+    parser.add_argument('--max-wait-seconds', type=float, default=1.0)
+    parser.add_argument('--llm-latency-ms', type=float, default=800.0, help="Stand-in latency per generateContent request.")
+    parser.add_argument('--output-ms-per-kb', type=float, default=100.0, help="Stand-in generation time per KB of answer.")
+    parser.add_argument('--llm-slots', type=int, default=4, help="generateContent requests the stand-in serves at a time (0: unlimited).")
+    parser.add_argument('--batch-latency-ms', type=float, default=3000.0, help="Time the stand-in takes to finish a batch job.")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import calmind.main # noqa: F401 - configures logging on import; quieten it afterwards
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run(args)
+    print(f"\n{args.users} users with {args.events_per_user} events and {args.cards_per_user} cards each:\n")
+    print(f"{'mode':<12}{'seconds':>9}{'users/min':>11}{'LLM requests':>14}{'batch jobs':>12}{'packed':>8}{'ok':>6}")
+    for mode, stats in result["modes"].items():
+        print(f"{mode:<12}{stats['seconds']:>9}{stats['users_per_minute']:>11}{stats['llm_generate_requests']:>14}"
+              f"{stats['llm_batch_jobs']:>12}{stats['packed_answered']:>8}{stats['ok']:>6}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
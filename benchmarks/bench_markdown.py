@@ -0,0 +1,105 @@
+"""
+Markdown rendering throughput benchmark.
+
+Renders synthetic LLM-style summaries of 10-50 KB with every available markdown backend, both
+cold (no cache) and from a warm content-hash cache, and prints throughput per backend.
+
+Usage: python -m benchmarks.bench_markdown [--sizes 10 25 50] [--iterations 20] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from calmind.reporting.markdown_renderer import BACKENDS, MarkdownRenderer
+
+logger = logging.getLogger(__name__)
+
+WORDS = ("review roadmap sync budget quarterly client launch hiring design standup retro planning "
+         "deadline travel offsite interview metrics dashboard migration release onboarding").split()
+
+
+def _sentence(rng: random.Random, length: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def make_summary(target_kb: int, seed: int = 42) -> str:
+    """Builds a summary shaped like the LLM output: timeframe sections, bullets, tables and code."""
+    rng = random.Random(seed)
+    parts = []
+    day = 0
+    while sum(len(p) for p in parts) < target_kb * 1024:
+        day += 1
+        parts.append(f"## Day {day}: {_sentence(rng, 4)}\n")
+        for _ in range(rng.randint(3, 8)):
+            parts.append(f"*   **{rng.randint(8, 18):02d}:{rng.choice(['00', '30'])}** - {_sentence(rng)} "
+                         f"Location: *{rng.choice(WORDS).title()} Room*. {_sentence(rng, 8)}\n")
+        parts.append("\n| Time | Event | Notes |\n|------|-------|-------|\n")
+        for _ in range(rng.randint(2, 5)):
+            parts.append(f"| {rng.randint(8, 18):02d}:00 | {_sentence(rng, 3)} | {_sentence(rng, 6)} |\n")
+        if day % 4 == 0:
+            parts.append("\n```\nPrep: " + _sentence(rng, 10) + "\n```\n")
+        parts.append("\n> **Tip:** " + _sentence(rng, 18) + "\n\n")
+    return "".join(parts)
+
+
+def bench_backend(name: str, documents: list, iterations: int) -> dict:
+    cold = MarkdownRenderer(backend=name, cache_size=0)
+    if cold.backend.name != name:
+        return None
+
+    total_bytes = sum(len(doc.encode('utf-8')) for doc in documents) * iterations
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for doc in documents:
+            cold.render(doc)
+    cold_seconds = time.perf_counter() - started
+
+    cached = MarkdownRenderer(backend=name, cache_size=len(documents))
+    for doc in documents:
+        cached.render(doc)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for doc in documents:
+            cached.render(doc)
+    cached_seconds = time.perf_counter() - started
+
+    renders = iterations * len(documents)
+    return {
+        "backend": name,
+        "renders": renders,
+        "cold_renders_per_second": round(renders / cold_seconds, 1),
+        "cold_mb_per_second": round(total_bytes / cold_seconds / 1e6, 2),
+        "cached_renders_per_second": round(renders / cached_seconds, 1),
+        "cache_hits": cached.hits,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 25, 50], help="Summary sizes in KB.")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    documents = [make_summary(size, seed=size) for size in args.sizes]
+    results = []
+    for name in BACKENDS:
+        result = bench_backend(name, documents, args.iterations)
+        if result is None:
+            print(f"{name:<12} not installed, skipped")
+            continue
+        results.append(result)
+        print(f"{name:<12} cold {result['cold_renders_per_second']:>8} renders/s ({result['cold_mb_per_second']} MB/s)"
+              f"  cached {result['cached_renders_per_second']:>10} renders/s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"sizes_kb": args.sizes, "iterations": args.iterations, "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Peak memory benchmark for the streaming fetch-to-prompt pipeline.
+
+Runs a single user against the local stand-in servers with a growing `days_to_fetch` (and proportionally
+more events), and measures CalMind's peak Python heap with tracemalloc. The servers run in a child
+process so their memory is not counted. The run fails if any peak exceeds the budget derived from the
+`pipeline` bounds, which doesn't depend on the data size.
+
+Usage:
+    python -m benchmarks.bench_streaming [--days 30 120 365] [--events-per-day 8] [--output results.json]
+    python -m benchmarks.bench_streaming --unbounded   # same data without memory bounds, for comparison
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import yaml
+
+from benchmarks.e2e.datagen import generate_dataset
+from benchmarks.e2e.harness import write_config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+SNAPSHOT_ITEM_BYTES = 2048 # Generous size of one normalized item held as a dict for delta summaries
+
+
+def _serve(dataset_args: dict, connection):
+    """Child process: starts the stand-in servers, reports their URLs and serves until told to stop."""
+    from benchmarks.e2e.servers import FakeCalDAVServer, FakeGoogleCalendarServer, FakeLLMServer, FakeTrelloServer, SMTPSink
+
+    logging.getLogger().setLevel(logging.WARNING)
+    dataset = generate_dataset(**dataset_args)
+    servers = {
+        "google": FakeGoogleCalendarServer(dataset).start(),
+        "caldav": FakeCalDAVServer(dataset).start(),
+        "trello": FakeTrelloServer(dataset).start(),
+        "llm": FakeLLMServer(dataset).start(),
+        "smtp": SMTPSink().start(),
+    }
+    connection.send({name: server.base_url if name != "smtp" else server.port for name, server in servers.items()})
+    connection.recv() # Blocks until the parent is done
+    connection.send({"llm_prompt_chars": servers["llm"].prompt_chars,
+                     "requests": {name: server.request_count for name, server in servers.items()}})
+    for server in servers.values():
+        server.stop()
+
+
+def _server_proxies(urls: dict) -> dict:
+    """Objects with the attributes `write_config` reads from the in-process servers."""
+    return {
+        "google": SimpleNamespace(api_endpoint=f"{urls['google']}/calendar/v3/"),
+        "caldav": SimpleNamespace(user_url=lambda user_id: f"{urls['caldav']}/caldav/{user_id}/"),
+        "trello": SimpleNamespace(api_base_url=f"{urls['trello']}/1"),
+        "llm": SimpleNamespace(base_url=urls["llm"]),
+        "smtp": SimpleNamespace(port=urls["smtp"]),
+    }
+
+
+def memory_budget_bytes(pipeline: dict, overhead_mb: float) -> int:
+    """
+    Upper bound for the pipeline's own allocations: both spools at their in-memory limit, the prompt held
+    up to three times (incremental buffer, final string, encoded API request), the previous and current
+    delta snapshots, plus a fixed per-run overhead (API clients, discovery documents, report rendering).
+    Spools and the prompt buffer are StringIO objects, which can use up to 4 bytes per character.
+    """
+    spools = 2 * 4 * pipeline["spool_memory_bytes"]
+    prompt = (4 + 1 + 1) * pipeline["max_prompt_chars"]
+    snapshots = 2 * pipeline["max_snapshot_items"] * SNAPSHOT_ITEM_BYTES
+    return spools + prompt + snapshots + int(overhead_mb * MB)
+
+
+def run_one(days: int, args, pipeline: dict) -> dict:
+    dataset_args = dict(users=1, events_per_user=days * args.events_per_day, recurrence_density=args.recurrence_density,
+                        calendars_per_user=args.calendars, cards_per_user=days * args.cards_per_day, days=days, seed=args.seed)
+    parent_connection, child_connection = multiprocessing.Pipe()
+    server_process = multiprocessing.Process(target=_serve, args=(dataset_args, child_connection), daemon=True)
+    server_process.start()
+    try:
+        urls = parent_connection.recv()
+        dataset = generate_dataset(**dict(dataset_args, events_per_user=0, cards_per_user=0)) # Names and ids only
+        with tempfile.TemporaryDirectory(prefix="calmind-stream-") as workdir:
+            config_path = write_config(workdir, dataset, _server_proxies(urls))
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f)
+            config["pipeline"] = pipeline
+            for source in config["users"][0]["sources"]:
+                if source["type"] == "apple":
+                    source["search_window_days"] = args.search_window_days
+            from calmind.main import CalMindApp
+
+            # Warm-up run over one day, so imports and one-time initialization are not measured.
+            config["users"][0]["days_to_fetch"] = 1
+            config["reporting"]["reports_dir"] = os.path.join(workdir, "warmup-reports")
+            with open(config_path, 'w', encoding='utf-8') as f:
+                yaml.safe_dump(config, f)
+            warmup = CalMindApp(config_path=config_path)
+            warmup.initialize_services()
+            warmup.run_for_user(warmup.config.get_users_config()[0])
+            warmup.report_generator.close()
+
+            config["users"][0]["days_to_fetch"] = days
+            config["reporting"]["reports_dir"] = os.path.join(workdir, "reports")
+            with open(config_path, 'w', encoding='utf-8') as f:
+                yaml.safe_dump(config, f)
+            app = CalMindApp(config_path=config_path)
+            app.initialize_services()
+            user = app.config.get_users_config()[0]
+
+            tracemalloc.start()
+            baseline, _ = tracemalloc.get_traced_memory()
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                app.run_for_user(user)
+            except Exception as e:
+                status = f"error: {e}"
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            app.report_generator.close()
+
+        parent_connection.send("stop")
+        server_stats = parent_connection.recv()
+    finally:
+        server_process.join(timeout=10)
+        if server_process.is_alive():
+            server_process.terminate()
+
+    return {
+        "days": days,
+        "events": dataset_args["events_per_user"],
+        "cards": dataset_args["cards_per_user"],
+        "status": status,
+        "seconds": round(seconds, 3),
+        "peak_mb": round((peak - baseline) / MB, 2),
+        "llm_prompt_chars": server_stats["llm_prompt_chars"],
+        "requests": server_stats["requests"],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 120, 365], help="days_to_fetch values to run.")
+    parser.add_argument('--events-per-day', type=int, default=8, help="Base events per day (recurring series count once).")
+    parser.add_argument('--cards-per-day', type=int, default=2)
+    parser.add_argument('--recurrence-density', type=float, default=0.1)
+    parser.add_argument('--calendars', type=int, default=2, help="CalDAV calendars for the user.")
+    parser.add_argument('--search-window-days', type=int, default=31)
+    parser.add_argument('--spool-memory-mb', type=float, default=1.0)
+    parser.add_argument('--max-prompt-chars', type=int, default=200_000)
+    parser.add_argument('--max-snapshot-items', type=int, default=1_000)
+    parser.add_argument('--overhead-mb', type=float, default=8.0, help="Fixed per-run allowance in the memory budget.")
+    parser.add_argument('--unbounded', action='store_true', help="Disable the memory bounds to compare against.")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    parser.add_argument('--verbose', action='store_true', help="Keep CalMind INFO logging.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import calmind.main # noqa: F401 - configures logging on import; quieten it afterwards
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    pipeline = {
+        "spool_memory_bytes": int(args.spool_memory_mb * MB),
+        "max_prompt_chars": args.max_prompt_chars,
+        "max_snapshot_items": args.max_snapshot_items,
+    }
+    if args.unbounded:
+        pipeline.update(spool_memory_bytes=1 << 40, max_prompt_chars=None, max_snapshot_items=1 << 40)
+        args.search_window_days = max(args.days)
+    budget = None if args.unbounded else memory_budget_bytes(pipeline, args.overhead_mb)
+
+    results = [run_one(days, args, pipeline) for days in sorted(args.days)]
+
+    print(f"\n{'days':>6}{'events':>9}{'cards':>8}{'seconds':>10}{'peak MB':>10}{'prompt chars':>14}  status")
+    for result in results:
+        print(f"{result['days']:>6}{result['events']:>9}{result['cards']:>8}{result['seconds']:>10}{result['peak_mb']:>10}"
+              f"{result['llm_prompt_chars']:>14}  {result['status']}")
+
+    failures = [f"days={r['days']}: {r['status']}" for r in results if r["status"] != "ok"]
+    if budget is not None:
+        print(f"\nMemory budget from pipeline bounds: {budget / MB:.2f} MB")
+        failures += [f"days={r['days']}: peak {r['peak_mb']} MB over budget" for r in results if r["peak_mb"] * MB > budget]
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if budget is not None and not failures:
+        print("PASS: peak memory stayed within the budget at every days_to_fetch")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"benchmark": "streaming", "params": vars(args), "pipeline": pipeline,
+                       "budget_mb": budget and round(budget / MB, 2), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Web app serving benchmark.
+
+Serves the web app against the local stand-in servers (see benchmarks/e2e) and fires concurrent
+POST /reports/run requests for the synthetic users. A request always has a user, and a quarter of the
+requests repeat a user already in flight. Meanwhile /metrics is polled to check that cheap routes stay
+responsive while reports run. The app is served either over ASGI (calmind.asgi with uvicorn) or by
+werkzeug's threaded WSGI server (what `python -m calmind.webapp` uses).
+
+Usage: python -m benchmarks.bench_webapp [--server asgi|wsgi] [--users 20] [--requests 80] [--concurrency 40] [--no-pool]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.e2e.datagen import generate_dataset
+from benchmarks.e2e.harness import percentile, write_config
+from benchmarks.e2e.servers import FakeCalDAVServer, FakeGoogleCalendarServer, FakeLLMServer, FakeTrelloServer, SMTPSink
+
+logger = logging.getLogger(__name__)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, port: int):
+    """Starts the web app in a background thread and returns a function stopping it."""
+    from calmind import webapp
+    if kind == "wsgi":
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", port, webapp.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return lambda: (server.shutdown(), webapp.shutdown())
+    import uvicorn
+    from calmind.asgi import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return stop
+
+
+def _post(url: str, user: str) -> float:
+    started = time.perf_counter()
+    request = urllib.request.Request(url, data=json.dumps({"user": user}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=600) as response:
+        payload = json.load(response)
+    if payload.get("status") not in ("ok", "unchanged"):
+        raise RuntimeError(f"Report for {user} returned {payload.get('status')}")
+    return time.perf_counter() - started
+
+
+def _poll_metrics(url: str, stop: threading.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+        latencies.append(time.perf_counter() - started)
+        stop.wait(0.05)
+
+
+def run(args) -> dict:
+    dataset = generate_dataset(args.users, args.events_per_user, 0.2, 3, 20, 30, args.seed)
+    servers = {
+        "google": FakeGoogleCalendarServer(dataset, args.source_latency_ms).start(),
+        "caldav": FakeCalDAVServer(dataset, args.source_latency_ms).start(),
+        "trello": FakeTrelloServer(dataset, args.source_latency_ms).start(),
+        "llm": FakeLLMServer(dataset, args.llm_latency_ms).start(),
+        "smtp": SMTPSink().start(),
+    }
+    rng = random.Random(args.seed)
+    users = [user.name for user in dataset.users]
+    requested = []
+    for i in range(args.requests):
+        repeat = requested and rng.random() < 0.25
+        requested.append(rng.choice(requested[-args.concurrency:]) if repeat else users[i % len(users)])
+    try:
+        with tempfile.TemporaryDirectory(prefix="calmind-webapp-") as workdir:
+            from calmind import webapp
+            webapp.CONFIG_PATH = write_config(workdir, dataset, servers,
+                                              pipeline={"client_idle_seconds": 0} if args.no_pool else None,
+                                              webapp={"max_concurrent_runs": args.max_concurrent_runs})
+            port = _free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            stop_server = start_server(args.server, port)
+            try:
+                started = time.perf_counter()
+                urllib.request.urlopen(f"{base_url}/metrics", timeout=60).read() # Lazy startup happens on the first request
+                startup_seconds = time.perf_counter() - started
+                stop_polling, metrics_latencies = threading.Event(), []
+                poller = threading.Thread(target=_poll_metrics, args=(f"{base_url}/metrics", stop_polling, metrics_latencies), daemon=True)
+                poller.start()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+                    latencies = list(clients.map(lambda user: _post(f"{base_url}/reports/run", user), requested))
+                elapsed = time.perf_counter() - started
+                stop_polling.set()
+                poller.join()
+                from calmind.monitoring import metrics
+                joined = metrics.REPORT_REQUESTS.value(result="joined")
+            finally:
+                stop_server()
+    finally:
+        for server in servers.values():
+            server.stop()
+    return {
+        "benchmark": "webapp",
+        "params": vars(args),
+        "startup_ms": round(startup_seconds * 1000, 1),
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(args.requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "joined_runs": int(joined),
+        "metrics_p50_ms": round(percentile(metrics_latencies, 0.5) * 1000, 1),
+        "metrics_p99_ms": round(percentile(metrics_latencies, 0.99) * 1000, 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=("asgi", "wsgi"), default="asgi")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--events-per-user', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=80)
+    parser.add_argument('--concurrency', type=int, default=40, help="Requests in flight at once.")
+    parser.add_argument('--max-concurrent-runs', type=int, default=8)
+    parser.add_argument('--source-latency-ms', type=float, default=20.0)
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0)
+    parser.add_argument('--no-pool', action='store_true', help="Authenticate source clients on every run.")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    import calmind.main # noqa: F401 - configures logging on import; quieten it afterwards
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run(args)
+    print(f"\n{args.requests} report requests for {args.users} users, {args.concurrency} at a time, over {args.server}:\n")
+    for label, key in (("first request (startup) ms", "startup_ms"), ("total seconds", "seconds"), ("requests/s", "requests_per_second"),
+                       ("report p50 ms", "p50_ms"), ("report p99 ms", "p99_ms"), ("joined a running report", "joined_runs"),
+                       ("/metrics p50 ms", "metrics_p50_ms"), ("/metrics p99 ms", "metrics_p99_ms")):
+        print(f"{label:<30}{result[key]:>10}")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+from benchmarks.e2e.harness import main
+
+main()
@@ -0,0 +1,135 @@
+"""Synthetic users, calendars and Trello boards for the end-to-end benchmark."""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+WORDS = ("review roadmap sync budget quarterly client launch hiring design standup retro planning "
+         "deadline travel offsite interview metrics dashboard migration release onboarding").split()
+LOCATIONS = ["Zoom", "Room 4B", "HQ Cafe", "Google Meet", "Client Office", None]
+
+
+@dataclass
+class SyntheticEvent:
+    uid: str
+    summary: str
+    start: datetime
+    end: datetime
+    location: str = None
+    description: str = None
+    weekly_occurrences: int = 1 # > 1 means a weekly recurring series
+
+    def instances(self) -> List["SyntheticEvent"]:
+        """Expands a recurring event into its individual occurrences (what Google returns with singleEvents)."""
+        return [
+            SyntheticEvent(f"{self.uid}_{i}", self.summary, self.start + timedelta(weeks=i), self.end + timedelta(weeks=i),
+                           self.location, self.description)
+            for i in range(self.weekly_occurrences)
+        ]
+
+    def to_google_json(self) -> dict:
+        item = {
+            "id": self.uid,
+            "status": "confirmed",
+            "summary": self.summary,
+            "start": {"dateTime": self.start.strftime('%Y-%m-%dT%H:%M:%SZ')},
+            "end": {"dateTime": self.end.strftime('%Y-%m-%dT%H:%M:%SZ')},
+        }
+        if self.location:
+            item["location"] = self.location
+        if self.description:
+            item["description"] = self.description
+        return item
+
+    def to_ical(self) -> str:
+        lines = [
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//CalMind//Benchmark//EN",
+            "BEGIN:VEVENT",
+            f"UID:{self.uid}@bench.calmind",
+            f"DTSTAMP:{self.start.strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTSTART:{self.start.strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTEND:{self.end.strftime('%Y%m%dT%H%M%SZ')}",
+            f"SUMMARY:{self.summary}",
+        ]
+        if self.weekly_occurrences > 1:
+            lines.append(f"RRULE:FREQ=WEEKLY;COUNT={self.weekly_occurrences}")
+        if self.location:
+            lines.append(f"LOCATION:{self.location}")
+        if self.description:
+            lines.append(f"DESCRIPTION:{self.description}")
+        lines += ["END:VEVENT", "END:VCALENDAR"]
+        return "\r\n".join(lines) + "\r\n"
+
+
+@dataclass
+class SyntheticUser:
+    user_id: str
+    name: str
+    email: str
+    google_events: List[SyntheticEvent] = field(default_factory=list)
+    caldav_calendars: Dict[str, List[SyntheticEvent]] = field(default_factory=dict)
+    trello_cards: List[dict] = field(default_factory=list)
+
+
+@dataclass
+class SyntheticDataset:
+    users: List[SyntheticUser]
+
+    def __post_init__(self):
+        self.by_id = {user.user_id: user for user in self.users}
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def _make_events(rng: random.Random, prefix: str, count: int, days: int, recurrence_density: float, now: datetime) -> List[SyntheticEvent]:
+    events = []
+    for i in range(count):
+        start = now + timedelta(days=rng.randrange(days), hours=rng.randint(7, 19), minutes=rng.choice([0, 15, 30, 45]))
+        recurring = rng.random() < recurrence_density
+        events.append(SyntheticEvent(
+            uid=f"{prefix}-{i}",
+            summary=_sentence(rng, rng.randint(2, 5)),
+            start=start,
+            end=start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90])),
+            location=rng.choice(LOCATIONS),
+            description=_sentence(rng, rng.randint(5, 40)) if rng.random() < 0.6 else None,
+            weekly_occurrences=max(2, days // 7) if recurring else 1,
+        ))
+    return events
+
+
+def _make_card(rng: random.Random, board_id: str, index: int) -> dict:
+    card_id = f"{board_id}c{index:06d}"
+    return {
+        "id": card_id, "name": _sentence(rng, rng.randint(2, 6)), "desc": _sentence(rng, rng.randint(0, 30)),
+        "due": None, "dueComplete": False, "closed": False, "url": f"https://trello.com/c/{card_id}",
+        "pos": index, "shortUrl": f"https://trello.com/c/{card_id}", "idMembers": [], "idLabels": [],
+        "idBoard": board_id, "idList": f"{board_id}l0", "idShort": index, "badges": {"checkItems": 0},
+        "idChecklists": [], "labels": [], "dateLastActivity": "2024-01-01T00:00:00.000Z", "customFieldItems": [],
+    }
+
+
+def generate_dataset(users: int, events_per_user: int, recurrence_density: float = 0.2, calendars_per_user: int = 3,
+                     cards_per_user: int = 20, days: int = 30, seed: int = 7) -> SyntheticDataset:
+    """
+    Builds a deterministic dataset. Each user's events are split evenly between one Google calendar
+    and `calendars_per_user` CalDAV calendars; `recurrence_density` is the fraction of events that
+    are weekly recurring series.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    dataset = []
+    for u in range(users):
+        user_id = f"u{u:05d}"
+        user = SyntheticUser(user_id, f"Bench User {u}", f"{user_id}@bench.example.com")
+        google_count = events_per_user // 2
+        user.google_events = _make_events(rng, f"{user_id}-g", google_count, days, recurrence_density, now)
+        caldav_count = events_per_user - google_count
+        for c in range(calendars_per_user):
+            share = caldav_count // calendars_per_user + (1 if c < caldav_count % calendars_per_user else 0)
+            user.caldav_calendars[f"cal{c}"] = _make_events(rng, f"{user_id}-a{c}", share, days, recurrence_density, now)
+        user.trello_cards = [_make_card(rng, f"{user_id}b", i) for i in range(cards_per_user)]
+        dataset.append(user)
+    return SyntheticDataset(dataset)
@@ -0,0 +1,324 @@
+"""
+End-to-end CalMind benchmark against local stand-in servers.
+
+Starts fake Google Calendar, CalDAV, Trello, SMTP and Gemini servers, generates synthetic users,
+runs `CalMindApp` over all of them and reports throughput, p50/p99 per-user latency and peak RSS
+for each pipeline stage. Results are written as JSON so runs can be compared.
+
+Usage:
+    python -m benchmarks.e2e --users 20 --events-per-user 200 --output bench_results/e2e.json
+    python -m benchmarks.e2e --users 20 --compare bench_results/e2e.json
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import yaml
+
+from benchmarks.e2e.datagen import generate_dataset
+from benchmarks.e2e.servers import FakeCalDAVServer, FakeGoogleCalendarServer, FakeLLMServer, FakeTrelloServer, SMTPSink
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class StageRecorder:
+    """Times calls to pipeline methods by temporarily wrapping them, per stage and per user."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.rss_after = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        rss = peak_rss_mb()
+        with self._lock:
+            self.durations[stage].append(seconds)
+            self.rss_after[stage] = max(self.rss_after[stage], rss)
+
+    @contextlib.contextmanager
+    def instrument(self, targets):
+        """`targets` is a list of (owner, attribute name, stage name)."""
+        originals = []
+        for owner, attribute, stage in targets:
+            original = getattr(owner, attribute)
+            originals.append((owner, attribute, original))
+            setattr(owner, attribute, self._wrap(original, stage))
+        try:
+            yield self
+        finally:
+            for owner, attribute, original in reversed(originals):
+                setattr(owner, attribute, original)
+
+    def _wrap(self, function, stage: str):
+        recorder = self
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.record(stage, time.perf_counter() - started)
+
+        def timed_generator(*args, **kwargs):
+            # Generators do their work while being consumed, so time the time spent inside them.
+            elapsed = 0.0
+            iterator = function(*args, **kwargs)
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    yield item
+            finally:
+                recorder.record(stage, elapsed)
+
+        wrapper = timed_generator if inspect.isgeneratorfunction(function) else timed
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, values in self.durations.items():
+            total = sum(values)
+            stages[stage] = {
+                "calls": len(values),
+                "total_seconds": round(total, 4),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "throughput_per_second": round(len(values) / total, 2) if total else None,
+                "peak_rss_mb": self.rss_after[stage],
+            }
+        return stages
+
+
+def pipeline_targets():
+    from calmind.calendars.apple_calendar import AppleCalendar
+    from calmind.calendars.google_calendar import GoogleCalendar
+    from calmind.emailing.sender import EmailSender
+    from calmind.llm.summarizer import LLMSummarizer
+    from calmind.main import CalMindApp
+    from calmind.reporting.generator import ReportGenerator
+    from calmind.trello.trello_client import TrelloService
+    from calmind.trello.trello_summarizer import TrelloSummarizer
+
+    return [
+        (CalMindApp, "run_for_user", "user_total"),
+        (GoogleCalendar, "authenticate", "google_auth"),
+        (GoogleCalendar, "iter_events", "google_fetch"),
+        (AppleCalendar, "authenticate", "caldav_auth"),
+        (AppleCalendar, "iter_events", "caldav_fetch"),
+        (TrelloService, "iter_cards", "trello_fetch"),
+        (LLMSummarizer, "summarize_events", "summarize_events"),
+        (TrelloSummarizer, "summarize_cards", "summarize_cards"),
+        (CalMindApp, "_schedule_analytics", "analytics"),
+        (ReportGenerator, "render_html_report", "render_html"),
+        (ReportGenerator, "render_md_report", "render_md"),
+        (CalMindApp, "_send_report", "email_queue"),
+        (EmailSender, "deliver", "email"),
+    ]
+
+
+def write_config(workdir: str, dataset, servers: dict, pipeline: dict = None, llm: dict = None, outbox: dict = None,
+                 webapp: dict = None) -> str:
+    token_path = os.path.join(workdir, "token.json")
+    with open(token_path, 'w', encoding='utf-8') as f:
+        json.dump({"token": "bench-token", "refresh_token": "bench-refresh", "client_id": "bench",
+                   "client_secret": "bench", "expiry": "2099-01-01T00:00:00Z", "scopes": ["https://www.googleapis.com/auth/calendar.readonly"]}, f)
+
+    users = []
+    for user in dataset.users:
+        users.append({
+            "name": user.name,
+            "report_to_email": user.email,
+            "sources": [
+                {"type": "google", "name": "Google", "calendar_ids": [f"{user.user_id}@bench"],
+                 "token_path": token_path, "api_endpoint": servers["google"].api_endpoint},
+                {"type": "apple", "name": "iCloud", "username": user.email, "password": "bench",
+                 "url": servers["caldav"].user_url(user.user_id)},
+                {"type": "trello", "name": "Trello", "api_key": "bench", "api_token": "bench",
+                 "board_id": f"{user.user_id}b", "api_base_url": servers["trello"].api_base_url},
+            ],
+        })
+    config = {
+        "email_sender": {"email": "bench@bench.example.com", "password": "bench", "smtp_server": "127.0.0.1",
+                         "smtp_port": servers["smtp"].port, "use_tls": False},
+        "llm": dict({"api_key": "bench-key", "api_endpoint": servers["llm"].base_url}, **(llm or {})),
+        "reporting": {"reports_dir": os.path.join(workdir, "reports"), "templates_dir": os.path.join(REPO_ROOT, "templates")},
+        "users": users,
+    }
+    if pipeline:
+        config["pipeline"] = pipeline
+    if outbox:
+        config["outbox"] = outbox
+    if webapp:
+        config["webapp"] = webapp
+    config_path = os.path.join(workdir, "config.yaml")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+    return config_path
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_benchmark(args) -> dict:
+    dataset = generate_dataset(args.users, args.events_per_user, args.recurrence_density, args.calendars_per_user,
+                               args.cards_per_user, args.days, args.seed)
+    servers = {
+        "google": FakeGoogleCalendarServer(dataset, args.source_latency_ms).start(),
+        "caldav": FakeCalDAVServer(dataset, args.source_latency_ms).start(),
+        "trello": FakeTrelloServer(dataset, args.source_latency_ms).start(),
+        "llm": FakeLLMServer(dataset, args.llm_latency_ms, args.summary_kb).start(),
+        "smtp": SMTPSink(args.smtp_latency_ms).start(),
+    }
+    try:
+        with tempfile.TemporaryDirectory(prefix="calmind-bench-") as workdir:
+            config_path = write_config(workdir, dataset, servers, pipeline={"concurrent_stages": not args.sequential_stages},
+                                       llm={"context_caching": not args.no_context_caching},
+                                       outbox={"enabled": not args.inline_email, "delivery_workers": args.email_workers})
+            from calmind.main import CalMindApp
+
+            recorder = StageRecorder()
+            rss_before = peak_rss_mb()
+            started = time.perf_counter()
+            with recorder.instrument(pipeline_targets()):
+                app = CalMindApp(config_path=config_path)
+                summary = app.run()
+            wall_seconds = time.perf_counter() - started
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    stages = recorder.summary()
+    counts = summary.counts()
+    return {
+        "benchmark": "e2e",
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "git_revision": git_revision(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "totals": {
+            "users": len(summary.users),
+            "ok": counts["ok"],
+            "unchanged": counts["unchanged"],
+            "skipped": counts["skipped"],
+            "errors": counts["error"],
+            "wall_seconds": round(wall_seconds, 3),
+            "users_per_second": round(len(summary.users) / wall_seconds, 3) if wall_seconds else None,
+            "user_p50_ms": stages.get("user_total", {}).get("p50_ms"),
+            "user_p99_ms": stages.get("user_total", {}).get("p99_ms"),
+            "peak_rss_mb": peak_rss_mb(),
+            "rss_before_mb": rss_before,
+        },
+        "stages": stages,
+        "server_requests": {name: server.request_count for name, server in servers.items()},
+        "llm_prompt_chars": servers["llm"].prompt_chars,
+        "llm_cached_prompt_chars": servers["llm"].cached_prompt_chars,
+        "llm_caches_created": servers["llm"].caches_created,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    print(f"\nComparison with baseline {baseline.get('git_revision')} ({baseline.get('timestamp')}):")
+    for key in ("users_per_second", "user_p50_ms", "user_p99_ms", "peak_rss_mb"):
+        old, new = baseline["totals"].get(key), current["totals"].get(key)
+        if old and new is not None:
+            print(f"  {key:<18} {old:>10} -> {new:>10} ({(new - old) / old * 100:+.1f}%)")
+    for stage, values in current["stages"].items():
+        old = baseline["stages"].get(stage, {}).get("p50_ms")
+        if old:
+            print(f"  {stage + ' p50_ms':<18} {old:>10} -> {values['p50_ms']:>10} ({(values['p50_ms'] - old) / old * 100:+.1f}%)")
+
+
+def print_report(result: dict):
+    totals = result["totals"]
+    print(f"\nUsers: {totals['users']} ({totals['ok']} ok, {totals['skipped']} skipped, {totals['errors']} errors) "
+          f"in {totals['wall_seconds']}s -> {totals['users_per_second']} users/s")
+    print(f"Per-user latency: p50 {totals['user_p50_ms']} ms, p99 {totals['user_p99_ms']} ms; peak RSS {totals['peak_rss_mb']} MB\n")
+    print(f"{'stage':<18}{'calls':>7}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}{'peak RSS MB':>13}")
+    for stage, values in sorted(result["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"{stage:<18}{values['calls']:>7}{values['p50_ms']:>10}{values['p99_ms']:>10}{values['total_seconds']:>10}{values['peak_rss_mb']:>13}")
+    print(f"\nServer requests: {result['server_requests']}")
+    print(f"LLM prompt characters: {result['llm_prompt_chars']} sent, {result['llm_cached_prompt_chars']} served from "
+          f"{result['llm_caches_created']} cached contexts")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--events-per-user', type=int, default=100, help="Base events (recurring series count once).")
+    parser.add_argument('--recurrence-density', type=float, default=0.2, help="Fraction of events that are weekly series.")
+    parser.add_argument('--calendars-per-user', type=int, default=3, help="CalDAV calendars per user.")
+    parser.add_argument('--cards-per-user', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--source-latency-ms', type=float, default=0.0, help="Added latency per calendar/Trello request.")
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0)
+    parser.add_argument('--smtp-latency-ms', type=float, default=0.0)
+    parser.add_argument('--summary-kb', type=int, default=4, help="Approximate size of each fake LLM summary.")
+    parser.add_argument('--sequential-stages', action='store_true', help="Run each user's pipeline stages one after the other.")
+    parser.add_argument('--inline-email', action='store_true', help="Send each report email at the end of its run instead of through the outbox.")
+    parser.add_argument('--email-workers', type=int, default=2, help="Outbox delivery workers.")
+    parser.add_argument('--no-context-caching', action='store_true', help="Send the summary instructions with every LLM request.")
+    parser.add_argument('--output', help="Write results as JSON to this path.")
+    parser.add_argument('--compare', help="Baseline results JSON to compare against.")
+    parser.add_argument('--verbose', action='store_true', help="Keep CalMind INFO logging.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result_args = argparse.Namespace(**{k: v for k, v in vars(args).items() if k != "verbose"})
+    import calmind.main # noqa: F401 - configures logging on import; quieten it afterwards
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    result = run_benchmark(result_args)
+    print_report(result)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(result, json.load(f))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,691 @@
+"""
+Local stand-in servers for the services CalMind talks to: Google Calendar REST, CalDAV, Trello,
+SMTP and the Gemini API. Each server runs on 127.0.0.1 with an ephemeral port in a background thread.
+"""
+import contextlib
+import json
+import logging
+import re
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email import message_from_bytes
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import icalendar
+
+from benchmarks.e2e.datagen import SyntheticDataset
+
+logger = logging.getLogger(__name__)
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CalMindBench/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, payload, status: int = 200):
+        self._send(status, json.dumps(payload).encode('utf-8'))
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under many concurrent clients, which then stall on SYN retries.
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (e.g. on a read timeout) are expected when simulating slow servers.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class BackgroundHTTPServer:
+    """Runs a ThreadingHTTPServer on an ephemeral localhost port until stopped."""
+
+    handler_class = _QuietHandler
+
+    def __init__(self, dataset: SyntheticDataset, latency_ms: float = 0.0):
+        self.dataset = dataset
+        self.latency_seconds = latency_ms / 1000.0
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        owner = self
+
+        class Handler(self.handler_class):
+            server_owner = owner
+
+        self.httpd = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def record_request(self):
+        with self._count_lock:
+            self.request_count += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"{type(self).__name__} listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _rfc3339(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_rfc3339(value: str):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+
+class _GoogleCalendarHandler(_QuietHandler):
+    # GET /calendar/v3/calendars/{calendarId}/events
+    path_pattern = re.compile(r"^/calendar/v3/calendars/(?P<calendar_id>[^/]+)/events$")
+
+    def do_GET(self):
+        self.server_owner.record_request()
+        url = urlparse(self.path)
+        match = self.path_pattern.match(url.path)
+        calendar_id = unquote(match.group("calendar_id")) if match else ""
+        user = self.server_owner.dataset.by_id.get(calendar_id.split("@")[0])
+        if not user:
+            self._send_json({"error": {"code": 404, "message": "Not Found"}}, status=404)
+            return
+        query = parse_qs(url.query)
+        time_min = _parse_rfc3339(query.get("timeMin", [None])[0])
+        time_max = _parse_rfc3339(query.get("timeMax", [None])[0])
+        items = []
+        for event in user.google_events:
+            for instance in event.instances():
+                if time_min and instance.end < time_min.replace(tzinfo=time_min.tzinfo or timezone.utc):
+                    continue
+                if time_max and instance.start > time_max.replace(tzinfo=time_max.tzinfo or timezone.utc):
+                    continue
+                items.append(instance)
+        items.sort(key=lambda e: e.start)
+        # Page tokens are plain offsets into the sorted result.
+        offset = int(query.get("pageToken", ["0"])[0])
+        page_size = int(query.get("maxResults", ["250"])[0])
+        page = items[offset:offset + page_size]
+        payload = {"kind": "calendar#events", "summary": calendar_id, "items": [e.to_google_json() for e in page]}
+        if offset + page_size < len(items):
+            payload["nextPageToken"] = str(offset + page_size)
+        self._send_json(payload)
+
+
+class FakeGoogleCalendarServer(BackgroundHTTPServer):
+    """Google Calendar v3 events.list stand-in. Calendar IDs are `<user_id>@bench`."""
+    handler_class = _GoogleCalendarHandler
+
+    @property
+    def api_endpoint(self) -> str:
+        return f"{self.base_url}/calendar/v3/"
+
+
+def _multistatus(responses) -> bytes:
+    """Builds a DAV multistatus body from (href, [prop xml]) pairs."""
+    parts = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<d:multistatus xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav" xmlns:cs="http://calendarserver.org/ns/">']
+    for href, props in responses:
+        parts.append(f"<d:response><d:href>{escape(href)}</d:href><d:propstat><d:prop>{''.join(props)}</d:prop>"
+                     "<d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>")
+    parts.append("</d:multistatus>")
+    return "".join(parts).encode('utf-8')
+
+
+class _CalDAVHandler(_QuietHandler):
+    # /caldav/{user}/                      -> context root
+    # /caldav/{user}/principal/            -> principal
+    # /caldav/{user}/calendars/            -> calendar home
+    # /caldav/{user}/calendars/{cal}/      -> calendar collection
+    # /caldav/{user}/calendars/{cal}/{ev}.ics -> event resource
+    path_pattern = re.compile(r"^/caldav/(?P<user>[^/]+)/(?P<kind>principal|calendars)?/?(?P<calendar>[^/]+)?/?(?P<event>[^/]+\.ics)?$")
+
+    def _resolve(self):
+        match = self.path_pattern.match(urlparse(self.path).path)
+        if not match:
+            return None, None
+        user = self.server_owner.dataset.by_id.get(match.group("user"))
+        return user, match.groupdict()
+
+    def _principal_props(self, user_id):
+        principal = f"/caldav/{user_id}/principal/"
+        return [f"<d:current-user-principal><d:href>{principal}</d:href></d:current-user-principal>",
+                f"<d:principal-URL><d:href>{principal}</d:href></d:principal-URL>",
+                f"<c:calendar-home-set><d:href>/caldav/{user_id}/calendars/</d:href></c:calendar-home-set>"]
+
+    def _calendar_props(self, name):
+        # Calendars named "tasks..." only hold VTODOs and "subscribed..." ones are read-only, like iCloud's
+        # Reminders lists and subscriptions.
+        component = "VTODO" if name.startswith("tasks") else "VEVENT"
+        privileges = "<d:privilege><d:read/></d:privilege>"
+        if not name.startswith("subscribed"):
+            privileges += "<d:privilege><d:write/></d:privilege>"
+        return ["<d:resourcetype><d:collection/><c:calendar/></d:resourcetype>",
+                f"<d:displayname>{escape(name)}</d:displayname>",
+                f'<c:supported-calendar-component-set><c:comp name="{component}"/></c:supported-calendar-component-set>',
+                f"<d:current-user-privilege-set>{privileges}</d:current-user-privilege-set>",
+                f'<cs:getctag>"{name}-ctag"</cs:getctag>']
+
+    def do_OPTIONS(self):
+        self.server_owner.record_request()
+        self._send(200, headers={"DAV": "1, 2, 3, calendar-access", "Allow": "OPTIONS, GET, PROPFIND, REPORT, PUT, DELETE"})
+
+    def do_PROPFIND(self):
+        self.server_owner.record_request()
+        self._read_body()
+        user, parts = self._resolve()
+        if not user:
+            self._send(404)
+            return
+        depth = self.headers.get("Depth", "0")
+        href = urlparse(self.path).path
+        responses = []
+        if parts["calendar"]:
+            responses.append((href, self._calendar_props(parts["calendar"])))
+        elif parts["kind"] == "calendars":
+            responses.append((href, ["<d:resourcetype><d:collection/></d:resourcetype>"] + self._principal_props(user.user_id)))
+            if depth != "0":
+                for name in user.caldav_calendars:
+                    responses.append((f"/caldav/{user.user_id}/calendars/{name}/", self._calendar_props(name)))
+        else:
+            responses.append((href, ["<d:resourcetype><d:collection/><d:principal/></d:resourcetype>",
+                                     f"<d:displayname>{escape(user.name)}</d:displayname>"] + self._principal_props(user.user_id)))
+        self._send(207, _multistatus(responses), content_type='application/xml; charset="utf-8"')
+
+    time_range_pattern = re.compile(rb'time-range[^>]*?start="(?P<start>[0-9TZ]+)"[^>]*?end="(?P<end>[0-9TZ]+)"')
+
+    def do_REPORT(self):
+        self.server_owner.record_request()
+        body = self._read_body()
+        user, parts = self._resolve()
+        events = user.caldav_calendars.get(parts["calendar"]) if user and parts["calendar"] else None
+        if events is None:
+            self._send(404)
+            return
+        time_range = self.time_range_pattern.search(body)
+        start = end = None
+        if time_range:
+            start, end = (datetime.strptime(time_range.group(name).decode(), '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+                          for name in ("start", "end"))
+            # A (recurring) event matches if any of its occurrences overlaps the range.
+            events = [event for event in events if any(i.start < end and i.end > start for i in event.instances())]
+        base = f"/caldav/{user.user_id}/calendars/{parts['calendar']}/"
+        written = self.server_owner.written_events(base, start, end)
+        # Like real servers, etags are only returned when the REPORT asks for them.
+        with_etag = b"getetag" in body
+        responses = [(f"{base}{event.uid}.ics", ([f'<d:getetag>"{event.uid}-1"</d:getetag>'] if with_etag else []) +
+                      [f"<c:calendar-data>{escape(event.to_ical())}</c:calendar-data>"])
+                     for event in events if f"{base}{event.uid}.ics" not in self.server_owner.written]
+        responses += [(href, ([f"<d:getetag>{escape(etag)}</d:getetag>"] if with_etag else []) +
+                       [f"<c:calendar-data>{escape(data)}</c:calendar-data>"])
+                      for href, etag, data in written]
+        self._send(207, _multistatus(responses), content_type='application/xml; charset="utf-8"')
+
+    def _current(self, user, calendar: str, href: str):
+        """(etag, iCal data) of an event resource as last written, or None if it doesn't exist."""
+        if href in self.server_owner.written:
+            version, data = self.server_owner.written[href]
+            return (_resource_etag(href, version), data) if data is not None else None
+        for event in user.caldav_calendars.get(calendar, []):
+            if href.endswith(f"/{event.uid}.ics"):
+                return f'"{event.uid}-1"', event.to_ical()
+        return None
+
+    def _preconditions_met(self, current) -> bool:
+        if self.headers.get("If-None-Match") == "*" and current is not None:
+            return False
+        if_match = self.headers.get("If-Match")
+        return not if_match or (current is not None and if_match in ("*", current[0]))
+
+    def do_GET(self):
+        self.server_owner.record_request()
+        user, parts = self._resolve()
+        current = self._current(user, parts["calendar"], urlparse(self.path).path) if user and parts["event"] else None
+        if current is None:
+            self._send(404)
+            return
+        self._send(200, current[1].encode('utf-8'), content_type="text/calendar", headers={"ETag": current[0]})
+
+    def _write(self, data: Optional[str]):
+        """Stores (or with None, deletes) the event resource, honouring If-Match and If-None-Match."""
+        user, parts = self._resolve()
+        if not user or not parts["event"] or parts["calendar"] not in user.caldav_calendars:
+            self._send(404)
+            return
+        if parts["calendar"].startswith("subscribed"):
+            self._send(403, content_type="text/plain")
+            return
+        href = urlparse(self.path).path
+        with self.server_owner.write_lock:
+            current = self._current(user, parts["calendar"], href)
+            if data is None and current is None:
+                self._send(404)
+                return
+            if not self._preconditions_met(current):
+                self._send(412, content_type="text/plain")
+                return
+            version = self.server_owner.written.get(href, (1 if current else 0, None))[0] + 1
+            self.server_owner.written[href] = (version, data)
+        if data is None:
+            self._send(204)
+        else:
+            self._send(201 if current is None else 204, headers={"ETag": _resource_etag(href, version)})
+
+    def do_PUT(self):
+        self.server_owner.record_request()
+        self._write(self._read_body().decode('utf-8'))
+
+    def do_DELETE(self):
+        self.server_owner.record_request()
+        self._read_body()
+        self._write(None)
+
+
+def _resource_etag(href: str, version: int) -> str:
+    return f'"{href.rsplit("/", 1)[-1][:-len(".ics")]}-{version}"'
+
+
+def _as_utc(value) -> datetime:
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day) # All-day events
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class FakeCalDAVServer(BackgroundHTTPServer):
+    """
+    Minimal CalDAV server: principal discovery, calendar listing, calendar-query REPORT, GET, and
+    PUT/DELETE of events with If-Match/If-None-Match. Writes are kept on top of the dataset's events.
+    """
+    handler_class = _CalDAVHandler
+
+    def __init__(self, dataset: SyntheticDataset, latency_ms: float = 0.0):
+        super().__init__(dataset, latency_ms)
+        self.written = {} # Event href -> (version, iCal data or None once deleted)
+        self.write_lock = threading.Lock()
+
+    def written_events(self, calendar_href: str, start=None, end=None):
+        """(href, etag, iCal data) of the events written to the calendar that overlap the range, if given."""
+        with self.write_lock:
+            written = [(href, version, data) for href, (version, data) in self.written.items()
+                       if data is not None and href.startswith(calendar_href)]
+        for href, version, data in written:
+            if start is not None:
+                vevent = next(iter(icalendar.Calendar.from_ical(data).walk("VEVENT")), None)
+                if vevent is None or not (_as_utc(vevent.decoded("dtstart")) < end and _as_utc(vevent.decoded("dtend")) > start):
+                    continue
+            yield href, _resource_etag(href, version), data
+
+    def user_url(self, user_id: str) -> str:
+        return f"{self.base_url}/caldav/{user_id}/"
+
+
+class _TrelloHandler(_QuietHandler):
+    # GET /1/boards/{id}  and  GET /1/boards/{id}/cards/
+    path_pattern = re.compile(r"^/1/boards/(?P<board>[^/]+)(?P<cards>/cards/?(?P<filter>[^/]*))?$")
+
+    def do_GET(self):
+        self.server_owner.record_request()
+        match = self.path_pattern.match(urlparse(self.path).path)
+        user = self.server_owner.dataset.by_id.get(match.group("board")[:-1]) if match else None
+        if not user:
+            self._send(404, b"board not found", content_type="text/plain")
+            return
+        board_id = match.group("board")
+        if match.group("cards"):
+            self._send_json(user.trello_cards)
+        else:
+            self._send_json({"id": board_id, "name": f"{user.name} board", "desc": "", "closed": False,
+                             "url": f"https://trello.com/b/{board_id}"})
+
+
+class FakeTrelloServer(BackgroundHTTPServer):
+    """Trello REST stand-in for board lookup and card listing. Board IDs are `<user_id>b`."""
+    handler_class = _TrelloHandler
+
+    @property
+    def api_base_url(self) -> str:
+        return f"{self.base_url}/1"
+
+
+class _LLMHandler(_QuietHandler):
+    # POST /v1beta/models/{model}:generateContent
+    path_pattern = re.compile(r"^/v1beta/models/(?P<model>[^:/]+):generateContent$")
+    # POST /v1beta/cachedContents, GET/DELETE /v1beta/cachedContents/{id}
+    cache_pattern = re.compile(r"^/v1beta/cachedContents(?:/(?P<id>[^/]+))?$")
+    # POST /v1beta/models/{model}:batchGenerateContent, GET /v1beta/batches/{id}, POST /v1beta/batches/{id}:cancel
+    batch_create_pattern = re.compile(r"^/v1beta/models/(?P<model>[^:/]+):batchGenerateContent$")
+    batch_pattern = re.compile(r"^/v1beta/batches/(?P<id>[^/:]+)(?P<cancel>:cancel)?$")
+
+    def do_POST(self):
+        body = self._read_body()
+        path = urlparse(self.path).path
+        # Generation requests wait for a free slot, like requests beyond an API's concurrency limit.
+        with self.server_owner.generation_slot() if self.path_pattern.match(path) else contextlib.nullcontext():
+            self.server_owner.record_request()
+            self._post(path, json.loads(body or b"{}"))
+
+    def _post(self, path: str, request: dict):
+        if self.cache_pattern.match(path):
+            cached = self.server_owner.create_cache(request)
+            if cached is None:
+                self._send_json({"error": {"code": 400, "message": "Cached content is too small.", "status": "INVALID_ARGUMENT"}}, status=400)
+                return
+            self._send_json(cached)
+            return
+        if self.batch_create_pattern.match(path):
+            self._send_json(self.server_owner.create_batch(request))
+            return
+        batch = self.batch_pattern.match(path)
+        if batch and batch.group("cancel"):
+            job = self.server_owner.cancel_batch(f"batches/{batch.group('id')}")
+            self._send_json(job or {"error": {"code": 404, "message": "Not Found", "status": "NOT_FOUND"}}, status=200 if job else 404)
+            return
+        if not self.path_pattern.match(path):
+            self._send_json({"error": {"code": 404, "message": "Not Found"}}, status=404)
+            return
+        cached_chars = 0
+        if request.get("cachedContent"):
+            cached = self.server_owner.get_cache(request["cachedContent"])
+            if cached is None:
+                self._send_json({"error": {"code": 404, "message": f"CachedContent not found: {request['cachedContent']}",
+                                           "status": "NOT_FOUND"}}, status=404)
+                return
+            cached_chars = cached["chars"]
+        response = self.server_owner.generate(request, cached_chars)
+        self.server_owner.generation_delay(response)
+        self._send_json(response)
+
+    def do_GET(self):
+        self._read_body()
+        self.server_owner.record_request()
+        batch = self.batch_pattern.match(urlparse(self.path).path)
+        if batch:
+            job = self.server_owner.get_batch(f"batches/{batch.group('id')}")
+            self._send_json(job or {"error": {"code": 404, "message": "Not Found", "status": "NOT_FOUND"}}, status=200 if job else 404)
+            return
+        match = self.cache_pattern.match(urlparse(self.path).path)
+        cached = self.server_owner.get_cache(f"cachedContents/{match.group('id')}") if match and match.group("id") else None
+        if cached is None:
+            self._send_json({"error": {"code": 404, "message": "Not Found", "status": "NOT_FOUND"}}, status=404)
+            return
+        self._send_json(cached["resource"])
+
+    def do_DELETE(self):
+        self._read_body()
+        self.server_owner.record_request()
+        match = self.cache_pattern.match(urlparse(self.path).path)
+        if match and match.group("id"):
+            self.server_owner.delete_cache(f"cachedContents/{match.group('id')}")
+        self._send_json({})
+
+
+class FakeLLMServer(BackgroundHTTPServer):
+    """
+    Gemini generateContent stand-in that returns a deterministic Markdown summary. It also supports
+    context caching: cached contents expire after their TTL, and requests referring to an unknown or
+    expired cache fail with 404 like the real API. Contents shorter than `min_cache_chars` are rejected
+    with 400, like the real API's minimum token count.
+
+    Requests for a JSON response (`responseMimeType`) answer each `<request id="...">` section of the prompt
+    separately, like a packed summary request. Batch jobs finish `batch_latency_ms` after they are created.
+    `output_ms_per_kb` adds generation time proportional to the length of the answer, and with `max_concurrent`
+    only that many generateContent requests are served at a time.
+    """
+    handler_class = _LLMHandler
+
+    def __init__(self, dataset: SyntheticDataset, latency_ms: float = 0.0, summary_kb: int = 4, min_cache_chars: int = 0,
+                 output_ms_per_kb: float = 0.0, batch_latency_ms: float = 1000.0, max_concurrent: Optional[int] = None):
+        super().__init__(dataset, latency_ms)
+        self.summary_kb = summary_kb
+        self.min_cache_chars = min_cache_chars
+        self.output_seconds_per_kb = output_ms_per_kb / 1000.0
+        self.batch_latency_seconds = batch_latency_ms / 1000.0
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.prompt_chars = 0 # Characters sent with requests, excluding cached contents
+        self.cached_prompt_chars = 0 # Characters served from cached contents
+        self.caches_created = 0
+        self.generate_requests = 0 # generateContent requests and requests within batch jobs
+        self.batches_created = 0
+        self._caches = {}
+        self._batches = {}
+
+    def record_prompt(self, chars: int, cached_chars: int = 0):
+        with self._count_lock:
+            self.prompt_chars += chars
+            self.cached_prompt_chars += cached_chars
+
+    def create_cache(self, request: dict) -> Optional[dict]:
+        text = "".join(part.get("text", "") for content in [request.get("systemInstruction") or {}, *request.get("contents", [])]
+                       for part in content.get("parts", []))
+        if len(text) < self.min_cache_chars:
+            return None
+        ttl_seconds = float(str(request.get("ttl") or "3600s").rstrip("s"))
+        with self._count_lock:
+            self.caches_created += 1
+            name = f"cachedContents/bench-{self.caches_created}"
+            self.prompt_chars += len(text)
+        now = time.time()
+        resource = {
+            "name": name, "model": request.get("model", ""), "displayName": request.get("displayName", ""),
+            "createTime": _rfc3339(now), "updateTime": _rfc3339(now), "expireTime": _rfc3339(now + ttl_seconds),
+            "usageMetadata": {"totalTokenCount": len(text) // 4},
+        }
+        with self._count_lock:
+            self._caches[name] = {"resource": resource, "chars": len(text), "expires": now + ttl_seconds}
+        return resource
+
+    def get_cache(self, name: str):
+        with self._count_lock:
+            cached = self._caches.get(name)
+            if cached is not None and cached["expires"] <= time.time():
+                del self._caches[name]
+                cached = None
+            return cached
+
+    def delete_cache(self, name: str):
+        with self._count_lock:
+            self._caches.pop(name, None)
+
+    def generate(self, request: dict, cached_chars: int = 0) -> dict:
+        """The GenerateContentResponse to a generateContent request (or a request within a batch job)."""
+        prompt = "".join(part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", []))
+        instruction_chars = sum(len(part.get("text", "")) for part in (request.get("systemInstruction") or {}).get("parts", []))
+        with self._count_lock:
+            self.generate_requests += 1
+        self.record_prompt(len(prompt) + instruction_chars, cached_chars)
+        if (request.get("generationConfig") or {}).get("responseMimeType") == "application/json":
+            sections = re.findall(r'<request id="([^"]+)">\n(.*?)\n</request>', prompt, re.S)
+            text = json.dumps({"responses": [{"id": section_id, "text": self.make_summary(section)} for section_id, section in sections]})
+        else:
+            text = self.make_summary(prompt)
+        prompt_tokens, output_tokens = (len(prompt) + instruction_chars + cached_chars) // 4, len(text) // 4
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                              "cachedContentTokenCount": cached_chars // 4, "totalTokenCount": prompt_tokens + output_tokens},
+        }
+
+    def generation_slot(self):
+        return self._slots if self._slots is not None else contextlib.nullcontext()
+
+    def generation_delay(self, response: dict):
+        if self.output_seconds_per_kb:
+            time.sleep(response["usageMetadata"]["candidatesTokenCount"] * 4 / 1024 * self.output_seconds_per_kb)
+
+    def create_batch(self, request: dict) -> dict:
+        batch = request.get("batch") or {}
+        inlined = ((batch.get("inputConfig") or {}).get("requests") or {}).get("requests", [])
+        with self._count_lock:
+            self.batches_created += 1
+            name = f"batches/bench-{self.batches_created}"
+            self._batches[name] = {"requests": inlined, "ready_at": time.time() + self.batch_latency_seconds,
+                                   "state": "BATCH_STATE_PENDING", "output": None, "display_name": batch.get("displayName", "")}
+        return self.get_batch(name)
+
+    def get_batch(self, name: str) -> Optional[dict]:
+        with self._count_lock:
+            job = self._batches.get(name)
+            if job is None:
+                return None
+            finished = job["state"] == "BATCH_STATE_PENDING" and time.time() >= job["ready_at"]
+            if finished:
+                job["state"] = "BATCH_STATE_RUNNING" # Answered below, outside the lock
+        if finished:
+            output = [{"response": self.generate(item.get("request") or {}), "metadata": item.get("metadata")} for item in job["requests"]]
+            with self._count_lock:
+                job["output"], job["state"] = output, "BATCH_STATE_SUCCEEDED"
+        with self._count_lock:
+            resource = {"name": name, "metadata": {"@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch",
+                                                   "name": name, "displayName": job["display_name"], "state": job["state"]}}
+            if job["state"] in ("BATCH_STATE_SUCCEEDED", "BATCH_STATE_CANCELLED"):
+                resource["done"] = True
+            if job["output"] is not None:
+                resource["response"] = {"@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatchOutput",
+                                        "inlinedResponses": {"inlinedResponses": job["output"]}}
+            return resource
+
+    def cancel_batch(self, name: str) -> Optional[dict]:
+        with self._count_lock:
+            job = self._batches.get(name)
+            if job is not None and job["state"] == "BATCH_STATE_PENDING":
+                job["state"] = "BATCH_STATE_CANCELLED"
+        return self.get_batch(name) if job is not None else None
+
+    def make_summary(self, prompt: str) -> str:
+        lines = ["## Today", "", "| Time | Event | Notes |", "|------|-------|-------|"]
+        summaries = re.findall(r"(?:Summary|Name): (.+)", prompt)
+        for i, summary in enumerate(summaries):
+            lines.append(f"| {8 + i % 10:02d}:00 | {summary} | Prepare agenda |")
+            if sum(len(line) for line in lines) > self.summary_kb * 1024:
+                break
+        lines += ["", "## Highlights", "", "*   **Conflicts:** none detected.", f"*   Items reviewed: {len(summaries)}"]
+        return "\n".join(lines)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode('ascii'))
+
+    def handle(self):
+        sink = self.server.sink
+        self._reply("220 calmind-bench ESMTP ready")
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-calmind-bench\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "AUTH":
+                if command.upper().startswith("AUTH LOGIN") and len(command.split()) == 2:
+                    self._reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self._reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                mail_from, recipients = command[10:].strip("<> "), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<> "))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b".\n", b""):
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                if sink.deliver(mail_from, recipients, b"".join(data)):
+                    self._reply("250 OK queued")
+                else:
+                    self._reply("451 4.3.0 Temporary failure, try again later")
+            elif verb == "RSET":
+                mail_from, recipients = None, []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SMTPSink:
+    """
+    SMTP server that accepts and counts every message (no STARTTLS; configure `use_tls: false`). The first
+    `fail_first` messages are answered with a temporary failure (451), to exercise retries.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, fail_first: int = 0):
+        self.latency_seconds = latency_ms / 1000.0
+        self.fail_first = fail_first
+        self.rejected = 0
+        self.messages = []
+        self._lock = threading.Lock()
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="SMTPSink", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def request_count(self) -> int:
+        return len(self.messages)
+
+    def deliver(self, mail_from, recipients, data: bytes) -> bool:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        message = message_from_bytes(data)
+        with self._lock:
+            if self.rejected < self.fail_first:
+                self.rejected += 1
+                return False
+            self.messages.append({"from": mail_from, "to": recipients, "subject": message.get("Subject"), "size": len(data),
+                                  "message_id": message.get("Message-ID")})
+        return True
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"SMTPSink listening on 127.0.0.1:{self.port}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from calmind.config import Config
+from calmind import webapp
+
+logger = logging.getLogger(__name__)
+
+RUN_REPORT_PATH = "/reports/run"
+
+
+async def _read_body(receive) -> Optional[bytes]:
+    """The request body, or None if the client disconnected."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _request_values(scope, body: bytes) -> dict:
+    """Query parameters, overridden by form or JSON body fields, like Flask's `request.values` plus JSON."""
+    values = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+    content_type = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"content-type"), "")
+    if content_type.startswith("application/json") and body:
+        try:
+            parsed = json.loads(body)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            values.update(parsed)
+    elif content_type.startswith("application/x-www-form-urlencoded"):
+        values.update(parse_qsl(body.decode("utf-8")))
+    return values
+
+
+class CalMindASGI:
+    """
+    ASGI application serving the Flask web app: `python -m calmind.asgi`, or `calmind.asgi:app` with any
+    ASGI server. Report runs (POST /reports/run) are awaited on the event loop without holding a thread,
+    so one process serves many concurrent report requests. All other routes are the Flask app's, run on
+    a bounded pool of request threads. The CalMindApp and the thread pools are created on the first request.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._request_threads: Optional[ThreadPoolExecutor] = None
+        self._startup_lock: Optional[asyncio.Lock] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            body = await _read_body(receive)
+            if body is None:
+                return
+            await self._start()
+            if scope["path"] == RUN_REPORT_PATH and scope["method"] == "POST":
+                await self._run_report(scope, body, send)
+            else:
+                await self._call_wsgi(scope, body, send)
+
+    async def _start(self):
+        if self._request_threads is not None:
+            return
+        if self._startup_lock is None:
+            self._startup_lock = asyncio.Lock()
+        async with self._startup_lock:
+            if self._request_threads is None:
+                # Building the app reads the config and opens stores and clients, so it runs off the event loop.
+                calmind_app = await asyncio.get_running_loop().run_in_executor(None, webapp.get_calmind_app)
+                threads = calmind_app.config.get_webapp_config().request_threads
+                self._request_threads = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="calmind-request")
+                logger.info(f"Web app started with {threads} request threads.")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, webapp.shutdown)
+                if self._request_threads is not None:
+                    self._request_threads.shutdown(wait=False)
+                    self._request_threads = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _run_report(self, scope, body: bytes, send):
+        values = _request_values(scope, body)
+        loop = asyncio.get_running_loop()
+        user_config = await loop.run_in_executor(self._request_threads, webapp.find_user, values.get("user"))
+        if not user_config:
+            await self._send_json(send, 404, {"error": f"Unknown user: {values.get('user')}"})
+            return
+        source_name = values.get("source")
+        try:
+            result = await asyncio.wrap_future(webapp.get_report_runner().submit(user_config, source_name))
+        except Exception as e:
+            logger.exception(f"Report run failed for {user_config.name}")
+            await self._send_json(send, 500, {"user": user_config.name, "source": source_name, "status": "error", "error": str(e)})
+            return
+        await self._send_json(send, 200, webapp.report_result(user_config, source_name, result))
+
+    @staticmethod
+    async def _send_json(send, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin-1"))]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _call_wsgi(self, scope, body: bytes, send):
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(
+            self._request_threads, self._wsgi_response, self._environ(scope, body))
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]})
+        await send({"type": "http.response.body", "body": content})
+
+    def _wsgi_response(self, environ: dict):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"], response["headers"] = int(status.split(" ", 1)[0]), headers
+
+        chunks = self.wsgi_app(environ, start_response)
+        try:
+            content = b"".join(chunks)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        return response["status"], response["headers"], content
+
+    @staticmethod
+    def _environ(scope, body: bytes) -> dict:
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            key = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if key == "CONTENT_LENGTH":
+                continue
+            if key != "CONTENT_TYPE":
+                key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+app = CalMindASGI(webapp.app)
+
+
+def main(argv=None) -> int:
+    webapp_config = Config(webapp.CONFIG_PATH).get_webapp_config()
+    parser = argparse.ArgumentParser(description="Serve the CalMind web app over ASGI (requires uvicorn).")
+    parser.add_argument('--host', default=webapp_config.host)
+    parser.add_argument('--port', type=int, default=webapp_config.port)
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("The ASGI server needs uvicorn: pip install uvicorn. Or serve calmind.asgi:app with another ASGI server.")
+        return 1
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,13 +11,18 @@ class Calendar(ABC):
         """Abstract method to fetch calendar events within a date range."""
         pass
 
+    def iter_events(self, start_date: datetime, end_date: datetime):
+        """Yields calendar events within a date range. Backends override this to stream instead of building a list."""
+        yield from self.get_events(start_date, end_date)
+
     @abstractmethod
     def authenticate(self):
         """Abstract method to handle calendar authentication."""
         pass
 
 class CalendarEvent:
-    def __init__(self, summary: str, start: datetime, end: datetime, location: str = None, description: str = None):
+    def __init__(self, summary: str, start: datetime, end: datetime, location: str = None, description: str = None, id: str = None):
+        self.id = id
         self.summary = summary
         self.start = start
         self.end = end
@@ -31,6 +36,7 @@ class CalendarEvent:
 
     def to_dict(self):
         return {
+            "id": self.id,
             "summary": self.summary,
             "start": self.start.isoformat(),
             "end": self.end.isoformat(),
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+EVENTS_FILE_NAME = "events.sqlite3"
+
+
+@dataclass
+class StoredEvent:
+    user_name: str
+    source: str
+    id: Optional[str]
+    summary: Optional[str]
+    start: Optional[str] # As fetched: ISO datetime, or a date for all-day events
+    end: Optional[str]
+    location: Optional[str]
+    description: Optional[str]
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "id": self.id,
+            "summary": self.summary,
+            "start": self.start,
+            "end": self.end,
+            "location": self.location,
+            "description": self.description,
+        }
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """Seconds since the epoch of a normalized event time; naive times and all-day dates count as UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.combine(date.fromisoformat(value), datetime.min.time()) if len(value) == 10 else datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return (parsed if parsed.tzinfo else pytz.utc.localize(parsed)).timestamp()
+
+
+def _as_timestamp(value: datetime) -> float:
+    return value.timestamp() if value.tzinfo else value.astimezone().timestamp() # Naive means local time
+
+
+def fts_query(text: str) -> str:
+    """Turns free text into an FTS5 query matching every word as a prefix, so user input can't break the syntax."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def user_key(user_name: str) -> str:
+    """A single FTS token per user, so text searches only walk that user's part of the index."""
+    return "u" + hashlib.sha1(user_name.encode('utf-8')).hexdigest()[:16]
+
+
+class EventStore:
+    """
+    Local SQLite copy of each user's fetched calendar events, so schedule questions ("what's on Tuesday",
+    "meetings mentioning X") are answered without calling the calendar APIs. Each successful fetch replaces
+    the source's events in the fetched window. Time-range queries use an index on (user, start, end);
+    text queries use an FTS5 index over summary, location and description.
+    """
+
+    def __init__(self, path: str, retention_days: Optional[int] = 90):
+        self.path = path
+        self.retention_days = retention_days
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_name TEXT NOT NULL,
+                    user_key TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    event_id TEXT,
+                    summary TEXT,
+                    start TEXT,
+                    end TEXT,
+                    location TEXT,
+                    description TEXT,
+                    all_day INTEGER NOT NULL,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_events_user_time ON events (user_name, start_ts, end_ts)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_events_source_time ON events (user_name, source, start_ts)")
+            self._db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+                    user_key, summary, location, description, content='events', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            self._db.execute("""
+                CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+                    INSERT INTO events_fts (rowid, user_key, summary, location, description)
+                    VALUES (new.id, new.user_key, new.summary, new.location, new.description);
+                END
+            """)
+            self._db.execute("""
+                CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+                    INSERT INTO events_fts (events_fts, rowid, user_key, summary, location, description)
+                    VALUES ('delete', old.id, old.user_key, old.summary, old.location, old.description);
+                END
+            """)
+
+    def replace_events(self, user_name: str, source: str, events: Iterable, window_start: datetime, window_end: datetime) -> int:
+        """
+        Replaces the source's stored events that overlap the fetched window with `events` (normalized event
+        dicts or their JSON lines), so events removed from the calendar disappear too. Returns the number stored.
+        """
+        stored = 0
+        key = user_key(user_name)
+
+        def rows():
+            # Streamed into executemany, so a large fetch isn't held in memory.
+            nonlocal stored
+            for event in events:
+                if isinstance(event, str):
+                    event = json.loads(event)
+                start_ts = _timestamp(event.get("start"))
+                if start_ts is None:
+                    continue
+                stored += 1
+                yield (user_name, key, source, event.get("id"), event.get("summary"), event.get("start"), event.get("end"),
+                       event.get("location"), event.get("description"), int(len(event["start"]) == 10),
+                       start_ts, _timestamp(event.get("end")) or start_ts)
+
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM events WHERE user_name = ? AND source = ? AND start_ts < ? AND end_ts > ?",
+                             (user_name, source, _as_timestamp(window_end), _as_timestamp(window_start)))
+            self._db.executemany(
+                "INSERT INTO events (user_name, user_key, source, event_id, summary, start, end, location, description, all_day, start_ts, end_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows())
+        return stored
+
+    @staticmethod
+    def _row_to_event(row: sqlite3.Row) -> StoredEvent:
+        return StoredEvent(row["user_name"], row["source"], row["event_id"], row["summary"], row["start"], row["end"],
+                           row["location"], row["description"])
+
+    def events_between(self, user_name: str, start: datetime, end: datetime, limit: int = 500) -> List[StoredEvent]:
+        """Events overlapping [start, end), ordered by start. Naive datetimes are local time; all-day events count as UTC."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM events WHERE user_name = ? AND start_ts < ? AND end_ts > ? ORDER BY start_ts, id LIMIT ?",
+                (user_name, _as_timestamp(end), _as_timestamp(start), limit)).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def events_on(self, user_name: str, day: date, timezone: str = "UTC", limit: int = 500) -> List[StoredEvent]:
+        """
+        Events on the given day in the user's timezone: timed events overlapping its local midnight-to-midnight,
+        and all-day events covering that date (all-day events have no timezone).
+        """
+        tz = pytz.timezone(timezone)
+        start = tz.localize(datetime.combine(day, datetime.min.time())).timestamp()
+        end = tz.localize(datetime.combine(day + timedelta(days=1), datetime.min.time())).timestamp()
+        day_iso = day.isoformat()
+        # All-day events start at UTC midnight of their first date, so both kinds start before `upper`.
+        upper = max(end, _timestamp(day_iso) + 1)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM events WHERE user_name = ? AND start_ts < ? AND ("
+                "(all_day = 0 AND start_ts < ? AND end_ts > ?) OR "
+                "(all_day = 1 AND start <= ? AND COALESCE(end, date(start, '+1 day')) > ?)"
+                ") ORDER BY start_ts, id LIMIT ?",
+                (user_name, upper, end, start, day_iso, day_iso, limit)).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def search(self, user_name: str, text: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               limit: int = 100) -> List[StoredEvent]:
+        """Events whose summary, location or description contain all words of `text` (as prefixes), ordered by start."""
+        words = fts_query(text)
+        if not words:
+            return []
+        match = f'user_key:"{user_key(user_name)}" AND {{summary location description}}: ({words})'
+        query = ("SELECT events.* FROM events_fts JOIN events ON events.id = events_fts.rowid "
+                 "WHERE events_fts MATCH ? AND events.user_name = ?")
+        params: list = [match, user_name]
+        if start is not None:
+            query += " AND events.end_ts > ?"
+            params.append(_as_timestamp(start))
+        if end is not None:
+            query += " AND events.start_ts < ?"
+            params.append(_as_timestamp(end))
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY events.start_ts, events.id LIMIT ?", params + [limit]).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def count(self, user_name: Optional[str] = None) -> int:
+        with self._lock:
+            if user_name is None:
+                return self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM events WHERE user_name = ?", (user_name,)).fetchone()[0]
+
+    def apply_retention(self) -> int:
+        """Removes events that ended more than `retention_days` ago. Returns how many."""
+        if self.retention_days is None:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock, self._db:
+            removed = self._db.execute("DELETE FROM events WHERE end_ts < ?", (cutoff,)).rowcount
+        if removed:
+            logger.info(f"Event store retention removed {removed} events.")
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,10 +1,13 @@
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+import httplib2
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
@@ -12,20 +15,42 @@ from googleapiclient.errors import HttpError
 
 from calmind.calendars.base import Calendar, CalendarEvent
 from calmind.config import GoogleCalendarConfig
+from calmind.monitoring import metrics
+from calmind.pipeline.resilience import EndpointPolicy
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+GOOGLE_API_URL = 'https://www.googleapis.com/'
+
+class GuardedHttp(httplib2.Http):
+    """
+    httplib2 transport that applies the endpoint's timeout and circuit breaker. httplib2 has a single socket
+    timeout, so the longer (read) timeout is used. Requests are not hedged: an Http object is not thread-safe.
+    """
+
+    def __init__(self, policy: EndpointPolicy):
+        super().__init__(timeout=policy.read_timeout_seconds or policy.connect_timeout_seconds)
+        self.policy = policy
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        request = super().request
+        return self.policy.call(lambda: request(uri, method, *args, **kwargs),
+                                failed_result=lambda result: result[0].status >= 500 or result[0].status == 429,
+                                transient_errors=(OSError, httplib2.ServerNotFoundError))
 
 class GoogleCalendar(Calendar):
-    def __init__(self, name: str, config: GoogleCalendarConfig):
+    def __init__(self, name: str, config: GoogleCalendarConfig, policy: Optional[EndpointPolicy] = None):
         super().__init__(name, config)
+        self.policy = policy or EndpointPolicy()
         self.credentials = None
         self.service = None
-        self.token_path = 'token.json' # Path to store user's access and refresh tokens
+        self.token_path = config.token_path # Path to store user's access and refresh tokens
         self.credentials_path = config.credentials_path # Access directly from Pydantic model
         self.calendar_ids = config.calendar_ids # Access directly from Pydantic model
+        self.api_endpoint = config.api_endpoint
         logger.info(f"Initialized for {self.name} with credentials_path={self.credentials_path}")
 
+    @metrics.instrumented("calendar_auth", source="google", error_on_false=True)
     def authenticate(self):
         """Shows user how to authenticate with Google Calendar API."""
         logger.info(f"Attempting to authenticate for {self.name}...")
@@ -56,7 +81,9 @@ class GoogleCalendar(Calendar):
         
         self.credentials = creds
         try:
-            self.service = build('calendar', 'v3', credentials=creds)
+            client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+            http = AuthorizedHttp(creds, http=GuardedHttp(self.policy))
+            self.service = build('calendar', 'v3', http=http, client_options=client_options)
             logger.info(f"Authentication successful for {self.name}.")
             return True
         except HttpError as error:
@@ -68,55 +95,78 @@ class GoogleCalendar(Calendar):
 
     def get_events(self, start_date: datetime, end_date: datetime) -> list:
         """Fetches events from the configured Google Calendars."""
+        return list(self.iter_events(start_date, end_date))
+
+    def iter_events(self, start_date: datetime, end_date: datetime, page_size: int = 250):
+        """
+        Yields events from the configured Google Calendars one page (`page_size` events) at a time, so
+        only a single page of the API response is held in memory.
+        """
         logger.info(f"Fetching events from {start_date} to {end_date} for {self.name}.")
         if not self.service:
             logger.error("Google Calendar service not authenticated. Please run authenticate() first.")
-            return []
+            return
 
-        events_list = []
+        total = 0
         time_min = start_date.isoformat() + 'Z'  # 'Z' indicates UTC time
         time_max = end_date.isoformat() + 'Z'
 
         for calendar_id in self.calendar_ids:
             logger.info(f"Fetching events for calendar ID: {calendar_id}")
+            page_token = None
+            calendar_total = 0
             try:
-                events_result = self.service.events().list(
-                    calendarId=calendar_id,
-                    timeMin=time_min,
-                    timeMax=time_max,
-                    singleEvents=True,
-                    orderBy='startTime'
-                ).execute()
-                events = events_result.get('items', [])
-
-                if not events:
+                while True:
+                    with metrics.timed("calendar_fetch", source="google"):
+                        events_result = self.service.events().list(
+                            calendarId=calendar_id,
+                            timeMin=time_min,
+                            timeMax=time_max,
+                            singleEvents=True,
+                            orderBy='startTime',
+                            maxResults=page_size,
+                            pageToken=page_token
+                        ).execute()
+                    for event in events_result.get('items', []):
+                        calendar_total += 1
+                        yield self._to_calendar_event(event)
+                    page_token = events_result.get('nextPageToken')
+                    if not page_token:
+                        break
+
+                if not calendar_total:
                     logger.info(f'No upcoming events found for {calendar_id}.')
                 else:
-                    logger.info(f'Found {len(events)} events for {calendar_id}.')
-                for event in events:
-                    start = event['start'].get('dateTime', event['start'].get('date'))
-                    end = event['end'].get('dateTime', event['end'].get('date'))
-
-                    if 'T' not in start: # All-day event
-                        start_dt = datetime.fromisoformat(start)
-                        end_dt = datetime.fromisoformat(end) - timedelta(days=1) 
-                    else:
-                        start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
-                        end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-
-                    events_list.append(CalendarEvent(
-                        summary=event.get('summary', 'No Summary'),
-                        start=start_dt,
-                        end=end_dt,
-                        location=event.get('location'),
-                        description=event.get('description')
-                    ))
+                    logger.info(f'Found {calendar_total} events for {calendar_id}.')
             except HttpError as error:
                 logger.error(f'An HTTP error occurred fetching events for {calendar_id}: {error}')
+                metrics.record_error("calendar_fetch", source="google")
             except Exception as e:
                 logger.error(f'An unexpected error occurred for {calendar_id}: {e}')
-        logger.info(f"Finished fetching events. Total events: {len(events_list)}")
-        return events_list
+                metrics.record_error("calendar_fetch", source="google")
+            total += calendar_total
+        logger.info(f"Finished fetching events. Total events: {total}")
+
+    @staticmethod
+    def _to_calendar_event(event: dict) -> CalendarEvent:
+        start = event['start'].get('dateTime', event['start'].get('date'))
+        end = event['end'].get('dateTime', event['end'].get('date'))
+
+        if 'T' not in start: # All-day event: dates with an exclusive end, like iCalendar's DTEND
+            start_dt = date.fromisoformat(start)
+            end_dt = date.fromisoformat(end)
+        else:
+            start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
+            end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
+
+        return CalendarEvent(
+            summary=event.get('summary', 'No Summary'),
+            start=start_dt,
+            end=end_dt,
+            location=event.get('location'),
+            description=event.get('description'),
+            id=event.get('id')
+        )
 
 if __name__ == '__main__':
     """
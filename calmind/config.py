@@ -2,9 +2,10 @@
 import yaml
 import os
 import logging
-from pydantic import BaseModel, Field, EmailStr, HttpUrl, RootModel
+import pytz
+from pydantic import BaseModel, Field, EmailStr, HttpUrl, RootModel, model_validator
 from pydantic_settings import SettingsConfigDict
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +16,39 @@ class EmailConfig(BaseModel):
     password: Optional[str] = None
     smtp_server: Optional[str] = None
     smtp_port: Optional[int] = None
+    use_tls: bool = True # Upgrade the SMTP connection with STARTTLS
+    timeout_seconds: float = 60 # SMTP connect and command timeout
+
+class LLMBatchConfig(BaseModel):
+    # Packing the summary requests of small users into shared LLM requests, for nightly runs
+    enabled: bool = False
+    max_prompt_chars: int = 8000 # Only prompts up to this size are packed; larger ones are sent on their own
+    max_pack_prompts: int = 10 # Prompts per packed request
+    max_wait_seconds: float = 2.0 # How long the first prompt of a pack waits for more from the other runs in flight
+    offline: bool = False # Send packs as an offline batch job instead: cheaper, but answers can take minutes to hours
+    offline_max_prompts: int = 200 # Prompts collected into one batch job
+    offline_wait_seconds: float = 30.0 # How long the first prompt of a batch job waits for more
+    offline_poll_seconds: float = 30.0
+    offline_timeout_minutes: float = 120 # Unfinished jobs are cancelled and their prompts sent on their own
 
 class LLMConfig(BaseModel):
     api_key: str
+    model: str = "gemini-1.5-pro-latest"
+    api_endpoint: Optional[str] = None # Override the Gemini API endpoint, e.g. for a local stand-in server
+    delta_summaries: bool = True # Send only what changed since the last report, plus the previous summary
+    delta_max_age_hours: float = 24 # Summarize in full when the previous summary is older than this
+    delta_max_change_ratio: float = 0.5 # Summarize in full when more than this fraction of items changed
+    context_caching: bool = True # Register the summary instructions as Gemini cached content instead of resending them
+    context_cache_ttl_minutes: float = 60 # Cached instructions are registered again after this
+    batch: LLMBatchConfig = LLMBatchConfig()
 
 class GoogleCalendarConfig(BaseModel):
     type: str = "google"
     name: str
     credentials_path: Optional[str] = "credentials.json"
     calendar_ids: List[str] = ["primary"]
+    token_path: str = "token.json"
+    api_endpoint: Optional[str] = None # Override the Calendar API base URL, e.g. "http://127.0.0.1:8080/calendar/v3/"
 
 class AppleCalendarConfig(BaseModel):
     type: str = "apple"
@@ -32,6 +57,13 @@ class AppleCalendarConfig(BaseModel):
     password: str
     url: Optional[HttpUrl] = None
     calendar_name: Optional[str] = None
+    search_window_days: int = 31 # Calendars are searched in windows of this many days to bound response size
+    max_concurrent_calendars: int = 4 # Calendar searches run in parallel over the shared client
+    exclude_calendars: List[str] = [] # Calendar names never searched when calendar_name is not set
+    skip_task_calendars: bool = False # Skip calendars that only hold tasks (VTODO), e.g. Reminders lists
+    skip_read_only_calendars: bool = False # Skip calendars the user can't write to, e.g. subscriptions and Birthdays
+    max_concurrent_writes: int = 8 # Requests in flight at once for a batch of event writes (write_events)
+    write_cache_events: int = 2000 # Fetched or written events whose etag and iCal data are kept for batch writes; 0 disables
 
 class TrelloConfig(BaseModel):
     type: str = "trello"
@@ -39,19 +71,122 @@ class TrelloConfig(BaseModel):
     api_key: str
     api_token: str
     board_id: str
+    api_base_url: Optional[str] = None # Override the Trello API base URL, e.g. "http://127.0.0.1:8080/1"
 
 class UserSourceConfig(RootModel[Union[GoogleCalendarConfig, AppleCalendarConfig, TrelloConfig]]):
     pass
 
+class UserScheduleConfig(BaseModel):
+    timezone: str = "UTC"
+    run_times: List[str] = ["07:00"] # Local HH:MM times at which the report is due
+    priority: int = 0 # Higher values are dispatched first when several runs are due
+
 class UserConfig(BaseModel):
     name: str
     report_to_email: EmailStr
     days_to_fetch: int = 30
     sources: List[UserSourceConfig] = []
+    schedule: UserScheduleConfig = Field(default_factory=UserScheduleConfig)
+
+    @model_validator(mode='after')
+    def _known_timezone(self):
+        # Checked once here, so scheduling, analytics and email all fall back to UTC alike instead of failing a run.
+        try:
+            pytz.timezone(self.schedule.timezone)
+        except pytz.UnknownTimeZoneError:
+            logger.error(f"Unknown timezone '{self.schedule.timezone}' for user {self.name}. Falling back to UTC.")
+            self.schedule.timezone = "UTC"
+        return self
+
+class SchedulerConfig(BaseModel):
+    stagger_window_minutes: int = 15
+    poll_interval_seconds: int = 30
+    imminent_meeting_minutes: int = 120
+    retention_interval_hours: float = 24 # How often the daemon removes expired reports, stored events and sent emails
+    # Downstream request budgets per minute, used for backpressure between runs.
+    rate_limits: Dict[str, float] = {"llm": 30, "smtp": 20, "caldav": 60, "google": 60, "trello": 60}
+
+class ReportingConfig(BaseModel):
+    reports_dir: str = "reports"
+    templates_dir: str = "templates"
+    persist: bool = True # Set to False to only render reports in memory (email/webapp) without writing files
+    async_writes: bool = True
+    markdown_backend: str = "markdown2" # "markdown2", "markdown-it" or "cmarkgfm"
+    markdown_cache_size: int = 256
+    compress: bool = False # Store report files gzip-compressed
+    retention_days: Optional[int] = 30 # Reports older than this are removed at the start of each run
+    max_reports_per_user: Optional[int] = None # Per user and format, newest kept
+    skip_unchanged: bool = True # Skip summarize/render/email when a user's fetched data, prompt context and model match the last run
+    resend_unchanged: bool = False # When skipping, still email the cached report of the last run
+
+class PipelineConfig(BaseModel):
+    # Per-user memory bounds of the fetch-to-prompt pipeline
+    spool_memory_bytes: int = 4 * 1024 * 1024 # Fetched items beyond this are spooled to a temporary file
+    max_prompt_chars: Optional[int] = 400_000 # Items beyond this are only sent to the LLM as a per-day digest
+    max_snapshot_items: int = 20_000 # Users with more items are always summarized in full (no delta snapshot)
+    concurrent_stages: bool = True # Fetch sources and summarize events and cards concurrently within a user's run
+    client_idle_seconds: float = 300 # Authenticated source clients are reused by runs within this time; 0 disables
+    concurrent_users: int = 1 # Users processed at once by a one-off run; llm.batch packs the requests of users in flight
+
+class ResilienceConfig(BaseModel):
+    # Calendar and Trello endpoint health, timeouts and fallbacks
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 30.0
+    failure_threshold: int = 3 # Consecutive connection errors, timeouts or 5xx responses before an endpoint's circuit opens
+    reset_timeout_seconds: float = 60.0 # An open circuit fails fast for this long, then lets one probe request through
+    hedge_after_seconds: Optional[float] = None # When set, CalDAV and Trello reads slower than this are sent a second time
+    stale_fallback: bool = True # Serve a failed source from its last successful fetch, marked as stale in the report
+    stale_max_age_hours: float = 72
+    cache_dir: Optional[str] = None # Where the last fetch of each source is kept; defaults to <reports_dir>/.source_cache
+
+class EventStoreConfig(BaseModel):
+    # Local copy of fetched calendar events, queried by the web app without calling the calendar APIs
+    enabled: bool = True
+    path: Optional[str] = None # Defaults to <reports_dir>/events.sqlite3
+    retention_days: Optional[int] = 90 # Events that ended longer ago are removed at the start of each run
+
+class AnalyticsConfig(BaseModel):
+    # Schedule statistics computed from the fetched events and shown as a table above the summary
+    enabled: bool = True
+    work_start: str = "09:00" # Local HH:MM in the user's schedule timezone
+    work_end: str = "17:00"
+    work_days: List[int] = [0, 1, 2, 3, 4] # Monday is 0
+    min_focus_minutes: int = 90 # Shortest free stretch within working hours that counts as a focus block
+    back_to_back_gap_minutes: int = 5 # Meetings at most this far apart form a back-to-back chain
+    max_table_days: int = 14 # Days listed in the table; the totals cover the whole fetched window
+
+class WebappConfig(BaseModel):
+    # Serving settings of the web app (python -m calmind.asgi)
+    host: str = "127.0.0.1"
+    port: int = 5000
+    max_concurrent_runs: int = 8 # Report runs executing at once; further requests wait for a free worker
+    request_threads: int = 32 # Threads serving the Flask routes in ASGI mode
+
+class OutboxConfig(BaseModel):
+    # Report emails are queued in a SQLite outbox and sent by background workers
+    enabled: bool = True # Set to False to send each report inline at the end of its run
+    path: Optional[str] = None # Defaults to <reports_dir>/outbox.sqlite3
+    delivery_workers: int = 2
+    max_attempts: int = 8 # Then the message is kept as failed; requeue with --retry-failed-emails
+    retry_base_seconds: float = 30 # Backoff doubles with every attempt, with jitter
+    retry_max_seconds: float = 3600
+    rate_per_domain_per_minute: float = 30 # Per recipient domain and process
+    lease_seconds: float = 300 # A message claimed by a worker that died is retried after this
+    poll_interval_seconds: float = 5 # How often idle workers look for messages queued by other processes
+    drain_timeout_seconds: float = 120 # How long a one-off run waits for queued emails before exiting
+    keep_sent_days: float = 30 # Sent messages are removed from the outbox after this
 
 class AppConfig(BaseModel):
     email_sender: EmailConfig = Field(default_factory=EmailConfig)
     llm: Optional[LLMConfig] = None
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
+    reporting: ReportingConfig = Field(default_factory=ReportingConfig)
+    pipeline: PipelineConfig = Field(default_factory=PipelineConfig)
+    resilience: ResilienceConfig = Field(default_factory=ResilienceConfig)
+    outbox: OutboxConfig = Field(default_factory=OutboxConfig)
+    event_store: EventStoreConfig = Field(default_factory=EventStoreConfig)
+    analytics: AnalyticsConfig = Field(default_factory=AnalyticsConfig)
+    webapp: WebappConfig = Field(default_factory=WebappConfig)
     users: List[UserConfig] = []
 
 class Config:
@@ -84,5 +219,29 @@ class Config:
     def get_llm_config(self) -> Optional[LLMConfig]:
         return self._app_config.llm
 
+    def get_scheduler_config(self) -> SchedulerConfig:
+        return self._app_config.scheduler
+
+    def get_reporting_config(self) -> ReportingConfig:
+        return self._app_config.reporting
+
+    def get_pipeline_config(self) -> PipelineConfig:
+        return self._app_config.pipeline
+
+    def get_resilience_config(self) -> ResilienceConfig:
+        return self._app_config.resilience
+
+    def get_outbox_config(self) -> OutboxConfig:
+        return self._app_config.outbox
+
+    def get_event_store_config(self) -> EventStoreConfig:
+        return self._app_config.event_store
+
+    def get_analytics_config(self) -> AnalyticsConfig:
+        return self._app_config.analytics
+
+    def get_webapp_config(self) -> WebappConfig:
+        return self._app_config.webapp
+
     def get_users_config(self) -> List[UserConfig]:
         return self._app_config.users
@@ -0,0 +1,286 @@
+import hashlib
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from calmind.config import OutboxConfig
+from calmind.emailing.sender import EmailSender
+from calmind.monitoring import metrics
+from calmind.scheduling.scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_FILE_NAME = "outbox.sqlite3"
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    idempotency_key: str
+    user_name: str
+    recipient: str
+    domain: str
+    subject: str
+    html: str
+    attempts: int
+
+
+def idempotency_key(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+
+def recipient_domain(recipient: str) -> str:
+    return recipient.rsplit("@", 1)[-1].strip().lower()
+
+
+class EmailOutbox:
+    """
+    Durable queue of report emails in SQLite. Enqueuing the same idempotency key twice keeps the first
+    message. A claimed message is hidden from other workers (in this or other processes) for
+    `lease_seconds`; if its worker dies before recording the outcome, it becomes due again.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    user_name TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    html TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    sent_at TEXT
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+    def enqueue(self, user_name: str, recipient: str, subject: str, html: str, key: Optional[str] = None) -> bool:
+        """Queues a message and returns False if one with the same key was queued before."""
+        key = key or idempotency_key(recipient, subject, html)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, user_name, recipient, domain, subject, html, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, user_name, recipient, recipient_domain(recipient), subject, html, PENDING, time.time(),
+                 datetime.now().isoformat(timespec='seconds')),
+            )
+        queued = cursor.rowcount == 1
+        metrics.OUTBOX_MESSAGES.inc(result="queued" if queued else "duplicate")
+        if not queued:
+            logger.info(f"Email to {recipient} with key {key[:12]} is already in the outbox.")
+        return queued
+
+    def claim(self, exclude_domains=()) -> Optional[OutboxMessage]:
+        """Takes the next due message whose recipient domain is not excluded, for one delivery attempt."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                query = "SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ?"
+                params: list = [PENDING, now]
+                if exclude_domains:
+                    query += f" AND domain NOT IN ({','.join('?' * len(exclude_domains))})"
+                    params.extend(exclude_domains)
+                row = self._db.execute(query + " ORDER BY next_attempt_at, id LIMIT 1", params).fetchone()
+                if row:
+                    self._db.execute("UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                                     (now + self.lease_seconds, row["id"]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        return OutboxMessage(row["id"], row["idempotency_key"], row["user_name"], row["recipient"], row["domain"],
+                             row["subject"], row["html"], row["attempts"] + 1)
+
+    def mark_sent(self, message: OutboxMessage):
+        self._update(message, "status = ?, sent_at = ?, last_error = NULL", (SENT, datetime.now().isoformat(timespec='seconds')))
+
+    def mark_retry(self, message: OutboxMessage, error: str, delay_seconds: float):
+        self._update(message, "next_attempt_at = ?, last_error = ?", (time.time() + delay_seconds, error))
+
+    def mark_failed(self, message: OutboxMessage, error: str):
+        self._update(message, "status = ?, last_error = ?", (FAILED, error))
+
+    def _update(self, message: OutboxMessage, assignments: str, params: tuple):
+        with self._lock:
+            self._db.execute(f"UPDATE outbox SET {assignments} WHERE id = ?", params + (message.id,))
+
+    def requeue_failed(self) -> int:
+        """Makes failed messages due again, with a fresh attempt count."""
+        with self._lock:
+            cursor = self._db.execute("UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?",
+                                      (PENDING, time.time(), FAILED))
+        return cursor.rowcount
+
+    def seconds_until_due(self) -> Optional[float]:
+        """Time until the earliest pending message is due, or None when nothing is pending."""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt_at) AS due FROM outbox WHERE status = ?", (PENDING,)).fetchone()
+        return None if row["due"] is None else max(0.0, row["due"] - time.time())
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def purge_sent(self, older_than_days: float) -> int:
+        cutoff = datetime.fromtimestamp(time.time() - older_than_days * 86400).isoformat(timespec='seconds')
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM outbox WHERE status = ? AND sent_at < ?", (SENT, cutoff))
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def is_permanent(error: Exception) -> bool:
+    """SMTP rejections that retrying won't fix; connection problems, 4xx replies and failed logins are retried."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class OutboxDelivery:
+    """
+    Worker threads draining the outbox: each message is sent with a Message-ID derived from its
+    idempotency key, retried with exponential backoff and jitter, and held back while its recipient
+    domain is over `rate_per_domain_per_minute`. Messages that exhaust `max_attempts` or are rejected
+    permanently stay in the outbox as failed.
+    """
+
+    def __init__(self, outbox: EmailOutbox, sender: EmailSender, config: OutboxConfig):
+        self.outbox = outbox
+        self.sender = sender
+        self.config = config
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._in_flight = 0
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(max(1, self.config.delivery_workers)):
+            thread = threading.Thread(target=self._work, name=f"calmind-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {len(self._threads)} email delivery workers for {self.outbox.path}.")
+
+    def notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def drain(self, timeout: float) -> bool:
+        """Waits up to `timeout` until no message is pending, including retries, and returns whether that happened."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._wakeup:
+                idle = self._in_flight == 0
+            if idle and self.outbox.seconds_until_due() is None:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _blocked_domains(self) -> List[str]:
+        with self._buckets_lock:
+            return [domain for domain, bucket in self._buckets.items() if bucket.seconds_until_available() > 0]
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        with self._buckets_lock:
+            if domain not in self._buckets:
+                self._buckets[domain] = TokenBucket(self.config.rate_per_domain_per_minute)
+            return self._buckets[domain]
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._wakeup:
+                self._in_flight += 1
+            try:
+                message = self.outbox.claim(exclude_domains=self._blocked_domains())
+                if message is not None:
+                    self._bucket(message.domain).consume()
+                    self._attempt(message)
+            except Exception as e:
+                logger.error(f"Email delivery worker error: {e}")
+                message = None
+            finally:
+                with self._wakeup:
+                    self._in_flight -= 1
+            if message is None:
+                self._idle_wait()
+
+    def _idle_wait(self):
+        due_in = self.outbox.seconds_until_due()
+        wait = self.config.poll_interval_seconds if due_in is None else min(max(due_in, 0.01), self.config.poll_interval_seconds)
+        with self._wakeup:
+            if not self._stop.is_set():
+                self._wakeup.wait(wait)
+
+    def _attempt(self, message: OutboxMessage):
+        with metrics.user_context(message.user_name):
+            try:
+                with metrics.timed("email_send", source="smtp"):
+                    self.sender.deliver(self.sender.build_message(
+                        message.recipient, message.subject, message.html, message_id=f"<{message.idempotency_key[:32]}@calmind>"))
+            except Exception as e:
+                self._failed(message, e)
+                return
+        self.outbox.mark_sent(message)
+        metrics.OUTBOX_MESSAGES.inc(result="sent")
+        logger.info(f"Email for {message.user_name} delivered to {message.recipient} (attempt {message.attempts}).")
+
+    def _failed(self, message: OutboxMessage, error: Exception):
+        if is_permanent(error) or message.attempts >= self.config.max_attempts:
+            self.outbox.mark_failed(message, str(error))
+            metrics.OUTBOX_MESSAGES.inc(result="failed")
+            logger.error(f"Giving up on email for {message.user_name} to {message.recipient} after {message.attempts} attempts: {error}")
+            return
+        delay = min(self.config.retry_max_seconds, self.config.retry_base_seconds * 2 ** (message.attempts - 1))
+        delay *= random.uniform(0.5, 1.0) # Jitter, so messages that failed together don't retry together
+        self.outbox.mark_retry(message, str(error), delay)
+        metrics.OUTBOX_MESSAGES.inc(result="retried")
+        logger.warning(f"Email for {message.user_name} to {message.recipient} failed (attempt {message.attempts}): {error}. "
+                       f"Retrying in {delay:.0f}s.")
@@ -1,8 +1,10 @@
 import smtplib
 import logging
+from typing import Optional
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from calmind.config import EmailConfig
+from calmind.monitoring import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -13,29 +15,44 @@ class EmailSender:
         self.sender_password = config.password
         self.smtp_server = config.smtp_server
         self.smtp_port = config.smtp_port
+        self.use_tls = config.use_tls
+        self.timeout_seconds = config.timeout_seconds
 
-    def send_email(self, recipient_email: str, subject: str, html_content: str):
-        logger.info(f"Attempting to send email to {recipient_email} with subject: {subject}")
-        if not all([self.sender_email, self.sender_password, self.smtp_server, self.smtp_port]):
-            logger.error("Email sender configuration is incomplete. Cannot send email.")
-            return False
-
+    def build_message(self, recipient_email: str, subject: str, html_content: str, message_id: Optional[str] = None) -> MIMEMultipart:
         msg = MIMEMultipart('alternative')
         msg['From'] = self.sender_email
         msg['To'] = recipient_email
         msg['Subject'] = subject
+        if message_id:
+            # A stable Message-ID lets mail clients recognize a message resent after an interrupted delivery.
+            msg['Message-ID'] = message_id
 
         # Attach HTML content
         msg.attach(MIMEText(html_content, 'html'))
+        return msg
 
-        try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+    def deliver(self, msg: MIMEMultipart):
+        """Sends a built message, raising on any SMTP or connection error."""
+        if not all([self.sender_email, self.sender_password, self.smtp_server, self.smtp_port]):
+            raise ValueError("Email sender configuration is incomplete. Cannot send email.")
+        with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout_seconds) as server:
+            if self.use_tls:
                 logger.info("Starting TLS...")
                 server.starttls()  # Secure the connection
-                logger.info("Logging in to SMTP server...")
-                server.login(self.sender_email, self.sender_password)
-                logger.info("Sending message...")
-                server.send_message(msg)
+            logger.info("Logging in to SMTP server...")
+            server.login(self.sender_email, self.sender_password)
+            logger.info("Sending message...")
+            server.send_message(msg)
+
+    @metrics.instrumented("email_send", source="smtp", error_on_false=True)
+    def send_email(self, recipient_email: str, subject: str, html_content: str):
+        logger.info(f"Attempting to send email to {recipient_email} with subject: {subject}")
+        if not all([self.sender_email, self.sender_password, self.smtp_server, self.smtp_port]):
+            logger.error("Email sender configuration is incomplete. Cannot send email.")
+            return False
+
+        try:
+            self.deliver(self.build_message(recipient_email, subject, html_content))
             logger.info(f"Email sent successfully to {recipient_email}")
             return True
         except Exception as e:
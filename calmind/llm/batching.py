@@ -0,0 +1,168 @@
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from calmind.config import LLMBatchConfig
+from calmind.llm.client import LLMClient
+from calmind.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+PACKED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"responses": {"type": "ARRAY", "items": {
+        "type": "OBJECT", "properties": {"id": {"type": "STRING"}, "text": {"type": "STRING"}}, "required": ["id", "text"]}}},
+    "required": ["responses"],
+}
+PACKED_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": PACKED_RESPONSE_SCHEMA}
+
+
+def pack_prompts(prompts: List[str]) -> str:
+    """One request asking for a separate answer to each prompt, as JSON."""
+    sections = "\n\n".join(f'<request id="{i}">\n{prompt}\n</request>' for i, prompt in enumerate(prompts, 1))
+    return (f"Below are {len(prompts)} separate requests from different users, each in a <request> element with an id. "
+            "Answer each request on its own, following the instructions as if it were the only one, and never mix details "
+            "between requests. Reply with a JSON object whose `responses` array has one entry per request: the request's `id` "
+            f"and the complete answer as `text`.\n\n{sections}")
+
+
+def unpack_response(text: str, count: int) -> List[Optional[str]]:
+    """The answers of a packed response in request order; None for requests it doesn't answer."""
+    answers: List[Optional[str]] = [None] * count
+    try:
+        parsed = json.loads(text) if text else None
+    except ValueError:
+        logger.warning("Packed LLM response is not valid JSON.")
+        return answers
+    entries = parsed.get("responses") if isinstance(parsed, dict) else None
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            index = int(entry.get("id")) - 1
+        except (AttributeError, TypeError, ValueError):
+            continue
+        answer = entry.get("text")
+        if 0 <= index < count and isinstance(answer, str) and answer.strip():
+            answers[index] = answer
+    return answers
+
+
+class _Pack:
+    """Prompts with the same context waiting to be sent together."""
+
+    def __init__(self):
+        self.prompts: List[str] = []
+        self.futures: List[Future] = []
+        self.closed = threading.Event() # Set once no more prompts can join, to stop its first prompt waiting
+
+
+class PromptBatcher:
+    """
+    Packs the small prompts of concurrently running users into shared LLM requests. It has the
+    `generate_content` of `LLMClient`, so the summarizers can use either. Prompts longer than
+    `max_prompt_chars` are sent on their own. Others join the open pack for their context (the summary
+    instructions). A pack is sent once it has `max_pack_prompts` prompts, or one prompt from each user run in
+    flight (see `run_in_flight`), or when its first prompt has waited `max_wait_seconds`, by the thread that
+    filled it or by that first prompt's thread. A prompt of the only run in flight is sent right away. The model answers
+    a pack with one JSON object holding each answer. In offline mode, up to `offline_max_prompts` prompts are
+    collected and sent as one batch job of such packs.
+
+    Prompts the shared request doesn't answer, e.g. because it failed or its JSON is incomplete, are sent on
+    their own by their callers. Their errors are then counted for their user, as without packing.
+    """
+
+    def __init__(self, llm_client: LLMClient, config: LLMBatchConfig):
+        self.llm_client = llm_client
+        self.config = config
+        self.mode = "offline" if config.offline else "online"
+        self.flush_prompts = max(1, config.offline_max_prompts if config.offline else config.max_pack_prompts)
+        self.max_wait_seconds = config.offline_wait_seconds if config.offline else config.max_wait_seconds
+        self._open: Dict[str, _Pack] = {}
+        self._runs_in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def run_in_flight(self):
+        """Marks a user run whose prompts may join packs, so packs stop waiting for prompts no run can add."""
+        with self._lock:
+            self._runs_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._runs_in_flight -= 1
+                for pack in self._open.values():
+                    if len(pack.prompts) >= self._pack_limit():
+                        pack.closed.set()
+
+    def _pack_limit(self) -> int:
+        # Each run in flight adds at most one prompt per context at a time; untracked callers get the configured size.
+        return min(self.flush_prompts, self._runs_in_flight) if self._runs_in_flight else self.flush_prompts
+
+    def generate_content(self, prompt: str, context: str = "") -> str:
+        if len(prompt) > self.config.max_prompt_chars or self._pack_limit() < 2:
+            return self.llm_client.generate_content(prompt, context)
+        future = Future()
+        with self._lock:
+            pack = self._open.get(context)
+            first = pack is None
+            if first:
+                pack = self._open[context] = _Pack()
+            pack.prompts.append(prompt)
+            pack.futures.append(future)
+            full = len(pack.prompts) >= self._pack_limit()
+            if full:
+                del self._open[context]
+                pack.closed.set()
+        if full:
+            self._send(pack, context)
+        elif first:
+            pack.closed.wait(self.max_wait_seconds)
+            with self._lock:
+                unsent = self._open.get(context) is pack
+                if unsent:
+                    del self._open[context]
+                    pack.closed.set()
+            if unsent:
+                self._send(pack, context)
+        answer = future.result()
+        if answer is None:
+            return self.llm_client.generate_content(prompt, context)
+        return answer
+
+    def _send(self, pack: _Pack, context: str):
+        prompts = pack.prompts
+        answers: List[Optional[str]] = [None] * len(prompts)
+        try:
+            # The shared request belongs to no single user, so its tokens and errors aren't counted for the caller's.
+            with metrics.user_context(""):
+                if len(prompts) > 1 or self.config.offline:
+                    answers = self._answer(prompts, context)
+        except Exception as e:
+            logger.error(f"Packed LLM request for {len(prompts)} prompts failed: {e}. Sending them one by one.")
+        finally:
+            answered = sum(answer is not None for answer in answers)
+            if len(prompts) > 1 or self.config.offline:
+                logger.info(f"Packed LLM request answered {answered} of {len(prompts)} prompts ({self.mode}).")
+                metrics.LLM_PACKED_PROMPTS.inc(answered, mode=self.mode, result="answered")
+                metrics.LLM_PACKED_PROMPTS.inc(len(prompts) - answered, mode=self.mode, result="fallback")
+            for future, answer in zip(pack.futures, answers):
+                future.set_result(answer)
+
+    def _answer(self, prompts: List[str], context: str) -> List[Optional[str]]:
+        size = self.config.max_pack_prompts
+        chunks = [prompts[i:i + size] for i in range(0, len(prompts), size)]
+        if self.config.offline:
+            # The job's requests share the JSON response format, so a lone prompt is packed too.
+            responses = self.llm_client.run_batch_job([pack_prompts(chunk) for chunk in chunks], context, PACKED_GENERATION_CONFIG,
+                                                      self.config.offline_poll_seconds, self.config.offline_timeout_minutes * 60)
+        else:
+            # A lone prompt is left to its caller, which sends it as usual.
+            responses = [self.llm_client.generate_content(pack_prompts(chunk), context, PACKED_GENERATION_CONFIG) if len(chunk) > 1 else None
+                         for chunk in chunks]
+        answers = []
+        for chunk, response in zip(chunks, responses):
+            answers.extend(unpack_response(response, len(chunk)))
+        return answers
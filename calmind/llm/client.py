@@ -1,32 +1,190 @@
 import google.generativeai as genai
+import hashlib
 import logging
+import requests
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import caching
+from calmind.monitoring import metrics
 
 logger = logging.getLogger(__name__)
 
+CONTEXT_SEPARATOR = "\n---\n" # Between the static context and the request when the context is sent inline
+GEMINI_API_URL = "https://generativelanguage.googleapis.com"
+BATCH_JOB_FAILED_STATES = {"BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED", "BATCH_STATE_EXPIRED"}
+
+
+@dataclass
+class ContextCache:
+    """A static prompt context registered with Gemini as cached content, and the model that refers to it."""
+    name: str
+    model: genai.GenerativeModel
+    expires_at: float # time.monotonic()
+
+
 class LLMClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, model_name: str = 'gemini-1.5-pro-latest', api_endpoint: str = None,
+                 context_caching: bool = False, context_cache_ttl_seconds: float = 3600):
         logger.info("Initializing LLM client.")
         if api_key:
             logger.info(f"API Key provided (first 5 chars: {api_key[:5]}...{api_key[-5:]}).")
         else:
             logger.error("Gemini API Key is required.")
             raise ValueError("Gemini API Key is required.")
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-pro-latest')
+        if api_endpoint:
+            logger.info(f"Using custom Gemini API endpoint: {api_endpoint}")
+            genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': api_endpoint})
+        else:
+            genai.configure(api_key=api_key)
+        self.api_key = api_key
+        self.api_endpoint = api_endpoint
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.context_caching = context_caching
+        self.context_cache_ttl_seconds = context_cache_ttl_seconds
+        self._context_caches: Dict[str, ContextCache] = {}
+        self._uncacheable_contexts: Set[str] = set()
+        self._context_lock = threading.Lock()
         logger.info("LLM client initialized successfully.")
 
-    def generate_content(self, prompt: str) -> str:
+    def generate_content(self, prompt: str, context: str = "", generation_config: Optional[dict] = None) -> str:
+        """
+        Sends `prompt` to the model. A static `context` (e.g. the summary instructions) is sent as cached
+        content when context caching is on, so it is uploaded once per TTL instead of with every request;
+        otherwise, or if the context can't be cached, it is prepended to the prompt.
+        """
         logger.info("Sending prompt to LLM...")
         logger.debug(f"Prompt sent to LLM:\n---\n{prompt}\n---") # Print full prompt
         try:
-            response = self.model.generate_content(prompt)
+            with metrics.timed("llm_generate", source="gemini"):
+                response = self._generate(prompt, context, generation_config)
             logger.info("Received response from LLM.")
             logger.debug(f"Raw LLM Response:\n---\n{response.text}\n---") # Print raw response
+            self._record_usage(response)
             return response.text
         except Exception as e:
             logger.error(f"Error generating content from LLM: {e}")
             return ""
 
+    def _generate(self, prompt: str, context: str, generation_config: Optional[dict] = None):
+        cache = self._context_cache(context) if context and self.context_caching else None
+        if cache is not None:
+            try:
+                return cache.model.generate_content(prompt, generation_config=generation_config)
+            except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as e:
+                # The cached content expired early or was deleted; the next request registers it again.
+                logger.warning(f"Cached context {cache.name} is no longer available ({e}). Sending the context inline.")
+                self._drop_context_cache(cache)
+        if context:
+            prompt = f"{context}{CONTEXT_SEPARATOR}{prompt}"
+        return self.model.generate_content(prompt, generation_config=generation_config)
+
+    def _context_cache(self, context: str) -> Optional[ContextCache]:
+        """The cached content for `context`, registered on first use and again shortly before its TTL runs out."""
+        key = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        # Refresh a little early, so no request is sent with a cache that expires while in flight.
+        refresh_margin = min(60.0, self.context_cache_ttl_seconds / 10)
+        with self._context_lock:
+            if key in self._uncacheable_contexts:
+                return None
+            cache = self._context_caches.get(key)
+            if cache is not None and time.monotonic() < cache.expires_at - refresh_margin:
+                metrics.CACHE_REQUESTS.inc(cache="llm_context", result="hit")
+                return cache
+            metrics.CACHE_REQUESTS.inc(cache="llm_context", result="miss")
+            try:
+                with metrics.timed("llm_cache_context", source="gemini"):
+                    cached_content = caching.CachedContent.create(
+                        model=self.model_name, display_name=f"calmind-context-{key[:12]}",
+                        system_instruction=context, ttl=int(self.context_cache_ttl_seconds))
+            except google_exceptions.BadRequest as e:
+                # E.g. the context is below the model's minimum size for caching; that won't change for this text.
+                logger.info(f"Context of {len(context)} characters can't be cached ({e}). Sending it inline.")
+                self._uncacheable_contexts.add(key)
+                return None
+            except Exception as e:
+                logger.warning(f"Could not cache the prompt context ({e}). Sending it inline.")
+                return None
+            cache = ContextCache(cached_content.name, genai.GenerativeModel.from_cached_content(cached_content),
+                                 time.monotonic() + self.context_cache_ttl_seconds)
+            logger.info(f"Cached prompt context of {len(context)} characters as {cache.name} for {self.context_cache_ttl_seconds:.0f}s.")
+            self._context_caches[key] = cache
+            return cache
+
+    def _drop_context_cache(self, cache: ContextCache):
+        with self._context_lock:
+            for key, current in list(self._context_caches.items()):
+                if current is cache:
+                    del self._context_caches[key]
+
+    def _record_usage(self, response):
+        usage = getattr(response, 'usage_metadata', None)
+        if not usage:
+            return
+        user = metrics.current_user.get()
+        metrics.LLM_TOKENS.inc(usage.prompt_token_count or 0, kind="prompt", user=user)
+        metrics.LLM_TOKENS.inc(usage.candidates_token_count or 0, kind="output", user=user)
+        metrics.LLM_TOKENS.inc(getattr(usage, 'cached_content_token_count', 0) or 0, kind="cached", user=user)
+
+    def run_batch_job(self, prompts: List[str], context: str = "", generation_config: Optional[dict] = None,
+                      poll_seconds: float = 30.0, timeout_seconds: float = 7200.0) -> List[Optional[str]]:
+        """
+        Sends the prompts as one offline batch job (the Gemini Batch API, which costs less than generateContent
+        but answers within hours rather than seconds), waits for it and returns the answers in prompt order,
+        None for prompts the job didn't answer. A job still running after `timeout_seconds` is cancelled.
+        The SDK has no batch API, so the job is created and polled over REST.
+        """
+        shared = {}
+        if context:
+            shared["systemInstruction"] = {"parts": [{"text": context}]}
+        if generation_config:
+            shared["generationConfig"] = {_camel_case(key): value for key, value in generation_config.items()}
+        inlined = [{"request": {"contents": [{"role": "user", "parts": [{"text": prompt}]}], **shared}, "metadata": {"key": str(i)}}
+                     for i, prompt in enumerate(prompts)]
+        body = {"batch": {"displayName": f"calmind-{int(time.time())}", "inputConfig": {"requests": {"requests": inlined}}}}
+        model = self.model_name if self.model_name.startswith("models/") else f"models/{self.model_name}"
+        base_url = self._rest_base_url()
+        with requests.Session() as session, metrics.timed("llm_batch_job", source="gemini"):
+            session.headers["x-goog-api-key"] = self.api_key
+            response = session.post(f"{base_url}/v1beta/{model}:batchGenerateContent", json=body, timeout=60)
+            response.raise_for_status()
+            job = response.json()
+            logger.info(f"Submitted batch job {job.get('name')} with {len(prompts)} prompts.")
+            deadline = time.monotonic() + timeout_seconds
+            while not job.get("done"):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    session.post(f"{base_url}/v1beta/{job['name']}:cancel", timeout=60)
+                    raise TimeoutError(f"Batch job {job['name']} did not finish within {timeout_seconds:.0f}s and was cancelled.")
+                time.sleep(min(poll_seconds, remaining))
+                response = session.get(f"{base_url}/v1beta/{job['name']}", timeout=60)
+                response.raise_for_status()
+                job = response.json()
+        state = (job.get("metadata") or {}).get("state")
+        if job.get("error") or state in BATCH_JOB_FAILED_STATES:
+            raise RuntimeError(f"Batch job {job.get('name')} ended in state {state}: {(job.get('error') or {}).get('message')}")
+
+        answers: List[Optional[str]] = [None] * len(prompts)
+        for item in ((job.get("response") or {}).get("inlinedResponses") or {}).get("inlinedResponses", []):
+            index = int((item.get("metadata") or {}).get("key", -1))
+            candidates = (item.get("response") or {}).get("candidates") or []
+            if 0 <= index < len(prompts) and candidates:
+                answers[index] = "".join(part.get("text", "") for part in (candidates[0].get("content") or {}).get("parts", []))
+            usage = (item.get("response") or {}).get("usageMetadata") or {}
+            user = metrics.current_user.get()
+            metrics.LLM_TOKENS.inc(usage.get("promptTokenCount", 0), kind="prompt", user=user)
+            metrics.LLM_TOKENS.inc(usage.get("candidatesTokenCount", 0), kind="output", user=user)
+        logger.info(f"Batch job {job.get('name')} answered {sum(answer is not None for answer in answers)} of {len(prompts)} prompts.")
+        return answers
+
+    def _rest_base_url(self) -> str:
+        if not self.api_endpoint:
+            return GEMINI_API_URL
+        return self.api_endpoint.rstrip("/") if "://" in self.api_endpoint else f"https://{self.api_endpoint.rstrip('/')}"
+
     def list_available_models(self):
         logger.info("Listing available models...")
         try:
@@ -35,6 +193,10 @@ class LLMClient:
         except Exception as e:
             logger.error(f"Could not list models: {e}")
 
+def _camel_case(name: str) -> str:
+    first, *rest = name.split("_")
+    return first + "".join(word.capitalize() for word in rest)
+
 if __name__ == '__main__':
     """
     This block is for example usage and testing purposes only.
@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_UNREAD = (-1, -1)
+
+
+class PromptFile:
+    """
+    A static prompt file, such as the summary instructions. It is read once and re-read only when its
+    modification time or size changes, so edits take effect without a restart. A missing or unreadable
+    file gives an empty context.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._text = ""
+        self._stat: Optional[Tuple[int, int]] = _UNREAD
+        self._lock = threading.Lock()
+
+    @property
+    def text(self) -> str:
+        try:
+            stat = os.stat(self.path)
+            current = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            current = None
+        if current == self._stat:
+            return self._text
+        with self._lock:
+            if current != self._stat:
+                self._text = self._read() if current else ""
+                if current is None:
+                    logger.warning(f"Context file not found at {self.path}. LLM will operate without additional context.")
+                self._stat = current
+        return self._text
+
+    def _read(self) -> str:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Error loading context file {self.path}: {e}")
+            return ""
+        logger.info(f"Context file {self.path} {'loaded' if self._stat == _UNREAD else 'reloaded'} ({len(content)} characters).")
+        return content
+
+
+_prompt_files: Dict[str, PromptFile] = {}
+_prompt_files_lock = threading.Lock()
+
+
+def prompt_file(path: str) -> PromptFile:
+    """The process-wide PromptFile for `path`, shared by all summarizers using it."""
+    key = os.path.abspath(path)
+    with _prompt_files_lock:
+        if key not in _prompt_files:
+            _prompt_files[key] = PromptFile(path)
+        return _prompt_files[key]
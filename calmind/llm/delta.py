@@ -0,0 +1,221 @@
+import logging
+from collections import Counter as TallyCounter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pytz
+
+from calmind.reporting.fingerprint import CARD_FIELDS, EVENT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+EVENTS = "events"
+CARDS = "cards"
+ITEM_FIELDS = {EVENTS: EVENT_FIELDS, CARDS: CARD_FIELDS}
+TIME_FIELDS = ("start", "end")
+
+DIGEST_MAX_DAYS = 14
+DIGEST_MAX_NAMES = 8
+
+
+@dataclass
+class ItemChange:
+    item: dict
+    previous: dict
+
+
+@dataclass
+class SnapshotDiff:
+    """The difference between the items of the previous report and the current fetch."""
+    kind: str
+    added: List[dict] = field(default_factory=list)
+    moved: List[ItemChange] = field(default_factory=list) # Start or end time changed
+    updated: List[ItemChange] = field(default_factory=list) # Same time, other details changed
+    cancelled: List[dict] = field(default_factory=list)
+    unchanged: List[dict] = field(default_factory=list)
+    elapsed: int = 0 # Previous items that are now in the past; not reported as cancelled
+
+    @property
+    def change_count(self) -> int:
+        return len(self.added) + len(self.moved) + len(self.updated) + len(self.cancelled)
+
+    @property
+    def change_ratio(self) -> float:
+        return self.change_count / max(1, self.change_count + len(self.unchanged))
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Parses a normalized (ISO format) event time to an aware datetime; dates become midnight UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if len(value) == 10: # All-day events are plain dates
+        parsed = datetime.combine(date.fromisoformat(value), datetime.min.time())
+    return parsed if parsed.tzinfo else pytz.utc.localize(parsed)
+
+
+def _base_key(item: dict, kind: str) -> str:
+    if kind == EVENTS:
+        return item.get("id") or f"summary:{item.get('summary')}"
+    return item.get("url") or f"name:{item.get('name')}"
+
+
+def keyed_items(items: List[dict], kind: str) -> Dict[str, dict]:
+    """
+    Keys items by their source id (falling back to the title). Items sharing an id, such as the
+    occurrences of a CalDAV recurring event, are told apart by their order in time.
+    """
+    groups: Dict[str, List[dict]] = {}
+    for item in items:
+        groups.setdefault(_base_key(item, kind), []).append(item)
+    keyed = {}
+    for key, group in groups.items():
+        if len(group) == 1:
+            keyed[key] = group[0]
+            continue
+        for index, item in enumerate(sorted(group, key=lambda i: (i.get("start") or "", i.get("summary") or i.get("name") or ""))):
+            keyed[f"{key}#{index}"] = item
+    return keyed
+
+
+def diff_items(previous: List[dict], current: List[dict], kind: str, window_start: Optional[datetime] = None) -> SnapshotDiff:
+    """Classifies each normalized item as added, moved, updated, cancelled or unchanged."""
+    diff = SnapshotDiff(kind)
+    previous_by_key = keyed_items(previous, kind)
+    current_by_key = keyed_items(current, kind)
+
+    for key, item in current_by_key.items():
+        old = previous_by_key.get(key)
+        if old is None:
+            diff.added.append(item)
+        elif old == item:
+            diff.unchanged.append(item)
+        elif any(old.get(name) != item.get(name) for name in TIME_FIELDS):
+            diff.moved.append(ItemChange(item, old))
+        else:
+            diff.updated.append(ItemChange(item, old))
+
+    for key, old in previous_by_key.items():
+        if key in current_by_key:
+            continue
+        old_end = parse_time(old.get("end") or old.get("start"))
+        if kind == EVENTS and window_start and old_end and old_end <= window_start:
+            diff.elapsed += 1
+        else:
+            diff.cancelled.append(old)
+    return diff
+
+
+def format_item(item: dict, kind: str) -> str:
+    if kind == EVENTS:
+        return (f"Summary: {item.get('summary')}\nStart: {_display_time(item.get('start'))}\nEnd: {_display_time(item.get('end'))}\n"
+                f"Location: {item.get('location') or 'N/A'}\nDescription: {item.get('description') or 'N/A'}\n---")
+    return f"Name: {item.get('name')}\nDescription: {item.get('description')}\nURL: {item.get('url')}\n---"
+
+
+def _display_time(value: Optional[str]) -> str:
+    parsed = parse_time(value)
+    if parsed is None:
+        return value or "N/A"
+    return parsed.strftime('%Y-%m-%d') if len(value) == 10 else parsed.strftime('%Y-%m-%d %H:%M')
+
+
+def _title(item: dict) -> str:
+    return item.get("summary") or item.get("name") or "Untitled"
+
+
+class DigestBuilder:
+    """
+    Builds a bounded-size digest of normalized items in one pass: the count, counts per day and the
+    titles of the earliest few. Memory depends on the number of days, not the number of items.
+    """
+
+    def __init__(self, kind: str, label: str = "unchanged"):
+        self.kind = kind
+        self.label = label
+        self.count = 0
+        self.per_day = TallyCounter()
+        self._first: List[dict] = []
+
+    def add(self, item: dict):
+        self.count += 1
+        if self.kind == EVENTS:
+            start = parse_time(item.get("start"))
+            self.per_day[start.date() if start else None] += 1
+            self._first.append(item)
+            if len(self._first) > 2 * DIGEST_MAX_NAMES:
+                self._first = sorted(self._first, key=lambda i: i.get("start") or "")[:DIGEST_MAX_NAMES]
+        elif len(self._first) < DIGEST_MAX_NAMES:
+            self._first.append(item)
+
+    def render(self) -> str:
+        if not self.count:
+            return "None."
+        lines = [f"{self.count} {self.label} {self.kind}."]
+        if self.kind == EVENTS:
+            days = sorted(self.per_day.items(), key=lambda pair: pair[0] or date.max)
+            lines.extend(f"{day.strftime('%a %Y-%m-%d') if day else 'No date'}: {count}" for day, count in days[:DIGEST_MAX_DAYS])
+            if len(days) > DIGEST_MAX_DAYS:
+                lines.append(f"... and {sum(count for _, count in days[DIGEST_MAX_DAYS:])} more on later days.")
+            first = sorted(self._first, key=lambda i: i.get("start") or "")[:DIGEST_MAX_NAMES]
+            lines.append("Earliest: " + "; ".join(f"{_display_time(item.get('start'))} {_title(item)}" for item in first))
+        else:
+            lines.append("Including: " + "; ".join(_title(item) for item in self._first))
+        return "\n".join(lines)
+
+
+def digest(items: Iterable[dict], kind: str, label: str = "unchanged") -> str:
+    """A bounded-size digest of items: counts per day and the first few titles."""
+    builder = DigestBuilder(kind, label)
+    for item in items:
+        builder.add(item)
+    return builder.render()
+
+
+def format_changes(diff: SnapshotDiff) -> str:
+    """Lists the changes in full and the unchanged items as a digest."""
+    kind = diff.kind
+    sections = []
+    if diff.added:
+        sections.append(f"Added ({len(diff.added)}):\n" + "\n".join(format_item(item, kind) for item in diff.added))
+    if diff.moved:
+        sections.append(f"Moved ({len(diff.moved)}):\n" + "\n".join(
+            f"Previously: {_display_time(change.previous.get('start'))} - {_display_time(change.previous.get('end'))}\n{format_item(change.item, kind)}"
+            for change in diff.moved))
+    if diff.updated:
+        sections.append(f"Updated ({len(diff.updated)}):\n" + "\n".join(format_item(change.item, kind) for change in diff.updated))
+    if diff.cancelled:
+        label = "Cancelled" if kind == EVENTS else "Removed"
+        sections.append(f"{label} ({len(diff.cancelled)}):\n" + "\n".join(
+            f"- {_title(item)}" + (f" ({_display_time(item.get('start'))})" if item.get("start") else "") for item in diff.cancelled))
+    if diff.elapsed:
+        sections.append(f"{diff.elapsed} {kind} from the previous summary are now in the past; leave them out.")
+    if not sections:
+        sections.append("No changes.")
+    sections.append("Unchanged (digest):\n" + digest(diff.unchanged, kind))
+    return "\n\n".join(sections)
+
+
+def plan_delta(previous_items: Optional[List[dict]], previous_created_at: Optional[datetime], current: List[dict], kind: str,
+               max_age: timedelta, max_change_ratio: float, now: Optional[datetime] = None) -> Optional[SnapshotDiff]:
+    """
+    Returns the diff to summarize incrementally, or None when a full summary is needed: without a previous
+    snapshot, when it is older than `max_age`, or when so much changed that a delta prompt wouldn't be smaller.
+    """
+    if previous_items is None or previous_created_at is None:
+        return None
+    now = now or datetime.now(pytz.utc)
+    if now - previous_created_at > max_age:
+        logger.info(f"Previous {kind} snapshot is older than {max_age}. Summarizing in full.")
+        return None
+    diff = diff_items(previous_items, current, kind, window_start=now)
+    if diff.change_ratio > max_change_ratio:
+        logger.info(f"{diff.change_count} of {len(current)} {kind} changed. Summarizing in full.")
+        return None
+    logger.info(f"Summarizing {kind} incrementally: {len(diff.added)} added, {len(diff.moved)} moved, {len(diff.updated)} updated, "
+                f"{len(diff.cancelled)} cancelled, {len(diff.unchanged)} unchanged, {diff.elapsed} elapsed.")
+    return diff
@@ -0,0 +1,51 @@
+import io
+from typing import Iterable, Optional
+
+from calmind.llm.delta import ITEM_FIELDS, DigestBuilder, format_item
+from calmind.reporting.fingerprint import normalize_item
+
+
+class PromptBuffer:
+    """
+    Builds a prompt incrementally. Fixed text is always written; list items are only added while the
+    prompt stays within `max_chars`, so callers can digest the rest instead of growing the prompt.
+    """
+
+    def __init__(self, max_chars: Optional[int] = None):
+        self.max_chars = max_chars
+        self.size = 0
+        self.omitted = 0
+        self._buffer = io.StringIO()
+
+    def write(self, text: str):
+        self._buffer.write(text)
+        self.size += len(text)
+
+    def add_item(self, text: str) -> bool:
+        """Adds a list item (followed by a newline) and returns False if it didn't fit."""
+        if self.max_chars is not None and self.size + len(text) + 1 > self.max_chars:
+            self.omitted += 1
+            return False
+        self.write(text + "\n")
+        return True
+
+    def getvalue(self) -> str:
+        return self._buffer.getvalue()
+
+
+def write_items(prompt: PromptBuffer, items: Iterable, kind: str) -> int:
+    """
+    Streams items (events or cards, raw or normalized) into the prompt. Items that no longer fit are
+    folded into a digest appended at the end. Returns the number of items written.
+    """
+    overflow = DigestBuilder(kind, label="more")
+    written = 0
+    for item in items:
+        normalized = normalize_item(item, ITEM_FIELDS[kind])
+        if overflow.count or not prompt.add_item(format_item(normalized, kind)):
+            overflow.add(normalized)
+        else:
+            written += 1
+    if overflow.count:
+        prompt.write(f"\nThe remaining {kind} did not fit in this message and are summarized by day:\n{overflow.render()}\n")
+    return written
@@ -1,8 +1,10 @@
-from typing import List
+from typing import Iterable, Optional
 import logging
-import os
 from calmind.calendars.base import CalendarEvent
 from calmind.llm.client import LLMClient
+from calmind.llm.context import prompt_file
+from calmind.llm.delta import EVENTS, SnapshotDiff, format_changes
+from calmind.llm.prompt import PromptBuffer, write_items
 
 logger = logging.getLogger(__name__)
 
@@ -11,46 +13,55 @@ class LLMSummarizer:
         logger.info("Initializing LLM summarizer.")
         self.llm_client = llm_client
         self.context_file = context_file
-        self.context_content = self._load_context_file()
+        self.context = prompt_file(context_file)
 
-    def _load_context_file(self) -> str:
-        if not os.path.exists(self.context_file):
-            logger.warning(f"Context file not found at {self.context_file}. LLM will operate without additional context.")
-            return ""
-        try:
-            with open(self.context_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            logger.info(f"Context file {self.context_file} loaded successfully.")
-            return content
-        except Exception as e:
-            logger.error(f"Error loading context file {self.context_file}: {e}")
-            return ""
+    @property
+    def context_content(self) -> str:
+        """The summary instructions, re-read when the context file changes."""
+        return self.context.text
 
-    def summarize_events(self, events: List[CalendarEvent], user_name: str) -> str:
-        logger.info(f"Starting event summarization for {user_name} with {len(events)} events.")
+    def summarize_events(self, events: Iterable[CalendarEvent], user_name: str, previous_summary: Optional[str] = None,
+                         diff: Optional[SnapshotDiff] = None, max_prompt_chars: Optional[int] = None) -> str:
+        """
+        Summarizes the events, which may be any iterable (e.g. a spool or generator); the prompt is built
+        incrementally and events beyond `max_prompt_chars` are only included as a digest. Given the previous
+        summary and a diff against the events it was written from, only the changes and a digest of the
+        unchanged events are sent, and the model updates it.
+        """
+        logger.info(f"Starting event summarization for {user_name}.")
         if not events:
             logger.info("No events provided for summarization.")
             return "No events to summarize."
 
-        prompt_parts = []
-        if self.context_content:
-            prompt_parts.append(self.context_content)
-            prompt_parts.append("\n---\n") # Separator for context and main prompt
+        if previous_summary and diff is not None:
+            prompt = (
+                f"Hello {user_name}, this is the summary of my calendar events you wrote earlier:"
+                f"\n\n{previous_summary}\n\n---\n"
+                "Since then my calendar changed as listed below. Rewrite the complete summary so it reflects the changes: "
+                "leave out cancelled and past events, show moved events at their new time, highlight new events "
+                "and any new conflicts, and keep the same format."
+                f"\n\nCalendar Changes:\n{format_changes(diff)}"
+            )
+            logger.info(f"Sending incremental prompt to LLM ({diff.change_count} changed events)...")
+            summary = self.llm_client.generate_content(prompt, context=self.context_content)
+            logger.info("Summarization complete.")
+            return summary
 
-        prompt_parts.append(
+        prompt = PromptBuffer(max_prompt_chars)
+        prompt.write(
             f"Hello {user_name}, please summarize the following calendar events. "
             "Provide a concise overview, highlight key meetings or tasks, "
             "and suggest any useful information or potential conflicts that might be relevant to the user. "
             "Also, add any useful info that might be relevant and useful to the enduser."
-            "\n\nCalendar Events:"
+            "\n\nCalendar Events:\n"
         )
+        written = write_items(prompt, events, EVENTS)
+        if prompt.omitted:
+            logger.info(f"Prompt limit of {max_prompt_chars} characters reached after {written} events. {prompt.omitted} more are included as a digest.")
+        prompt = prompt.getvalue()
 
-        for event in events:
-            prompt_parts.append(str(event)) # Using the __str__ method of CalendarEvent
-
-        prompt = "\n".join(prompt_parts)
         logger.info("Sending prompt to LLM for summarization...")
-        summary = self.llm_client.generate_content(prompt)
+        summary = self.llm_client.generate_content(prompt, context=self.context_content)
         logger.info("Summarization complete.")
         return summary
 
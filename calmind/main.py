@@ -1,7 +1,15 @@
 import os
-import shutil
+import time
+import hashlib
+import argparse
+import uuid
 import logging
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
 
 # Configure logging
 logging.basicConfig(
@@ -13,24 +21,81 @@ logging.getLogger().setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 from calmind.config import Config, UserConfig
-from calmind.calendars.google_calendar import GoogleCalendar
-from calmind.calendars.apple_calendar import AppleCalendar
-from calmind.trello.trello_client import TrelloService
+from calmind.calendars.google_calendar import GOOGLE_API_URL, GoogleCalendar
+from calmind.calendars.apple_calendar import ICLOUD_CALDAV_URL, AppleCalendar
+from calmind.calendars.event_store import EVENTS_FILE_NAME, EventStore
+from calmind.trello.trello_client import TRELLO_API_BASE_URL, TrelloService
+from calmind.llm.batching import PromptBatcher
 from calmind.llm.client import LLMClient
 from calmind.llm.summarizer import LLMSummarizer
+from calmind.llm.delta import CARDS, EVENTS, ITEM_FIELDS, plan_delta
 from calmind.trello.trello_summarizer import TrelloSummarizer
+from calmind.reporting.analytics import analyze_schedule, event_arrays
+from calmind.reporting.fingerprint import compute_fingerprint
 from calmind.reporting.generator import ReportGenerator
+from calmind.reporting.markdown_renderer import MarkdownRenderer
+from calmind.reporting.store import ReportStore
 from calmind.emailing.sender import EmailSender
+from calmind.emailing.outbox import OUTBOX_FILE_NAME, EmailOutbox, OutboxDelivery, idempotency_key
+from calmind.scheduling.scheduler import ReportScheduler, event_start
+from calmind.scheduling.sharding import ShardSpec, run_sharded_locally, select_users
+from calmind.scheduling.summary import RunSummary, UserRunResult
+from calmind.monitoring import metrics
+from calmind.monitoring.profiling import profile_run
+from calmind.pipeline.spool import ItemSpool
+from calmind.pipeline.stages import StageGraph
+from calmind.pipeline.resilience import SourceEndpoints
+from calmind.pipeline.source_cache import SourceCache
+from calmind.pipeline.client_pool import ClientPool
+
+NO_SOURCES_MESSAGE = "No sources found."
+NO_CONTENT_MESSAGE = "No events or cards found to summarize."
+
+def apply_store_retention(config: Config, report_store: Optional[ReportStore], event_store: Optional[EventStore],
+                          outbox: Optional[EmailOutbox]):
+    """Retention of the report store, event store and email outbox, for the ones given."""
+    if report_store:
+        report_store.apply_retention()
+    if event_store:
+        event_store.apply_retention()
+    if outbox:
+        purged = outbox.purge_sent(config.get_outbox_config().keep_sent_days)
+        if purged:
+            logger.info(f"Removed {purged} sent emails from the outbox.")
 
 class CalMindApp:
     def __init__(self, config_path='config.yaml'):
         logger.info(f"Initializing application with config path: {config_path}")
         self.config = Config(config_path)
         self.llm_client = None
+        self.llm_batcher = None # Packs the summary requests of concurrently running users (llm.batch)
         self.llm_summarizer = None
         self.trello_summarizer = None
-        self.report_generator = ReportGenerator()
+        reporting_config = self.config.get_reporting_config()
+        self.report_generator = ReportGenerator(
+            store=self.create_report_store(reporting_config) if reporting_config.persist else None,
+            templates_dir=reporting_config.templates_dir,
+            persist=reporting_config.persist,
+            async_writes=reporting_config.async_writes,
+            markdown_renderer=MarkdownRenderer(reporting_config.markdown_backend, reporting_config.markdown_cache_size),
+        )
         self.email_sender = None
+        self.email_outbox = None
+        self.email_delivery = None # Background workers sending queued report emails
+        self.next_event_starts = {} # user name -> earliest upcoming event start (UTC), used for scheduling priority
+        self.profile_dir = None # When set, every run_for_user is profiled into this directory
+        self.skip_unchanged = reporting_config.skip_unchanged and reporting_config.persist
+        self.resend_unchanged = reporting_config.resend_unchanged
+        self.unchanged_users = set() # Users whose last run was skipped because their inputs had not changed
+        resilience_config = self.config.get_resilience_config()
+        self.source_endpoints = SourceEndpoints(resilience_config) # Circuit breakers per source endpoint, shared by all users
+        self.source_clients = ClientPool(self.config.get_pipeline_config().client_idle_seconds) # Authenticated clients reused by later runs
+        self.source_cache = None
+        if resilience_config.stale_fallback:
+            self.source_cache = SourceCache(resilience_config.cache_dir or os.path.join(reporting_config.reports_dir, ".source_cache"))
+        self.stale_sources = {} # user name -> [(source name, fetched at)] served from the source cache in their last run
+        event_store_config = self.config.get_event_store_config()
+        self.event_store = self.create_event_store(reporting_config, event_store_config) if event_store_config.enabled else None
         logger.info("Application components initialized.")
 
     def _initialize_llm(self):
@@ -40,9 +105,14 @@ class CalMindApp:
             logger.warning("LLM API key not configured or is default. LLM summarization will not work.")
             return False
         try:
-            self.llm_client = LLMClient(llm_config.api_key)
-            self.llm_summarizer = LLMSummarizer(self.llm_client, context_file='calmind/llm/email_summary_context.md')
-            self.trello_summarizer = TrelloSummarizer(self.llm_client)
+            self.llm_client = LLMClient(llm_config.api_key, model_name=llm_config.model, api_endpoint=llm_config.api_endpoint,
+                                        context_caching=llm_config.context_caching,
+                                        context_cache_ttl_seconds=llm_config.context_cache_ttl_minutes * 60)
+            summary_client = self.llm_client
+            if llm_config.batch.enabled:
+                self.llm_batcher = summary_client = PromptBatcher(self.llm_client, llm_config.batch)
+            self.llm_summarizer = LLMSummarizer(summary_client, context_file='calmind/llm/email_summary_context.md')
+            self.trello_summarizer = TrelloSummarizer(summary_client)
             logger.info("LLM components initialized successfully.")
             return True
         except Exception as e:
@@ -58,23 +128,79 @@ class CalMindApp:
             return False
         try:
             self.email_sender = EmailSender(config=email_config)
+            outbox_config = self.config.get_outbox_config()
+            if outbox_config.enabled and self.email_delivery is None:
+                self.email_outbox = self.create_outbox(self.config.get_reporting_config(), outbox_config)
+                self.email_outbox.purge_sent(outbox_config.keep_sent_days)
+                self.email_delivery = OutboxDelivery(self.email_outbox, self.email_sender, outbox_config)
+                self.email_delivery.start()
             logger.info("Email sender initialized successfully.")
             return True
         except Exception as e:
             logger.error(f"Error initializing email sender: {e}")
             return False
 
-    def run_for_user(self, user_config: UserConfig, source_name: str = None):
+    @staticmethod
+    def create_event_store(reporting_config, event_store_config) -> EventStore:
+        path = event_store_config.path or os.path.join(reporting_config.reports_dir, EVENTS_FILE_NAME)
+        return EventStore(path, retention_days=event_store_config.retention_days)
+
+    @staticmethod
+    def create_outbox(reporting_config, outbox_config) -> EmailOutbox:
+        path = outbox_config.path or os.path.join(reporting_config.reports_dir, OUTBOX_FILE_NAME)
+        return EmailOutbox(path, lease_seconds=outbox_config.lease_seconds)
+
+    def _send_report(self, user_config: UserConfig, html_report_content: str, summary_hash: str, resend_run_id: Optional[str] = None) -> bool:
+        """
+        Queues the report email in the outbox (or sends it inline when the outbox is disabled). A report is
+        queued at most once per recipient and day of the user's schedule timezone, however many runs deliver
+        it. Re-sends of an unchanged report (`resend_run_id`) are queued once per run.
+        """
+        user_name, recipient = user_config.name, user_config.report_to_email
+        subject = f"CalMind: Your Summary for {user_name}"
+        if self.email_delivery is None:
+            return self.email_sender.send_email(recipient, subject, html_report_content) is not False
+        report_date = datetime.now(pytz.timezone(user_config.schedule.timezone)).date().isoformat()
+        key = idempotency_key(user_name, recipient, summary_hash, report_date, f"resend:{resend_run_id}" if resend_run_id else "report")
+        self.email_outbox.enqueue(user_name, recipient, subject, html_report_content, key)
+        self.email_delivery.notify()
+        return True
+
+    def _drain_outbox(self):
+        """Gives the delivery workers time to send the emails of this run; anything left is sent by a later process."""
+        if self.email_delivery is None:
+            return
+        timeout = self.config.get_outbox_config().drain_timeout_seconds
+        if not self.email_delivery.drain(timeout):
+            logger.warning(f"Emails still queued after {timeout:.0f}s: {self.email_outbox.counts()}. They stay in the outbox "
+                           f"({self.email_outbox.path}) and are sent by the next run.")
+
+    def run_for_user(self, user_config: UserConfig, source_name: str = None, profile_dir: str = None):
+        profile_dir = profile_dir or self.profile_dir
+        if profile_dir:
+            return self.profile_for_user(user_config, profile_dir, source_name)[0]
+        return self._run_for_user_with_metrics(user_config, source_name)
+
+    def profile_for_user(self, user_config: UserConfig, profile_dir: str, source_name: str = None, stage: str = "run_for_user"):
+        """Runs the user's report under the profiler; returns the result and the paths of the written profile files."""
+        # cProfile and the stack sampler only see the calling thread, so profiled runs keep all stages on it.
+        with profile_run(user_config.name, profile_dir, stage=stage) as profile_files:
+            result = self._run_for_user_with_metrics(user_config, source_name, concurrent_stages=False)
+        return result, profile_files
+
+    def _run_for_user_with_metrics(self, user_config: UserConfig, source_name: str = None, concurrent_stages: bool = True):
+        in_flight = self.llm_batcher.run_in_flight() if self.llm_batcher else nullcontext()
+        with in_flight, metrics.user_context(user_config.name), metrics.timed("user_total"):
+            return self._run_for_user(user_config, source_name, concurrent_stages)
+
+    def _run_for_user(self, user_config: UserConfig, source_name: str = None, concurrent_stages: bool = True):
         user_name = user_config.name
-        report_to_email = user_config.report_to_email
         days_to_fetch = user_config.days_to_fetch
 
         logger.info(f"--- Processing for user: {user_name} ---")
         if source_name:
             logger.info(f"Processing for source: {source_name}")
 
-        all_events = []
-        all_cards = []
         start_date = datetime.now()
         end_date = start_date + timedelta(days=days_to_fetch)
 
@@ -84,82 +210,434 @@ class CalMindApp:
 
         if not sources_to_process:
             logger.warning(f"No sources found for user {user_name} with name {source_name}. Skipping.")
-            return "No sources found."
+            return NO_SOURCES_MESSAGE
+
+        # Fetched items are streamed into spools that stay in memory up to a bound and spill to disk beyond it.
+        pipeline_config = self.config.get_pipeline_config()
+        with ItemSpool(EVENTS, ITEM_FIELDS[EVENTS], pipeline_config.spool_memory_bytes) as all_events, \
+                ItemSpool(CARDS, ITEM_FIELDS[CARDS], pipeline_config.spool_memory_bytes) as all_cards:
+            graph = self._build_pipeline(user_config, source_name, sources_to_process, start_date, end_date, all_events, all_cards)
+            results = graph.run(concurrent=concurrent_stages and pipeline_config.concurrent_stages)
+            logger.debug(f"Pipeline stage times for {user_name}: {graph.timings()}")
+        return results.get("unchanged") or results["deliver"] or NO_CONTENT_MESSAGE
+
+    def _build_pipeline(self, user_config: UserConfig, source_name: Optional[str], sources_to_process: list,
+                        start_date: datetime, end_date: datetime, all_events: ItemSpool, all_cards: ItemSpool) -> StageGraph:
+        """
+        Builds the per-user stage graph. Calendar and Trello sources are fetched concurrently, and each summary
+        starts as soon as its items are in; rendering and delivery wait for both summaries:
+
+            fetch_calendars -> next_event_start -> summarize_events -> analytics --+
+                                                                                   +-> render -> deliver
+            fetch_trello --------------------------> summarize_cards --------------+
+
+        When unchanged users are skipped, an `unchanged` stage joins both fetches before the summaries,
+        since the fingerprint covers all items. Stages reading the same spool are kept in sequence.
+        """
+        user_name = user_config.name
+        max_prompt_chars = self.config.get_pipeline_config().max_prompt_chars
+        # Delta summaries need the complete set of items, so single-source runs always summarize in full.
+        track_snapshots = not source_name and self.report_generator.store is not None
+        run_state = {"fingerprint": None, "llm_errors_before": self._llm_error_count(user_name), "stale_sources": [],
+                     "run_id": uuid.uuid4().hex}
+        self.unchanged_users.discard(user_name)
+        self.stale_sources[user_name] = run_state["stale_sources"] # Filled in by the fetch stages
+
+        calendar_sources = [s for s in sources_to_process if s.root.type.lower() != 'trello']
+        card_sources = [s for s in sources_to_process if s.root.type.lower() == 'trello']
 
+        graph = StageGraph("user-pipeline")
+        graph.add("fetch_calendars", lambda _: self._fetch_sources(user_name, calendar_sources, start_date, end_date, all_events, all_cards,
+                                                                   run_state["stale_sources"]))
+        graph.add("fetch_trello", lambda _: self._fetch_sources(user_name, card_sources, start_date, end_date, all_events, all_cards,
+                                                                run_state["stale_sources"]))
+        graph.add("next_event_start", lambda _: self._record_next_event_start(user_name, all_events), after=("fetch_calendars",))
+
+        events_after, cards_after = ("next_event_start",), ("fetch_trello",)
+        if self.skip_unchanged and not source_name:
+            graph.add("unchanged", lambda _: self._check_unchanged(user_config, all_events, all_cards, run_state),
+                      after=("next_event_start", "fetch_trello"))
+            events_after = cards_after = ("unchanged",)
+
+        def changed(results) -> bool:
+            return results.get("unchanged") is None
+
+        graph.add("summarize_events", lambda _: self._summarize(
+                      user_name, EVENTS, all_events, track_snapshots,
+                      lambda previous_summary, diff: self.llm_summarizer.summarize_events(all_events, user_name, previous_summary, diff, max_prompt_chars)),
+                  after=events_after, when=lambda results: changed(results) and bool(all_events) and self.llm_summarizer is not None)
+        graph.add("summarize_cards", lambda _: self._summarize(
+                      user_name, CARDS, all_cards, track_snapshots,
+                      lambda previous_summary, diff: self.trello_summarizer.summarize_cards(all_cards, previous_summary, diff, max_prompt_chars)),
+                  after=cards_after, when=lambda results: changed(results) and bool(all_cards) and self.trello_summarizer is not None)
+
+        graph.add("analytics", lambda _: self._schedule_analytics(user_config, all_events), after=("summarize_events",),
+                  when=lambda results: changed(results) and bool(all_events) and self.config.get_analytics_config().enabled)
+
+        graph.add("render", lambda results: self._render_reports(
+                      user_name, self._stale_notice(run_state["stale_sources"]) + (results["analytics"] or "") +
+                      (results["summarize_events"] or "") + (results["summarize_cards"] or "")),
+                  after=("summarize_events", "summarize_cards", "analytics"),
+                  when=lambda results: bool(results["summarize_events"] or results["summarize_cards"]))
+        graph.add("deliver", lambda results: self._deliver(user_config, results["render"], run_state),
+                  after=("render",), when=lambda results: results["render"] is not None)
+        return graph
+    def _fetch_sources(self, user_name: str, sources_to_process: list, start_date: datetime, end_date: datetime,
+                       all_events: ItemSpool, all_cards: ItemSpool, stale_sources: list):
         for source_union_config in sources_to_process:
             source_config = source_union_config.root 
             source_type = source_config.type.lower()
             current_source_name = source_config.name
+            if source_type not in ('google', 'apple', 'trello'):
+                logger.warning(f"Unsupported source type: {source_type}. Skipping source {current_source_name}.")
+                continue
             logger.info(f"Attempting to access {source_type} source: {current_source_name}")
 
-            if source_type == 'google':
-                calendar_instance = GoogleCalendar(current_source_name, source_config)
-                if calendar_instance.authenticate():
-                    events = calendar_instance.get_events(start_date, end_date)
-                    all_events.extend(events)
-            elif source_type == 'apple':
-                calendar_instance = AppleCalendar(name=current_source_name, config=source_config)
-                if calendar_instance.authenticate():
-                    events = calendar_instance.get_events(start_date, end_date)
-                    all_events.extend(events)
-            elif source_type == 'trello':
-                trello_service = TrelloService(api_key=source_config.api_key, api_token=source_config.api_token, board_id=source_config.board_id)
-                cards = trello_service.get_cards()
-                all_cards.extend(cards)
-            else:
-                logger.warning(f"Unsupported source type: {source_type}. Skipping source {current_source_name}.")
+            spool = all_cards if source_type == 'trello' else all_events
+            checkpoint = spool.checkpoint()
+            errors_before = self._source_error_count(user_name, source_type)
+            try:
+                fetched = self._fetch_source(user_name, source_config, source_type, start_date, end_date, spool)
+            except Exception as e:
+                logger.error(f"Fetching {source_type} source {current_source_name} failed: {e}")
+                fetched = None
+            if fetched is not None and self._source_error_count(user_name, source_type) == errors_before:
+                metrics.ITEMS_FETCHED.inc(fetched, kind=spool.kind, source=source_type, user=user_name)
+                if self.source_cache:
+                    self.source_cache.store(user_name, current_source_name, spool.lines_since(checkpoint))
+                if self.event_store and source_type != 'trello':
+                    self.event_store.replace_events(user_name, current_source_name, spool.lines_since(checkpoint), start_date, end_date)
                 continue
 
-        summary_content = ""
-        if all_events:
-            if self.llm_summarizer:
-                summary_content += self.llm_summarizer.summarize_events(all_events, user_name)
-        
-        if all_cards:
-            if self.trello_summarizer:
-                summary_content += self.trello_summarizer.summarize_cards(all_cards)
+            fetched_at = self._stale_fetch_time(user_name, current_source_name)
+            if fetched_at is None:
+                # Keep whatever was fetched before the failure.
+                logger.warning(f"{source_type} source {current_source_name} failed for {user_name} and has no recent cached data.")
+                continue
+            spool.rollback(checkpoint)
+            cached = 0
+            for line in self.source_cache.lines(user_name, current_source_name):
+                spool.append_line(line)
+                cached += 1
+            stale_sources.append((current_source_name, fetched_at))
+            metrics.STALE_FALLBACKS.inc(source=source_type, user=user_name)
+            logger.warning(f"{source_type} source {current_source_name} failed for {user_name}. Using {cached} cached {spool.kind} "
+                           f"from {fetched_at.isoformat(timespec='minutes')}.")
+
+    def _fetch_source(self, user_name: str, source_config, source_type: str, start_date: datetime, end_date: datetime,
+                      spool: ItemSpool) -> Optional[int]:
+        """Streams one source's items into `spool`; returns how many, or None if it could not be accessed."""
+        with self.source_clients.client((user_name, source_type, source_config.name),
+                                        lambda: self._create_source_client(source_config, source_type)) as client:
+            if client is None:
+                return None
+            if source_type == 'google':
+                return spool.extend(client.iter_events(start_date, end_date))
+            if source_type == 'apple':
+                return spool.extend(client.iter_events(start_date, end_date, include_raw=False))
+            return spool.extend(client.iter_cards())
+
+    def _create_source_client(self, source_config, source_type: str):
+        """A new authenticated client for the source, or None if authentication failed."""
+        if source_type == 'google':
+            policy = self.source_endpoints.policy(source_type, source_config.api_endpoint or GOOGLE_API_URL)
+            calendar_instance = GoogleCalendar(source_config.name, source_config, policy=policy)
+            return calendar_instance if calendar_instance.authenticate() else None
+        if source_type == 'apple':
+            policy = self.source_endpoints.policy(source_type, str(source_config.url) if source_config.url else ICLOUD_CALDAV_URL)
+            calendar_instance = AppleCalendar(name=source_config.name, config=source_config, policy=policy)
+            return calendar_instance if calendar_instance.authenticate() else None
+        policy = self.source_endpoints.policy(source_type, source_config.api_base_url or TRELLO_API_BASE_URL)
+        return TrelloService(api_key=source_config.api_key, api_token=source_config.api_token, board_id=source_config.board_id,
+                             api_base_url=source_config.api_base_url, policy=policy)
+
+    @staticmethod
+    def _source_error_count(user_name: str, source_type: str) -> float:
+        return sum(metrics.STAGE_ERRORS.value(stage=stage, source=source_type, user=user_name)
+                   for stage in ("calendar_auth", "calendar_fetch", "trello_fetch"))
+
+    def _stale_fetch_time(self, user_name: str, source_name: str) -> Optional[datetime]:
+        """When the source's cached items were fetched, if they can stand in for a failed fetch."""
+        if not self.source_cache:
+            return None
+        fetched_at = self.source_cache.fetched_at(user_name, source_name)
+        max_age = timedelta(hours=self.config.get_resilience_config().stale_max_age_hours)
+        if fetched_at is None or datetime.now(pytz.utc) - fetched_at > max_age:
+            return None
+        return fetched_at
+
+    def _check_unchanged(self, user_config: UserConfig, all_events: ItemSpool, all_cards: ItemSpool, run_state: dict):
+        """Fingerprints the fetched items; returns the cached report when they are unchanged, else None."""
+        if not (all_events or all_cards):
+            return None
+        if run_state["stale_sources"]:
+            # The cached report doesn't say that some of its data is stale, so build a new one.
+            return None
+        run_state["fingerprint"] = compute_fingerprint(user_config.name, all_events, all_cards, self._prompt_context(), self._model_name(),
+                                                       self._analytics_settings(user_config))
+        return self._unchanged_report(user_config, run_state["fingerprint"], run_state["run_id"])
+
+    def _analytics_settings(self, user_config: UserConfig) -> dict:
+        """What the schedule table depends on besides the events; part of the fingerprint."""
+        analytics_config = self.config.get_analytics_config()
+        return {**analytics_config.model_dump(mode='json'), "timezone": user_config.schedule.timezone}
 
-        if not summary_content:
-            return "No events or cards found to summarize."
+    @staticmethod
+    def _stale_notice(stale_sources: list) -> str:
+        lines = [f"> **Stale data:** {name} could not be reached. Its items are from the last successful fetch on "
+                 f"{fetched_at.strftime('%Y-%m-%d %H:%M')} UTC.\n" for name, fetched_at in stale_sources]
+        return "\n".join(lines) + "\n" if lines else ""
 
-        html_report_path = self.report_generator.generate_html_report(user_name, summary_content)
-        self.report_generator.generate_md_report(user_name, summary_content)
+    @metrics.instrumented("analytics")
+    def _schedule_analytics(self, user_config: UserConfig, events: ItemSpool) -> str:
+        """The table of meeting load and focus time over the fetched window, shown above the summaries."""
+        analytics_config = self.config.get_analytics_config()
+        timezone = user_config.schedule.timezone
+        starts, ends = event_arrays(events, timezone)
+        analytics = analyze_schedule(starts, ends, datetime.now(pytz.timezone(timezone)).date(), user_config.days_to_fetch,
+                                     timezone, analytics_config)
+        return analytics.to_markdown(analytics_config.work_days, analytics_config.max_table_days)
 
-        with open(html_report_path, 'r', encoding='utf-8') as f:
-            html_report_content = f.read()
+    def _render_reports(self, user_name: str, summary_content: str):
+        html_report_content = self.report_generator.render_html_report(user_name, summary_content)
+        md_report_content = self.report_generator.render_md_report(user_name, summary_content)
+        return summary_content, html_report_content, md_report_content
 
+    def _deliver(self, user_config: UserConfig, rendered, run_state: dict) -> str:
+        user_name = user_config.name
+        report_to_email = user_config.report_to_email
+        summary_content, html_report_content, md_report_content = rendered
+        self.report_generator.save_reports(user_name, html_report_content, md_report_content, summary_content)
+
+        email_sent = True
         if report_to_email and self.email_sender:
-            subject = f"CalMind: Your Summary for {user_name}"
-            self.email_sender.send_email(report_to_email, subject, html_report_content)
+            email_sent = self._send_report(user_config, html_report_content, ReportStore.content_hash(summary_content))
+
+        # Only remember the fingerprint once the run went through, so failed LLM calls and emails are retried next time.
+        fingerprint = run_state["fingerprint"]
+        if fingerprint and email_sent and self._llm_error_count(user_name) == run_state["llm_errors_before"]:
+            self.report_generator.store.save_fingerprint(user_name, fingerprint, self.report_generator.store.content_hash(summary_content))
 
         return html_report_content
 
-    def run(self):
-        logger.info("Starting CalMind application...")
-        reports_dir = "reports"
-        if os.path.exists(reports_dir):
-            shutil.rmtree(reports_dir)
-        os.makedirs(reports_dir, exist_ok=True)
-        
+    def _summarize(self, user_name: str, kind: str, items: ItemSpool, track_snapshots: bool, summarize) -> str:
+        """
+        Calls `summarize(previous_summary, diff)`, incrementally when the user's last snapshot of `kind`
+        allows it, and stores the new snapshot once the summary succeeded. Users with more than
+        `pipeline.max_snapshot_items` items are summarized in full, keeping memory bounded.
+        """
+        llm_config = self.config.get_llm_config()
+        if not track_snapshots or not llm_config.delta_summaries:
+            return summarize(None, None)
+        if len(items) > self.config.get_pipeline_config().max_snapshot_items:
+            logger.info(f"{user_name} has {len(items)} {kind}, more than pipeline.max_snapshot_items. Summarizing in full.")
+            return summarize(None, None)
+
+        store = self.report_generator.store
+        current = list(items)
+        context_hash = hashlib.sha256(f"{self._model_name()}\n{self._prompt_context()}".encode('utf-8')).hexdigest()
+        previous = store.get_snapshot(user_name, kind)
+        diff = None
+        if previous and previous.context_hash == context_hash:
+            diff = plan_delta(previous.items, previous.created_at, current, kind,
+                              max_age=timedelta(hours=llm_config.delta_max_age_hours),
+                              max_change_ratio=llm_config.delta_max_change_ratio)
+        if diff is not None and diff.change_count == 0 and diff.elapsed == 0:
+            logger.info(f"No {kind} changed for {user_name} since the last summary. Reusing it.")
+            return previous.summary
+
+        # The count is per user, so an error in the concurrently running summary also holds back this snapshot; it is
+        # then summarized in full next time.
+        errors_before = self._llm_error_count(user_name)
+        summary = summarize(previous.summary if diff else None, diff)
+        if summary and self._llm_error_count(user_name) == errors_before:
+            # An incremental summary keeps the time of the full summary it builds on, so delta_max_age_hours bounds the chain.
+            store.save_snapshot(user_name, kind, current, summary, context_hash, created_at=previous.created_at if diff else None)
+        return summary
+
+    @staticmethod
+    def _llm_error_count(user_name: str) -> float:
+        return metrics.STAGE_ERRORS.value(stage="llm_generate", source="gemini", user=user_name)
+
+    def _prompt_context(self) -> str:
+        parts = []
+        if self.llm_summarizer:
+            parts.append(self.llm_summarizer.context_content)
+        if self.trello_summarizer:
+            parts.append(self.trello_summarizer.load_context())
+        return "\n---\n".join(parts)
+
+    def _model_name(self) -> str:
+        llm_config = self.config.get_llm_config()
+        return llm_config.model if llm_config and self.llm_client else ""
+
+    def _unchanged_report(self, user_config: UserConfig, fingerprint: str, run_id: str):
+        """
+        Returns the cached HTML report when the user's inputs match the last completed run (re-sending
+        it by email if configured), or None when the pipeline has to run.
+        """
+        user_name = user_config.name
+        store = self.report_generator.store
+        previous = store.get_fingerprint(user_name)
+        if not previous or previous[0] != fingerprint:
+            metrics.CACHE_REQUESTS.inc(cache="fingerprint", result="miss")
+            return None
+        report = store.latest_report(user_name, "html", content_hash=previous[1])
+        if report is None:
+            # The cached report was removed by retention; regenerate it.
+            metrics.CACHE_REQUESTS.inc(cache="fingerprint", result="miss")
+            return None
+        try:
+            html_report_content = store.read_report(report)
+        except OSError as e:
+            logger.warning(f"Cached report {report.path} for {user_name} could not be read ({e}). Regenerating.")
+            metrics.CACHE_REQUESTS.inc(cache="fingerprint", result="miss")
+            return None
+
+        metrics.CACHE_REQUESTS.inc(cache="fingerprint", result="hit")
+        self.unchanged_users.add(user_name)
+        logger.info(f"Inputs for {user_name} are unchanged since the last run. Skipping summarization, rendering and email.")
+        if self.resend_unchanged and user_config.report_to_email and self.email_sender:
+            self._send_report(user_config, html_report_content, previous[1], resend_run_id=run_id)
+        return html_report_content
+
+    def _record_next_event_start(self, user_name: str, events):
+        now = datetime.now(pytz.utc)
+        next_start = min((start for start in map(event_start, events) if start and start > now), default=None)
+        if next_start:
+            self.next_event_starts[user_name] = next_start
+        else:
+            self.next_event_starts.pop(user_name, None)
+
+    def initialize_services(self):
         if not self.config.get_llm_config() or not self._initialize_llm():
             logger.warning("LLM will not be available for summarization.")
         if not self.config.get_email_sender_config() or not self._initialize_email_sender():
             logger.warning("Email sending will not be available.")
 
-        users_config = self.config.get_users_config()
-        if not users_config:
+    def apply_retention(self):
+        """Removes expired reports and stored events, and sent emails past `outbox.keep_sent_days`."""
+        apply_store_retention(self.config, self.report_generator.store, self.event_store, self.email_outbox)
+
+    @classmethod
+    def apply_retention_to_config_stores(cls, config: Config):
+        """`apply_retention` without an app: opens the configured stores, applies retention and closes them again."""
+        reporting_config = config.get_reporting_config()
+        report_store = cls.create_report_store(reporting_config)
+        event_store = cls.create_event_store(reporting_config, config.get_event_store_config()) if config.get_event_store_config().enabled else None
+        outbox = cls.create_outbox(reporting_config, config.get_outbox_config()) if config.get_outbox_config().enabled else None
+        try:
+            apply_store_retention(config, report_store, event_store, outbox)
+        finally:
+            for store in (report_store, event_store, outbox):
+                if store:
+                    store.close()
+
+    def run_daemon(self):
+        """Initializes services once and keeps dispatching scheduled per-user runs until stopped."""
+        self.initialize_services()
+        if not self.config.get_users_config():
             logger.error("No users configured in config.yaml. Exiting.")
             return
+        scheduler = ReportScheduler(self, self.config.get_scheduler_config())
+        scheduler.run_forever()
+
+    def result_status(self, user_name: str, result: str) -> str:
+        """The run summary status of a `run_for_user` result: skipped, unchanged or ok."""
+        if result in (NO_SOURCES_MESSAGE, NO_CONTENT_MESSAGE):
+            return "skipped"
+        if user_name in self.unchanged_users:
+            return "unchanged"
+        return "ok"
+
+    def _run_user_tracked(self, user_config: UserConfig, shard_label: str = None) -> UserRunResult:
+        started = time.perf_counter()
+        try:
+            status = self.result_status(user_config.name, self.run_for_user(user_config))
+            error = None
+        except Exception as e:
+            logger.exception(f"Run failed for user {user_config.name}")
+            status, error = "error", str(e)
+        stale_sources = [name for name, _ in self.stale_sources.get(user_config.name, [])]
+        return UserRunResult(user_config.name, status, round(time.perf_counter() - started, 3), shard_label, error, stale_sources)
+
+    @staticmethod
+    def create_report_store(reporting_config) -> ReportStore:
+        return ReportStore(
+            root=reporting_config.reports_dir,
+            compress=reporting_config.compress,
+            retention_days=reporting_config.retention_days,
+            max_reports_per_user=reporting_config.max_reports_per_user,
+        )
 
-        for user_config in users_config:
-            self.run_for_user(user_config)
+    def run(self, users=None, apply_retention: bool = True, shard_label: str = None) -> RunSummary:
+        logger.info("Starting CalMind application...")
+        summary = RunSummary(shards=[shard_label] if shard_label else [])
+        if apply_retention:
+            self.apply_retention()
 
+        self.initialize_services()
+
+        users_config = self.config.get_users_config() if users is None else users
+        if not users_config:
+            logger.error("No users configured in config.yaml. Exiting.")
+            summary.finish()
+            return summary
+
+        concurrent_users = self.config.get_pipeline_config().concurrent_users
+        if concurrent_users > 1 and len(users_config) > 1:
+            with ThreadPoolExecutor(max_workers=concurrent_users, thread_name_prefix="calmind-user") as executor:
+                for result in executor.map(lambda user_config: self._run_user_tracked(user_config, shard_label), users_config):
+                    summary.add(result)
+        else:
+            for user_config in users_config:
+                summary.add(self._run_user_tracked(user_config, shard_label))
+
+        self.report_generator.flush()
+        self._drain_outbox()
+        summary.metrics = metrics.registry.snapshot()
+        summary.finish()
         logger.info("Application finished.")
+        return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CalMind calendar and Trello summarizer.")
+    parser.add_argument('--daemon', action='store_true', help="Run as a long-lived scheduler that dispatches per-user runs on their schedules.")
+    parser.add_argument('--shard', type=ShardSpec.parse, help="Only process shard i of N (zero-based), e.g. 0/4. Users are split by consistent hashing of their name.")
+    parser.add_argument('--processes', type=int, nargs='?', const=0, default=None,
+                        help="Run the (shard's) users in a local process pool. Defaults to one process per core when given without a value.")
+    parser.add_argument('--profile', nargs='?', const='profiles', default=None, metavar='DIR',
+                        help="Profile each user's run (cProfile .pstats plus .collapsed stacks for flamegraphs) into DIR (default: profiles).")
+    parser.add_argument('--retry-failed-emails', action='store_true', help="Queue report emails that failed permanently or ran out of attempts again.")
+    parser.add_argument('--summary-path', help="Where to write the run summary JSON (per-user results and metrics). Defaults to <reports_dir>/run_summary.json.")
+    return parser.parse_args(argv)
 
 if __name__ == '__main__':
+    args = parse_args()
     logger.info("Application started from main entry point.")
     script_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(script_dir, '..', 'config.yaml')
-    app = CalMindApp(config_path=config_path)
-    app.run()
+    config = Config(config_path)
+    reporting_config = config.get_reporting_config()
+    if args.retry_failed_emails:
+        outbox = CalMindApp.create_outbox(reporting_config, config.get_outbox_config())
+        logger.info(f"Requeued {outbox.requeue_failed()} failed emails.")
+        outbox.close()
+    if args.processes is not None:
+        # Shard workers skip retention, so it runs once here.
+        CalMindApp.apply_retention_to_config_stores(config)
+        summary = run_sharded_locally(config_path, processes=args.processes or None, node_shard=args.shard, profile_dir=args.profile)
+    else:
+        app = CalMindApp(config_path=config_path)
+        app.profile_dir = args.profile
+        if args.daemon:
+            app.run_daemon()
+            summary = None
+        elif args.shard:
+            users = select_users(app.config.get_users_config(), args.shard)
+            summary = app.run(users=users, shard_label=str(args.shard))
+        else:
+            summary = app.run()
+    if summary:
+        summary.write_json(args.summary_path or os.path.join(reporting_config.reports_dir, 'run_summary.json'))
     logger.info("Application execution finished.")
\ No newline at end of file
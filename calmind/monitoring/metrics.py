@@ -0,0 +1,248 @@
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The user whose pipeline is currently running; added as the `user` label on stage metrics.
+current_user: contextvars.ContextVar[str] = contextvars.ContextVar("calmind_current_user", default="")
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = sorted(self._values.items())
+        return {"type": self.type_name, "samples": [
+            {"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in items]}
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def expose(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, dict(series, counts=list(series["counts"]))) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = sorted(self._series.items())
+            return {"type": self.type_name, "buckets": list(self.buckets), "samples": [
+                {"labels": dict(zip(self.labelnames, key)), "counts": list(series["counts"]),
+                 "count": series["count"], "sum": series["sum"]} for key, series in items]}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, tuple(labelnames), **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    """Sums counter values and histogram buckets with the same labels across snapshots (e.g. shards)."""
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in (snapshot or {}).items():
+            target = merged.setdefault(name, {key: value for key, value in metric.items() if key != "samples"})
+            samples = target.setdefault("_by_labels", {})
+            for sample in metric["samples"]:
+                key = tuple(sorted(sample["labels"].items()))
+                existing = samples.get(key)
+                if existing is None:
+                    samples[key] = {k: (list(v) if isinstance(v, list) else v) for k, v in sample.items()}
+                elif metric["type"] == Counter.type_name:
+                    existing["value"] += sample["value"]
+                else:
+                    existing["counts"] = [a + b for a, b in zip(existing["counts"], sample["counts"])]
+                    existing["count"] += sample["count"]
+                    existing["sum"] += sample["sum"]
+    for metric in merged.values():
+        metric["samples"] = list(metric.pop("_by_labels").values())
+    return merged
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "calmind_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage", "source", "user"))
+STAGE_ERRORS = registry.counter(
+    "calmind_stage_errors_total", "Errors raised or reported by each pipeline stage.", ("stage", "source", "user"))
+ITEMS_FETCHED = registry.counter(
+    "calmind_items_fetched_total", "Events and cards fetched from each source.", ("kind", "source", "user"))
+LLM_TOKENS = registry.counter(
+    "calmind_llm_tokens_total", "Tokens reported by the LLM, by kind (prompt/output/cached; prompt includes cached).", ("kind", "user"))
+CACHE_REQUESTS = registry.counter(
+    "calmind_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+CIRCUIT_TRANSITIONS = registry.counter(
+    "calmind_circuit_transitions_total", "Source endpoint circuit breaker state changes, by new state.", ("endpoint", "state"))
+HEDGED_REQUESTS = registry.counter(
+    "calmind_hedged_requests_total", "Source requests that were sent a second time, by the attempt that answered first.", ("endpoint", "winner"))
+OUTBOX_MESSAGES = registry.counter(
+    "calmind_outbox_messages_total", "Report emails by outbox event (queued/duplicate/sent/retried/failed).", ("result",))
+STALE_FALLBACKS = registry.counter(
+    "calmind_stale_fallbacks_total", "Sources served from their last successful fetch after failing.", ("source", "user"))
+LLM_PACKED_PROMPTS = registry.counter(
+    "calmind_llm_packed_prompts_total", "Prompts sent packed with other users' prompts, by mode (online/offline) and result (answered/fallback).",
+    ("mode", "result"))
+REPORT_REQUESTS = registry.counter(
+    "calmind_report_requests_total", "Web report requests, by whether they started a run or joined one already running.", ("result",))
+
+
+def record_error(stage: str, source: str = ""):
+    STAGE_ERRORS.inc(stage=stage, source=source, user=current_user.get())
+
+
+# Stage stacks per thread id, maintained only while a profiler needs to tag samples with the stage.
+track_stages = False
+active_stages: Dict[int, List[str]] = {}
+
+
+@contextlib.contextmanager
+def timed(stage: str, source: str = ""):
+    """Records the duration of the block for `stage`, and an error if it raises."""
+    tracking = track_stages
+    if tracking:
+        active_stages.setdefault(threading.get_ident(), []).append(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage, source)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=stage, source=source, user=current_user.get())
+        if tracking:
+            stack = active_stages.get(threading.get_ident())
+            if stack:
+                stack.pop()
+
+
+@contextlib.contextmanager
+def user_context(user_name: str):
+    token = current_user.set(user_name)
+    try:
+        yield
+    finally:
+        current_user.reset(token)
+
+
+def instrumented(stage: str, source: str = "", error_on_false: bool = False):
+    """
+    Decorator form of `timed`. With `error_on_false`, a `False` return value also counts as an
+    error, for methods that report failure that way instead of raising.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(stage, source):
+                result = function(*args, **kwargs)
+            if error_on_false and result is False:
+                record_error(stage, source)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+import cProfile
+import contextlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter
+from datetime import datetime
+from typing import Dict
+
+from calmind.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# cProfile can only have one active profiler per process on newer Pythons, so profiled runs are serialized.
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread at a fixed interval and tallies collapsed stacks.
+
+    Each stack is prefixed with the user and the innermost pipeline stage active at sample time,
+    so the output can be fed to flamegraph.pl / speedscope and filtered per stage.
+    """
+
+    def __init__(self, thread_id: int, user_name: str, interval_seconds: float = 0.005):
+        self.thread_id = thread_id
+        self.user_name = user_name
+        self.interval_seconds = interval_seconds
+        self.samples: TallyCounter = TallyCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="calmind-stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stages = metrics.active_stages.get(self.thread_id) or ["-"]
+            self.samples[";".join([self.user_name, stages[-1]] + stack[::-1])] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack.replace(' ', '_')} {count}\n")
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', value).strip('_') or "run"
+
+
+@contextlib.contextmanager
+def profile_run(user_name: str, output_dir: str = "profiles", stage: str = "run_for_user",
+                sample_interval_seconds: float = 0.005):
+    """
+    Profiles the enclosed block with cProfile and a stack sampler. Writes `<user>_<stage>_<time>.pstats`
+    and a matching `.collapsed` file into `output_dir`; the paths are put into the yielded dict.
+    """
+    result: Dict[str, str] = {}
+    with _profile_lock:
+        os.makedirs(output_dir, exist_ok=True)
+        base_name = f"{_safe_name(user_name)}_{_safe_name(stage)}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), user_name, sample_interval_seconds)
+
+        metrics.track_stages = True
+        sampler.start()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            sampler.stop()
+            metrics.track_stages = False
+            metrics.active_stages.pop(threading.get_ident(), None)
+
+            result["pstats"] = os.path.join(output_dir, base_name + ".pstats")
+            result["collapsed"] = os.path.join(output_dir, base_name + ".collapsed")
+            profiler.dump_stats(result["pstats"])
+            sampler.write_collapsed(result["collapsed"])
+            logger.info(f"Profile for {user_name} ({stage}, {time.perf_counter() - started:.2f}s) written to {result['pstats']} and {result['collapsed']}")
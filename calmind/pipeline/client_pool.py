@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ClientPool:
+    """
+    Authenticated source clients kept between runs, so the next run of the same source skips the login and
+    discovery round trips (token loading, CalDAV principal and calendar lookup) and reuses open connections.
+    A client is checked out for the whole fetch, so concurrent runs never share one. A client whose fetch
+    raised is dropped, as are clients idle for longer than `max_idle_seconds`; 0 disables pooling.
+    """
+
+    def __init__(self, max_idle_seconds: float = 300.0, max_idle_per_key: int = 2):
+        self.max_idle_seconds = max_idle_seconds
+        self.max_idle_per_key = max_idle_per_key
+        self._idle: Dict[Hashable, List[Tuple[float, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self, key: Hashable, create: Callable[[], Optional[Any]]) -> Iterator[Optional[Any]]:
+        """
+        Yields an idle client for `key`, or one made by `create`, and puts it back afterwards. `create`
+        returns None when the source can't be accessed; None is yielded then and nothing is pooled.
+        """
+        client = self._take(key)
+        if client is None:
+            client = create()
+        else:
+            logger.debug(f"Reusing pooled client for {key}.")
+        yield client
+        if client is not None:
+            self._put(key, client)
+
+    def _take(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                returned_at, client = idle.pop()
+                if now - returned_at <= self.max_idle_seconds:
+                    return client
+        return None
+
+    def _put(self, key: Hashable, client: Any):
+        if self.max_idle_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for pooled_key in list(self._idle):
+                self._idle[pooled_key] = [entry for entry in self._idle[pooled_key] if now - entry[0] <= self.max_idle_seconds]
+                if not self._idle[pooled_key]:
+                    del self._idle[pooled_key]
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append((now, client))
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
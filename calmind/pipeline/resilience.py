@@ -0,0 +1,182 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Type
+from urllib.parse import urlparse
+
+from calmind.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS", "PROPFIND", "REPORT"} # Requests that can be hedged (sent twice)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+    def __init__(self, endpoint: str, retry_in_seconds: float):
+        super().__init__(f"Circuit for {endpoint} is open after repeated failures; retrying in {retry_in_seconds:.0f}s.")
+        self.endpoint = endpoint
+        self.retry_in_seconds = retry_in_seconds
+
+
+class CircuitBreaker:
+    """
+    Health of one endpoint. After `failure_threshold` consecutive failures the circuit opens and calls fail
+    fast with CircuitOpenError. After `reset_timeout_seconds` one probe call is let through (half-open):
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = 3, reset_timeout_seconds: float = 60.0):
+        self.endpoint = endpoint
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout_seconds - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.endpoint, max(0.0, retry_in))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state: str):
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit for {self.endpoint}: {self.state} -> {state} ({self.failures} consecutive failures).")
+        self.state = state
+        metrics.CIRCUIT_TRANSITIONS.inc(endpoint=self.endpoint, state=state)
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="calmind-hedge")
+        return _hedge_executor
+
+
+def hedged_call(function: Callable, hedge_after_seconds: float, endpoint: str = ""):
+    """
+    Calls `function` on a worker thread. If it hasn't returned within `hedge_after_seconds`, a second
+    attempt is started and the first successful result is returned; the slower attempt finishes in the
+    background and is ignored. Only use this for idempotent requests.
+    """
+    futures = [_executor().submit(contextvars.copy_context().run, function)]
+    done, _ = wait(futures, timeout=hedge_after_seconds)
+    if not done:
+        futures.append(_executor().submit(contextvars.copy_context().run, function))
+    pending, error = set(futures), None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if len(futures) > 1:
+                metrics.HEDGED_REQUESTS.inc(endpoint=endpoint, winner="hedge" if future is futures[1] else "primary")
+            return result
+    raise error
+
+
+@dataclass
+class EndpointPolicy:
+    """How source clients call one endpoint: timeouts, its circuit breaker and optional hedging."""
+    endpoint: str = ""
+    connect_timeout_seconds: Optional[float] = None
+    read_timeout_seconds: Optional[float] = None
+    breaker: Optional[CircuitBreaker] = None
+    hedge_after_seconds: Optional[float] = None
+
+    @property
+    def timeout(self) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """(connect, read) timeout for requests-style clients."""
+        if self.connect_timeout_seconds is None and self.read_timeout_seconds is None:
+            return None
+        return (self.connect_timeout_seconds, self.read_timeout_seconds)
+
+    def call(self, function: Callable, failed_result: Optional[Callable] = None,
+             transient_errors: Tuple[Type[BaseException], ...] = (OSError,), idempotent: bool = False):
+        """
+        Calls `function` through the circuit breaker. Transient errors (connection problems and timeouts)
+        and results matching `failed_result` (e.g. 5xx responses) count as endpoint failures; other errors,
+        such as rejected credentials, mean the endpoint is up.
+        """
+        attempt = function
+        if self.hedge_after_seconds and idempotent:
+            attempt = lambda: hedged_call(function, self.hedge_after_seconds, self.endpoint)
+        if self.breaker is None:
+            return attempt()
+        self.breaker.before_call()
+        try:
+            result = attempt()
+        except transient_errors:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_success()
+            raise
+        if failed_result is not None and failed_result(result):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+
+class SourceEndpoints:
+    """The circuit breakers of all source endpoints (per source type and host), shared across users and runs."""
+
+    def __init__(self, config):
+        self.config = config
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def policy(self, source_type: str, url: Optional[str]) -> EndpointPolicy:
+        endpoint = f"{source_type}:{urlparse(url).netloc.rsplit('@', 1)[-1] if url else 'default'}"
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    endpoint, self.config.failure_threshold, self.config.reset_timeout_seconds)
+        return EndpointPolicy(endpoint, self.config.connect_timeout_seconds, self.config.read_timeout_seconds,
+                              breaker, self.config.hedge_after_seconds)
+
+    def states(self) -> Dict[str, str]:
+        with self._lock:
+            return {endpoint: breaker.state for endpoint, breaker in self._breakers.items()}
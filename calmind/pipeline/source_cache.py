@@ -0,0 +1,53 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+
+class SourceCache:
+    """
+    The last successful fetch of each user's source, as gzipped JSON lines of normalized items, so a
+    source that is down can be served from it. A file is replaced atomically once its fetch completes;
+    its modification time is the time of that fetch.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, user_name: str, source_name: str) -> str:
+        key = hashlib.sha256(f"{user_name}\0{source_name}".encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.root, f"{key}.jsonl.gz")
+
+    def store(self, user_name: str, source_name: str, lines: Iterable[str]) -> int:
+        path = self._path(user_name, source_name)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        count = 0
+        try:
+            with gzip.open(temporary_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                for line in lines:
+                    f.write(line)
+                    count += 1
+            os.replace(temporary_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache the items of {source_name} for {user_name}: {e}")
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return count
+
+    def fetched_at(self, user_name: str, source_name: str) -> Optional[datetime]:
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(self._path(user_name, source_name)), pytz.utc)
+        except OSError:
+            return None
+
+    def lines(self, user_name: str, source_name: str) -> Iterator[str]:
+        with gzip.open(self._path(user_name, source_name), 'rt', encoding='utf-8') as f:
+            yield from f
@@ -0,0 +1,88 @@
+import json
+import logging
+import tempfile
+from typing import Iterator, Tuple
+
+from calmind.reporting.fingerprint import normalize_item
+
+logger = logging.getLogger(__name__)
+
+
+class ItemSpool:
+    """
+    Normalized fetched items (events or cards) of one user, written as JSON lines. The spool is kept in
+    memory up to `max_memory_bytes` and spills to a temporary file beyond that, so a user's peak memory
+    doesn't grow with the number of items. It can be iterated any number of times once filled, but only
+    by one thread at a time, since all readers share the file position.
+    """
+
+    def __init__(self, kind: str, fields: Tuple[str, ...], max_memory_bytes: int = 4 * 1024 * 1024):
+        self.kind = kind
+        self.fields = fields
+        self.count = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes, mode='w+', encoding='utf-8')
+
+    def append(self, item):
+        self._file.write(json.dumps(normalize_item(item, self.fields)))
+        self._file.write("\n")
+        self.count += 1
+
+    def extend(self, items) -> int:
+        """Appends items from an iterable (e.g. a backend generator) and returns how many were added."""
+        before = self.count
+        for item in items:
+            self.append(item)
+        return self.count - before
+
+    def append_line(self, line: str):
+        """Appends an item that is already normalized and JSON encoded (e.g. read back from a source cache)."""
+        self._file.write(line if line.endswith("\n") else line + "\n")
+        self.count += 1
+
+    def checkpoint(self) -> Tuple[int, int]:
+        """The current end of the spool, to roll back to or read from."""
+        return self._file.tell(), self.count
+
+    def rollback(self, checkpoint: Tuple[int, int]):
+        """Drops the items appended since `checkpoint`."""
+        position, self.count = checkpoint
+        self._file.seek(position)
+        self._file.truncate()
+
+    def lines_since(self, checkpoint: Tuple[int, int]) -> Iterator[str]:
+        """Yields the JSON lines of the items appended since `checkpoint`."""
+        self._file.flush()
+        self._file.seek(checkpoint[0])
+        try:
+            while True:
+                line = self._file.readline()
+                if not line:
+                    break
+                yield line
+        finally:
+            self._file.seek(0, 2) # Back to the end for further appends
+
+    @property
+    def spilled(self) -> bool:
+        return bool(getattr(self._file, '_rolled', False))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __iter__(self) -> Iterator[dict]:
+        for line in self.lines_since((0, 0)):
+            yield json.loads(line)
+
+    def close(self):
+        if self.spilled:
+            logger.info(f"Spooled {self.count} {self.kind} to disk.")
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
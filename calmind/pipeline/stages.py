@@ -0,0 +1,111 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    function: Callable[[Dict[str, Any]], Any] # Called with the results of the stages finished so far
+    after: Tuple[str, ...] = ()
+    when: Optional[Callable[[Dict[str, Any]], bool]] = None # Evaluated on the results so far; False skips the stage
+    seconds: Optional[float] = None
+    skipped: bool = False
+
+
+@dataclass
+class StageGraph:
+    """
+    A small DAG of pipeline stages. Each stage starts as soon as the stages it runs `after` have finished,
+    so independent branches (e.g. summarizing events and Trello cards) overlap and a run takes as long as
+    its slowest path instead of the sum of all stages.
+
+    Stages run on worker threads in a copy of the caller's context, so context variables such as the
+    current metrics user carry over. A failing stage stops new stages from starting; the first error is
+    re-raised once the running ones have finished.
+    """
+    name: str = "pipeline"
+    stages: Dict[str, Stage] = field(default_factory=dict)
+
+    def add(self, name: str, function: Callable[[Dict[str, Any]], Any], after: Tuple[str, ...] = (),
+            when: Optional[Callable[[Dict[str, Any]], bool]] = None) -> str:
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already part of {self.name}.")
+        missing = [dependency for dependency in after if dependency not in self.stages]
+        if missing:
+            # Requiring dependencies to be added first also rules out cycles.
+            raise ValueError(f"Stage {name} runs after unknown stages: {', '.join(missing)}")
+        self.stages[name] = Stage(name, function, tuple(after), when)
+        return name
+
+    def run(self, concurrent: bool = True) -> Dict[str, Any]:
+        """Runs every stage and returns their results by name; skipped stages have the result None."""
+        if not concurrent or len(self.stages) < 2:
+            return self._run_inline()
+        results: Dict[str, Any] = {}
+        pending: List[Stage] = list(self.stages.values())
+        running = {}
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=len(self.stages), thread_name_prefix=f"calmind-{self.name}") as executor:
+            while True:
+                if error is None:
+                    self._start_ready(pending, results, running, executor)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Stage {stage.name} of {self.name} failed: {e}")
+                        error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _start_ready(self, pending: List[Stage], results: Dict[str, Any], running: dict, executor: ThreadPoolExecutor):
+        # A skipped stage counts as finished, which can make further stages ready in the same pass.
+        progressed = True
+        while progressed:
+            progressed = False
+            for stage in [s for s in pending if all(dependency in results for dependency in s.after)]:
+                pending.remove(stage)
+                if self._should_run(stage, results):
+                    running[executor.submit(contextvars.copy_context().run, self._call, stage, dict(results))] = stage
+                else:
+                    progressed = True
+
+    def _run_inline(self) -> Dict[str, Any]:
+        """Runs the stages one after the other in insertion order, which is a valid topological order."""
+        results: Dict[str, Any] = {}
+        for stage in self.stages.values():
+            if self._should_run(stage, results):
+                results[stage.name] = self._call(stage, results)
+        return results
+
+    @staticmethod
+    def _should_run(stage: Stage, results: Dict[str, Any]) -> bool:
+        if stage.when is None or stage.when(results):
+            return True
+        stage.skipped = True
+        results[stage.name] = None
+        logger.debug(f"Skipping stage {stage.name}.")
+        return False
+
+    @staticmethod
+    def _call(stage: Stage, results: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            return stage.function(results)
+        finally:
+            stage.seconds = time.perf_counter() - started
+            logger.debug(f"Stage {stage.name} took {stage.seconds:.3f}s.")
+
+    def timings(self) -> Dict[str, float]:
+        return {stage.name: round(stage.seconds, 4) for stage in self.stages.values() if stage.seconds is not None}
@@ -0,0 +1,164 @@
+import json
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pytz
+
+from calmind.config import AnalyticsConfig
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+
+
+def _local_timestamp(tz, day: date, at: time) -> float:
+    return tz.localize(datetime.combine(day, at)).timestamp()
+
+
+def _parse_time(value: str) -> time:
+    return datetime.strptime(value, "%H:%M").time()
+
+
+def event_arrays(events: Iterable, timezone: str = "UTC") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end timestamps (seconds since the epoch) of the timed events among normalized event dicts
+    or their JSON lines. All-day events and events without a start are left out; naive times are taken
+    to be in `timezone`, and events without an end are treated as zero-length.
+    """
+    tz = pytz.timezone(timezone)
+    starts: List[float] = []
+    ends: List[float] = []
+    for event in events:
+        if isinstance(event, str):
+            event = json.loads(event)
+        start, end = event.get("start"), event.get("end")
+        if not start or len(start) == 10:
+            continue
+        try:
+            parsed_start = datetime.fromisoformat(start)
+            parsed_end = datetime.fromisoformat(end) if end else parsed_start
+        except ValueError:
+            continue
+        if parsed_start.tzinfo is None:
+            parsed_start = tz.localize(parsed_start)
+        if parsed_end.tzinfo is None:
+            parsed_end = tz.localize(parsed_end)
+        starts.append(parsed_start.timestamp())
+        ends.append(parsed_end.timestamp())
+    return np.array(starts, dtype=np.float64), np.array(ends, dtype=np.float64)
+
+
+@dataclass
+class ScheduleAnalytics:
+    """Per-day schedule statistics; every array has one entry per day from `first_day` on."""
+    first_day: date
+    meetings: np.ndarray # Timed events starting that day
+    meeting_hours: np.ndarray # Time covered by at least one meeting, so overlaps count once
+    back_to_back_chains: np.ndarray # Runs of two or more meetings with at most the configured gap between them
+    longest_chain_hours: np.ndarray
+    focus_blocks: np.ndarray # Free stretches within working hours of at least the minimum focus length
+    focus_hours: np.ndarray
+    after_hours: np.ndarray # Meetings starting before or ending after working hours, or on a day off
+
+    @property
+    def days(self) -> int:
+        return len(self.meetings)
+
+    def day(self, index: int) -> date:
+        return self.first_day + timedelta(days=index)
+
+    def to_markdown(self, work_days: Iterable[int] = range(5), max_days: int = 14) -> str:
+        """A compact table of the first `max_days` working days or days with meetings, and totals for all days."""
+        work_days = set(work_days)
+        rows = [i for i in range(self.days) if self.day(i).weekday() in work_days or self.meetings[i]][:max_days]
+        lines = [
+            "## Schedule at a Glance\n",
+            "| Day | Meetings | Meeting time | Back-to-back | Focus time | After hours |",
+            "|-----|---------:|-------------:|-------------:|-----------:|------------:|",
+        ]
+        for i in rows:
+            lines.append(f"| {self.day(i).strftime('%a %d %b')} | {self.meetings[i]} | {self.meeting_hours[i]:.1f}h | "
+                         f"{_count_with_hours(self.back_to_back_chains[i], self.longest_chain_hours[i])} | "
+                         f"{_count_with_hours(self.focus_blocks[i], self.focus_hours[i])} | {self.after_hours[i]} |")
+        lines.append(f"| **Next {self.days} days** | **{self.meetings.sum()}** | **{self.meeting_hours.sum():.1f}h** | "
+                     f"**{_count_with_hours(self.back_to_back_chains.sum(), self.longest_chain_hours.max(initial=0))}** | "
+                     f"**{_count_with_hours(self.focus_blocks.sum(), self.focus_hours.sum())}** | **{self.after_hours.sum()}** |")
+        return "\n".join(lines) + "\n\n"
+
+
+def _count_with_hours(count, hours) -> str:
+    return f"{count} ({hours:.1f}h)" if count else "-"
+
+
+def analyze_schedule(starts: np.ndarray, ends: np.ndarray, first_day: date, days: int, timezone: str,
+                     config: AnalyticsConfig) -> ScheduleAnalytics:
+    """
+    Computes the per-day statistics of the events with the given start and end timestamps, for `days`
+    local days from `first_day` in `timezone`. Events are assigned to the day they start on and cut off at
+    its end; events lasting a day or longer are markers (travel, out of office) rather than meetings and are
+    left out. Apart from one timezone lookup per day, all work is done on arrays.
+    """
+    tz = pytz.timezone(timezone)
+    work_start_time, work_end_time = _parse_time(config.work_start), _parse_time(config.work_end)
+    dates = [first_day + timedelta(days=i) for i in range(days)]
+    # Local midnights bound the days, so a DST change gives its day 23 or 25 hours.
+    bounds = np.array([_local_timestamp(tz, day, time.min) for day in dates + [first_day + timedelta(days=days)]])
+    work_start = np.array([_local_timestamp(tz, day, work_start_time) for day in dates])
+    work_end = np.array([_local_timestamp(tz, day, work_end_time) if day.weekday() in config.work_days else work_start[i]
+                         for i, day in enumerate(dates)]) # Days off have an empty working window
+
+    keep = (ends > starts) & (ends - starts < DAY_SECONDS) & (starts >= bounds[0]) & (starts < bounds[-1])
+    order = np.argsort(starts[keep], kind="stable")
+    starts, ends = starts[keep][order], ends[keep][order]
+    day = np.searchsorted(bounds, starts, side="right") - 1
+    clipped_ends = np.minimum(ends, bounds[day + 1])
+
+    meetings = np.bincount(day, minlength=days)
+    after_hours = np.bincount(day, weights=(starts < work_start[day]) | (ends > work_end[day]), minlength=days).astype(np.int64)
+
+    # Merge overlapping meetings into busy blocks: a meeting opens a block when it starts at or after the
+    # latest end so far. Ends are clipped to their day, so blocks never span two days.
+    new_block = np.ones(len(starts), dtype=bool)
+    new_block[1:] = starts[1:] >= np.maximum.accumulate(clipped_ends)[:-1]
+    block_index = np.flatnonzero(new_block)
+    block_start = starts[block_index]
+    block_end = np.maximum.reduceat(clipped_ends, block_index) if len(block_index) else clipped_ends
+    block_day = day[block_index]
+    meeting_hours = np.bincount(block_day, weights=block_end - block_start, minlength=days) / 3600
+
+    # Chain consecutive blocks of the same day that are at most the back-to-back gap apart.
+    gap = config.back_to_back_gap_minutes * 60
+    new_chain = np.ones(len(block_start), dtype=bool)
+    new_chain[1:] = (block_start[1:] - block_end[:-1] > gap) | (block_day[1:] != block_day[:-1])
+    chain_index = np.flatnonzero(new_chain)
+    chain_of_meeting = np.cumsum(new_chain)[np.cumsum(new_block) - 1] - 1
+    chain_meetings = np.bincount(chain_of_meeting, minlength=len(chain_index))
+    chain_last_block = np.append(chain_index[1:], len(block_start))[:len(chain_index)] - 1
+    chain_hours = (block_end[chain_last_block] - block_start[chain_index]) / 3600
+    chained = chain_meetings >= 2
+    chain_day = block_day[chain_index][chained]
+    back_to_back_chains = np.bincount(chain_day, minlength=days)
+    longest_chain_hours = np.zeros(days)
+    np.maximum.at(longest_chain_hours, chain_day, chain_hours[chained])
+
+    # Free time within working hours is the gap between consecutive busy blocks, with each day's start and
+    # end of work added as empty blocks so the stretches before the first and after the last meeting count.
+    busy_start = np.clip(block_start, work_start[block_day], work_end[block_day])
+    busy_end = np.clip(block_end, work_start[block_day], work_end[block_day])
+    all_days = np.arange(days)
+    span_day = np.concatenate([all_days, block_day, all_days])
+    span_start = np.concatenate([work_start, busy_start, work_end])
+    span_end = np.concatenate([work_start, busy_end, work_end])
+    rank = np.concatenate([np.zeros(days), np.ones(len(block_start)), np.full(days, 2)])
+    order = np.lexsort((rank, span_start, span_day))
+    span_day, span_start, span_end = span_day[order], span_start[order], span_end[order]
+    free = span_start[1:] - np.maximum.accumulate(span_end)[:-1]
+    focus = (span_day[1:] == span_day[:-1]) & (free >= config.min_focus_minutes * 60)
+    focus_blocks = np.bincount(span_day[1:][focus], minlength=days)
+    focus_hours = np.bincount(span_day[1:][focus], weights=free[focus], minlength=days) / 3600
+
+    return ScheduleAnalytics(first_day, meetings, meeting_hours, back_to_back_chains, longest_chain_hours,
+                             focus_blocks, focus_hours, after_hours)
@@ -0,0 +1,56 @@
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+# Bump when the normalization or the downstream pipeline changes in a way that should invalidate stored fingerprints.
+FINGERPRINT_VERSION = 3
+
+EVENT_FIELDS = ("id", "summary", "start", "end", "location", "description")
+CARD_FIELDS = ("name", "description", "url")
+
+
+def _normalize_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def normalize_item(item, fields) -> dict:
+    # Apple events are dicts (with volatile raw iCal data), Google events and Trello cards are objects.
+    get = item.get if isinstance(item, dict) else lambda name: getattr(item, name, None)
+    return {name: _normalize_value(get(name)) for name in fields}
+
+
+def items_digest(items: Iterable, fields) -> str:
+    """
+    Order-independent digest of the normalized items, computed in one streaming pass: the item hashes are
+    summed, so neither the items nor their hashes have to be held in memory or sorted.
+    """
+    total, count = 0, 0
+    for item in items:
+        item_hash = hashlib.sha256(json.dumps(normalize_item(item, fields), sort_keys=True).encode('utf-8')).digest()
+        total = (total + int.from_bytes(item_hash, 'big')) % (1 << 256)
+        count += 1
+    return f"{count}:{total:064x}"
+
+
+def compute_fingerprint(user_name: str, events: Iterable, cards: Iterable, prompt_context: str, model: str,
+                        analytics: Optional[dict] = None) -> str:
+    """
+    Hashes everything that determines a user's report: the normalized events and cards, the prompt
+    context and the model, and the settings of the schedule table (`analytics`). Two runs with the same
+    fingerprint would send the same prompt to the same model and compute the same table.
+    """
+    payload = {
+        "version": FINGERPRINT_VERSION,
+        "user": user_name,
+        "model": model,
+        "prompt_context": prompt_context,
+        "events": items_digest(events, EVENT_FIELDS),
+        "cards": items_digest(cards, CARD_FIELDS),
+        "analytics": analytics,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
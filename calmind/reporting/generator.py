@@ -1,58 +1,155 @@
 import os
 import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from markdown2 import markdown
+from string import Formatter
+from typing import Dict, List, Optional
+from calmind.reporting.markdown_renderer import MarkdownRenderer
+from calmind.reporting.store import ReportStore
+from calmind.monitoring import metrics
 
 logger = logging.getLogger(__name__)
 
+class CompiledTemplate:
+    """A `str.format` style template parsed once into literal and field segments."""
+
+    def __init__(self, source: str):
+        self.segments = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            if literal:
+                self.segments.append((True, literal))
+            if field_name is not None:
+                if format_spec or conversion or not field_name.isidentifier():
+                    raise ValueError(f"Unsupported template field '{{{field_name}}}'. Only plain {{name}} fields are supported.")
+                self.segments.append((False, field_name))
+
+    def render(self, **values) -> str:
+        return "".join(text if is_literal else str(values[text]) for is_literal, text in self.segments)
+
+_template_cache: Dict[str, CompiledTemplate] = {}
+_template_cache_lock = threading.Lock()
+
+def clear_template_cache():
+    with _template_cache_lock:
+        _template_cache.clear()
+
 class ReportGenerator:
-    def __init__(self, reports_dir="reports", templates_dir="templates"):
-        self.reports_dir = reports_dir
+    def __init__(self, reports_dir="reports", templates_dir="templates", persist: bool = True, async_writes: bool = True,
+                 markdown_renderer: Optional[MarkdownRenderer] = None, store: Optional[ReportStore] = None):
+        self.reports_dir = store.root if store else reports_dir
         self.templates_dir = templates_dir
-        logger.info(f"Initializing with reports_dir={self.reports_dir}, templates_dir={self.templates_dir}")
-        os.makedirs(self.reports_dir, exist_ok=True)
+        self.persist = persist
+        self.markdown_renderer = markdown_renderer or MarkdownRenderer()
+        self.store = store or (ReportStore(root=reports_dir) if persist else None)
+        self._file_store: Optional[ReportStore] = None # Opened by generate_*_report when not persisting
+        self._file_store_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-writer") if persist and async_writes else None
+        self._pending_writes: List[Future] = []
+        self._pending_lock = threading.Lock() # Reports of several users may be saved concurrently (web app)
+        logger.info(f"Initializing with reports_dir={self.reports_dir}, templates_dir={self.templates_dir}, persist={persist}, async_writes={async_writes}")
 
-    def _load_template(self, template_name):
+    def _load_template(self, template_name) -> CompiledTemplate:
         template_path = os.path.join(self.templates_dir, template_name)
-        logger.info(f"Attempting to load template from {template_path}")
-        try:
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            logger.error(f"Template file not found at {template_path}")
-            return "<h1>Template Not Found!</h1><p>{content}</p>"
+        with _template_cache_lock:
+            template = _template_cache.get(template_path)
+            if template is not None:
+                return template
+            logger.info(f"Attempting to load template from {template_path}")
+            try:
+                with open(template_path, 'r', encoding='utf-8') as f:
+                    template = CompiledTemplate(f.read())
+            except FileNotFoundError:
+                logger.error(f"Template file not found at {template_path}")
+                return CompiledTemplate("<h1>Template Not Found!</h1><p>{summary_content}</p>")
+            _template_cache[template_path] = template
+            return template
 
-    def generate_html_report(self, user_name: str, summary_content: str) -> str:
-        logger.info(f"Generating HTML report for {user_name}...")
+    @metrics.instrumented("render_html")
+    def render_html_report(self, user_name: str, summary_content: str) -> str:
+        """Renders the HTML report in memory and returns it."""
+        logger.info(f"Rendering HTML report for {user_name}...")
         template = self._load_template('report_template.html')
-        report_date = datetime.now().strftime('%Y-%m-%d %H:%M')
-        html_content = markdown(summary_content, extras=['fenced-code-blocks', 'tables'])
-
-        rendered_html = template.format(
+        html_content = self.markdown_renderer.render(summary_content)
+        return template.render(
             user_name=user_name,
-            report_date=report_date,
+            report_date=datetime.now().strftime('%Y-%m-%d %H:%M'),
             summary_content=html_content
         )
 
-        file_name = f"{user_name.replace(' ', '_')}_calendar_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-        file_path = os.path.join(self.reports_dir, file_name)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(rendered_html)
+    @metrics.instrumented("render_md")
+    def render_md_report(self, user_name: str, summary_content: str) -> str:
+        """Renders the Markdown report in memory and returns it."""
+        report_date = datetime.now().strftime('%Y-%m-%d %H:%M')
+        return (
+            f"# Calendar Summary for {user_name}\n\n"
+            f"**Report Date:** {report_date}\n\n"
+            "## Summary\n\n"
+            f"{summary_content}"
+        )
+
+    def save_reports(self, user_name: str, html_report: str, md_report: str, summary_content: Optional[str] = None):
+        """
+        Persists rendered reports to the report store. Writes happen on a background thread when
+        async writes are enabled, and are skipped entirely when persistence is disabled. Passing the
+        source `summary_content` lets the store deduplicate reports that only differ in their date.
+        """
+        if not self.persist:
+            return
+        content_hash = ReportStore.content_hash(summary_content) if summary_content is not None else None
+        created_at = datetime.now()
+        for fmt, content in (("html", html_report), ("md", md_report)):
+            if self._writer:
+                # Run in a copy of the caller's context so metrics keep the user label.
+                future = self._writer.submit(contextvars.copy_context().run, self.store.save, user_name, fmt, content, content_hash, created_at)
+                with self._pending_lock:
+                    self._pending_writes = [pending for pending in self._pending_writes if not pending.done()]
+                    self._pending_writes.append(future)
+            else:
+                self.store.save(user_name, fmt, content, content_hash, created_at)
+
+    def flush(self):
+        """Waits for all queued report writes to finish."""
+        with self._pending_lock:
+            pending, self._pending_writes = self._pending_writes, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error writing report: {e}")
+
+    def close(self):
+        self.flush()
+        if self._writer:
+            self._writer.shutdown(wait=True)
+        with self._file_store_lock:
+            if self._file_store:
+                self._file_store.close()
+                self._file_store = None
+
+    def _report_file_store(self) -> ReportStore:
+        """The store that generate_*_report write to: `store`, or one opened on the first call and reused."""
+        if self.store:
+            return self.store
+        with self._file_store_lock:
+            if self._file_store is None:
+                self._file_store = ReportStore(root=self.reports_dir)
+            return self._file_store
+
+    def generate_html_report(self, user_name: str, summary_content: str) -> str:
+        logger.info(f"Generating HTML report for {user_name}...")
+        store = self._report_file_store()
+        report = store.save(user_name, "html", self.render_html_report(user_name, summary_content), ReportStore.content_hash(summary_content))
+        file_path = store.full_path(report)
         logger.info(f"HTML report generated: {file_path}")
         return file_path
 
     def generate_md_report(self, user_name: str, summary_content: str) -> str:
         logger.info(f"Generating Markdown report for {user_name}...")
-        report_date = datetime.now().strftime('%Y-%m-%d %H:%M')
-        md_report = f"# Calendar Summary for {user_name}\n\n"
-        md_report += f"**Report Date:** {report_date}\n\n"
-        md_report += "## Summary\n\n"
-        md_report += summary_content
-
-        file_name = f"{user_name.replace(' ', '_')}_calendar_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-        file_path = os.path.join(self.reports_dir, file_name)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(md_report)
+        store = self._report_file_store()
+        report = store.save(user_name, "md", self.render_md_report(user_name, summary_content), ReportStore.content_hash(summary_content))
+        file_path = store.full_path(report)
         logger.info(f"Markdown report generated: {file_path}")
         return file_path
 
@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Type
+
+from calmind.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+class MarkdownBackend(ABC):
+    name = ""
+
+    @abstractmethod
+    def render(self, text: str) -> str:
+        """Converts Markdown text to HTML."""
+        pass
+
+class Markdown2Backend(MarkdownBackend):
+    name = "markdown2"
+
+    def __init__(self):
+        from markdown2 import Markdown
+        self._markdown_class = Markdown
+        self._extras = ['fenced-code-blocks', 'tables']
+        self._local = threading.local()
+
+    def render(self, text: str) -> str:
+        # markdown2.Markdown instances are reusable but not thread-safe, so keep one per thread.
+        converter = getattr(self._local, "converter", None)
+        if converter is None:
+            converter = self._local.converter = self._markdown_class(extras=self._extras)
+        return converter.convert(text)
+
+class MarkdownItBackend(MarkdownBackend):
+    """CommonMark renderer from the optional `markdown-it-py` package, with GFM tables enabled."""
+    name = "markdown-it"
+
+    def __init__(self):
+        from markdown_it import MarkdownIt
+        self._parser = MarkdownIt("commonmark").enable("table")
+
+    def render(self, text: str) -> str:
+        return self._parser.render(text)
+
+class CmarkGfmBackend(MarkdownBackend):
+    """C implementation of CommonMark with GitHub extensions, from the optional `cmarkgfm` package."""
+    name = "cmarkgfm"
+
+    def __init__(self):
+        import cmarkgfm
+        self._cmarkgfm = cmarkgfm
+
+    def render(self, text: str) -> str:
+        return self._cmarkgfm.github_flavored_markdown_to_html(text)
+
+BACKENDS: Dict[str, Type[MarkdownBackend]] = {
+    backend.name: backend for backend in (Markdown2Backend, MarkdownItBackend, CmarkGfmBackend)
+}
+
+def create_backend(name: str) -> MarkdownBackend:
+    """Creates the named backend, falling back to markdown2 when its package is not installed."""
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown markdown backend '{name}'. Available backends: {sorted(BACKENDS)}")
+    try:
+        return backend_class()
+    except ImportError as e:
+        logger.warning(f"Markdown backend '{name}' is not available ({e}). Falling back to markdown2.")
+        return Markdown2Backend()
+
+class MarkdownRenderer:
+    """
+    Markdown-to-HTML conversion with an LRU cache keyed by a hash of the content.
+
+    The same LLM summary is typically rendered for the HTML report, the email and the webapp,
+    so only the first conversion pays the rendering cost.
+    """
+
+    def __init__(self, backend: str = "markdown2", cache_size: int = 256):
+        self.backend = create_backend(backend)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"Initialized markdown renderer with backend={self.backend.name}, cache_size={cache_size}")
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.backend.name}\0{text}".encode('utf-8')).hexdigest()
+
+    def render(self, text: str) -> str:
+        if self.cache_size <= 0:
+            return self.backend.render(text)
+
+        key = self._cache_key(text)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                metrics.CACHE_REQUESTS.inc(cache="markdown", result="hit")
+                return cached
+            self.misses += 1
+        metrics.CACHE_REQUESTS.inc(cache="markdown", result="miss")
+
+        html = self.backend.render(text)
+        with self._lock:
+            self._cache[key] = html
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
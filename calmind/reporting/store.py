@@ -0,0 +1,291 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from calmind.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = "index.sqlite3"
+
+@dataclass
+class StoredReport:
+    id: int
+    user_name: str
+    format: str
+    created_at: str
+    content_hash: str
+    path: str
+    size: int
+    compressed: bool
+    deduplicated: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "user_name": self.user_name,
+            "format": self.format,
+            "created_at": self.created_at,
+            "content_hash": self.content_hash,
+            "size": self.size,
+            "compressed": self.compressed,
+        }
+
+@dataclass
+class StoredSnapshot:
+    """The normalized items and the summary of a user's last report, per kind ("events" or "cards")."""
+    user_name: str
+    kind: str
+    items: List[dict]
+    summary: str
+    context_hash: str
+    created_at: datetime
+
+class ReportStore:
+    """
+    Report artifact store sharded by user and date, with a SQLite index of report metadata.
+
+    Files are laid out as `<root>/<user>/<YYYY>/<MM>/<DD>/<HHMMSS>_<hash>.<format>[.gz]`. Saving a
+    report whose content hash matches an earlier report of the same user and format records a new
+    index entry pointing at the existing file instead of writing it again.
+    """
+
+    def __init__(self, root: str = "reports", compress: bool = False, retention_days: Optional[int] = None,
+                 max_reports_per_user: Optional[int] = None):
+        self.root = root
+        self.compress = compress
+        self.retention_days = retention_days
+        self.max_reports_per_user = max_reports_per_user
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.root, INDEX_FILE_NAME), timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._create_schema()
+        logger.info(f"Initialized report store at {self.root} (compress={compress}, retention_days={retention_days}, max_reports_per_user={max_reports_per_user})")
+
+    def _create_schema(self):
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_name TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    compressed INTEGER NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_reports_user_created ON reports (user_name, created_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_reports_dedup ON reports (user_name, format, content_hash)")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    user_name TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    summary_hash TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    user_name TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    items BLOB NOT NULL,
+                    summary TEXT NOT NULL,
+                    context_hash TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (user_name, kind)
+                )
+            """)
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _user_dir_name(user_name: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_.-]+', '_', user_name).strip('_') or "user"
+
+    def _row_to_report(self, row: sqlite3.Row, deduplicated: bool = False) -> StoredReport:
+        return StoredReport(
+            id=row["id"], user_name=row["user_name"], format=row["format"], created_at=row["created_at"],
+            content_hash=row["content_hash"], path=row["path"], size=row["size"], compressed=bool(row["compressed"]),
+            deduplicated=deduplicated,
+        )
+
+    @metrics.instrumented("report_store")
+    def save(self, user_name: str, fmt: str, content: str, content_hash: Optional[str] = None,
+             created_at: Optional[datetime] = None) -> StoredReport:
+        """
+        Stores a report and returns its index entry. `content_hash` defaults to the hash of `content`;
+        callers can pass the hash of the report's source so re-rendered copies are deduplicated too.
+        """
+        created_at = created_at or datetime.now()
+        content_hash = content_hash or self.content_hash(content)
+
+        with self._lock:
+            existing = self._db.execute(
+                "SELECT path, size, compressed FROM reports WHERE user_name = ? AND format = ? AND content_hash = ? LIMIT 1",
+                (user_name, fmt, content_hash),
+            ).fetchone()
+
+            deduplicated = existing is not None and os.path.exists(os.path.join(self.root, existing["path"]))
+            if deduplicated:
+                relative_path, size, compressed = existing["path"], existing["size"], bool(existing["compressed"])
+                logger.info(f"Report for {user_name} ({fmt}) is identical to {relative_path}. Skipping write.")
+            else:
+                relative_path, size, compressed = self._write(user_name, fmt, content, content_hash, created_at)
+
+            with self._db:
+                cursor = self._db.execute(
+                    "INSERT INTO reports (user_name, format, created_at, content_hash, path, size, compressed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_name, fmt, created_at.isoformat(timespec='seconds'), content_hash, relative_path, size, int(compressed)),
+                )
+            row = self._db.execute("SELECT * FROM reports WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return self._row_to_report(row, deduplicated)
+
+    def _write(self, user_name: str, fmt: str, content: str, content_hash: str, created_at: datetime):
+        directory = os.path.join(self._user_dir_name(user_name), created_at.strftime('%Y'), created_at.strftime('%m'), created_at.strftime('%d'))
+        file_name = f"{created_at.strftime('%H%M%S')}_{content_hash[:12]}.{fmt}" + (".gz" if self.compress else "")
+        relative_path = os.path.join(directory, file_name)
+        full_path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        data = content.encode('utf-8')
+        if self.compress:
+            data = gzip.compress(data)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        logger.info(f"Report written: {full_path}")
+        return relative_path, len(data), self.compress
+
+    def full_path(self, report: StoredReport) -> str:
+        return os.path.join(self.root, report.path)
+
+    def list_reports(self, user_name: Optional[str] = None, fmt: Optional[str] = None, limit: int = 50) -> List[StoredReport]:
+        """Returns the most recent reports, newest first, straight from the index."""
+        query = "SELECT * FROM reports"
+        conditions, params = [], []
+        if user_name:
+            conditions.append("user_name = ?")
+            params.append(user_name)
+        if fmt:
+            conditions.append("format = ?")
+            params.append(fmt)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [self._row_to_report(row) for row in rows]
+
+    def latest_report(self, user_name: str, fmt: str, content_hash: Optional[str] = None) -> Optional[StoredReport]:
+        """Returns the newest report of a user and format, optionally only one generated from `content_hash`."""
+        query = "SELECT * FROM reports WHERE user_name = ? AND format = ?"
+        params = [user_name, fmt]
+        if content_hash:
+            query += " AND content_hash = ?"
+            params.append(content_hash)
+        with self._lock:
+            row = self._db.execute(query + " ORDER BY created_at DESC, id DESC LIMIT 1", params).fetchone()
+        return self._row_to_report(row) if row else None
+
+    def get_fingerprint(self, user_name: str) -> Optional[Tuple[str, str]]:
+        """Returns the `(fingerprint, summary_hash)` recorded by the user's last completed run."""
+        with self._lock:
+            row = self._db.execute("SELECT fingerprint, summary_hash FROM fingerprints WHERE user_name = ?", (user_name,)).fetchone()
+        return (row["fingerprint"], row["summary_hash"]) if row else None
+
+    def save_fingerprint(self, user_name: str, fingerprint: str, summary_hash: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO fingerprints (user_name, fingerprint, summary_hash, updated_at) VALUES (?, ?, ?, ?)",
+                (user_name, fingerprint, summary_hash, datetime.now().isoformat(timespec='seconds')),
+            )
+
+    def get_snapshot(self, user_name: str, kind: str) -> Optional[StoredSnapshot]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM snapshots WHERE user_name = ? AND kind = ?", (user_name, kind)).fetchone()
+        if not row:
+            return None
+        return StoredSnapshot(
+            user_name=row["user_name"], kind=row["kind"], items=json.loads(gzip.decompress(row["items"])),
+            summary=row["summary"], context_hash=row["context_hash"], created_at=datetime.fromisoformat(row["created_at"]),
+        )
+
+    def save_snapshot(self, user_name: str, kind: str, items: List[dict], summary: str, context_hash: str,
+                      created_at: Optional[datetime] = None):
+        """Replaces the user's snapshot of `kind`. `created_at` (timezone-aware) is the time of the last full summary."""
+        created_at = created_at or datetime.now().astimezone()
+        data = gzip.compress(json.dumps(items).encode('utf-8'))
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots (user_name, kind, items, summary, context_hash, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_name, kind, data, summary, context_hash, created_at.isoformat(timespec='seconds')),
+            )
+
+    def get_report(self, report_id: int) -> Optional[StoredReport]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return self._row_to_report(row) if row else None
+
+    def read_report(self, report: StoredReport) -> str:
+        with open(self.full_path(report), 'rb') as f:
+            data = f.read()
+        if report.compressed:
+            data = gzip.decompress(data)
+        return data.decode('utf-8')
+
+    def apply_retention(self) -> int:
+        """
+        Drops index entries older than `retention_days` or beyond `max_reports_per_user` (per format),
+        then deletes the files no remaining entry points to. Returns the number of files removed.
+        """
+        expired_ids = set()
+        with self._lock, self._db:
+            if self.retention_days is not None:
+                cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat(timespec='seconds')
+                expired_ids.update(row["id"] for row in self._db.execute("SELECT id FROM reports WHERE created_at < ?", (cutoff,)))
+            if self.max_reports_per_user is not None:
+                expired_ids.update(row["id"] for row in self._db.execute("""
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY user_name, format ORDER BY created_at DESC, id DESC) AS rank
+                        FROM reports
+                    ) WHERE rank > ?
+                """, (self.max_reports_per_user,)))
+            if not expired_ids:
+                return 0
+
+            placeholders = ",".join("?" * len(expired_ids))
+            candidate_paths = {row["path"] for row in self._db.execute(
+                f"SELECT DISTINCT path FROM reports WHERE id IN ({placeholders})", tuple(expired_ids))}
+            self._db.execute(f"DELETE FROM reports WHERE id IN ({placeholders})", tuple(expired_ids))
+            still_referenced = {row["path"] for row in self._db.execute(
+                f"SELECT DISTINCT path FROM reports WHERE path IN ({','.join('?' * len(candidate_paths))})", tuple(candidate_paths))}
+
+        removed = 0
+        for relative_path in candidate_paths - still_referenced:
+            full_path = os.path.join(self.root, relative_path)
+            try:
+                os.remove(full_path)
+                removed += 1
+                os.removedirs(os.path.dirname(full_path)) # Prunes now-empty day/month/year/user directories
+            except OSError:
+                pass
+        logger.info(f"Report retention dropped {len(expired_ids)} index entries and removed {removed} files.")
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
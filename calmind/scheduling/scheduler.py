@@ -0,0 +1,245 @@
+import hashlib
+import heapq
+import logging
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+
+from calmind.config import SchedulerConfig, UserConfig
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Simple token bucket used to keep run dispatch under a downstream rate limit."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def seconds_until_available(self, amount: float = 1.0) -> float:
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                return 0.0
+            if self.rate_per_second <= 0:
+                return float('inf')
+            return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount: float = 1.0):
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """Holds one token bucket per downstream service (llm, smtp, caldav, ...)."""
+
+    def __init__(self, rate_limits: Dict[str, float]):
+        self.buckets = {name: TokenBucket(rate) for name, rate in rate_limits.items()}
+
+    def seconds_until_available(self, costs: Dict[str, int]) -> float:
+        wait = 0.0
+        for name, amount in costs.items():
+            bucket = self.buckets.get(name)
+            if bucket and amount:
+                wait = max(wait, bucket.seconds_until_available(amount))
+        return wait
+
+    def consume(self, costs: Dict[str, int]):
+        for name, amount in costs.items():
+            bucket = self.buckets.get(name)
+            if bucket and amount:
+                bucket.consume(amount)
+
+
+@dataclass(order=True)
+class ScheduledRun:
+    sort_key: tuple
+    user_name: str = field(compare=False)
+    due_at: datetime = field(compare=False)
+
+
+def _as_utc(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str): # Normalized (spooled) events carry ISO format times
+        try:
+            value = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return pytz.utc.localize(value)
+        return value.astimezone(pytz.utc)
+    if isinstance(value, date):
+        return pytz.utc.localize(datetime(value.year, value.month, value.day))
+    return None
+
+
+def event_start(event) -> Optional[datetime]:
+    """Returns the UTC start of a CalendarEvent, an Apple event dict or a normalized event."""
+    start = event.get("start") if isinstance(event, dict) else getattr(event, "start", None)
+    return _as_utc(start)
+
+
+def downstream_costs(user_config: UserConfig) -> Dict[str, int]:
+    """Estimates how many downstream requests a single report run for this user makes."""
+    source_types = [source.root.type.lower() for source in user_config.sources]
+    costs = {
+        "google": source_types.count("google"),
+        "caldav": source_types.count("apple"),
+        "trello": source_types.count("trello"),
+        "llm": int(any(t in ("google", "apple") for t in source_types)) + int("trello" in source_types),
+        "smtp": 1 if user_config.report_to_email else 0,
+    }
+    return costs
+
+
+class ReportScheduler:
+    """
+    Long-running scheduler that dispatches per-user report runs.
+
+    Each user has run times in their own timezone. Runs are spread across a stagger window using a
+    stable per-user offset, ordered by imminent meetings and configured priority, and held back
+    while the downstream rate limits have no budget left.
+    """
+
+    def __init__(self, app, scheduler_config: SchedulerConfig):
+        self.app = app
+        self.config = scheduler_config
+        self.rate_limiter = RateLimiter(scheduler_config.rate_limits)
+        self.stop_event = threading.Event()
+        self.next_run_at: Dict[str, datetime] = {}
+        self.queue: List[ScheduledRun] = []
+        self.queued_users = set()
+        self.retention_due_at: Optional[datetime] = None
+
+    def stagger_offset(self, user_name: str) -> timedelta:
+        window_seconds = self.config.stagger_window_minutes * 60
+        if window_seconds <= 0:
+            return timedelta(0)
+        digest = hashlib.sha1(user_name.encode('utf-8')).hexdigest()
+        return timedelta(seconds=int(digest[:8], 16) % window_seconds)
+
+    def compute_next_run(self, user_config: UserConfig, after: datetime) -> Optional[datetime]:
+        """Returns the next staggered run time (UTC) strictly after `after`."""
+        schedule = user_config.schedule
+        tz = pytz.timezone(schedule.timezone) # Validated by UserConfig, with UTC for unknown names
+
+        local_after = after.astimezone(tz)
+        offset = self.stagger_offset(user_config.name)
+        candidates = []
+        for day_delta in range(0, 2):
+            day = (local_after + timedelta(days=day_delta)).date()
+            for run_time in schedule.run_times:
+                try:
+                    hour, minute = (int(part) for part in run_time.split(':'))
+                except ValueError:
+                    logger.error(f"Invalid run time '{run_time}' for user {user_config.name}. Expected HH:MM.")
+                    continue
+                local_run = tz.localize(datetime(day.year, day.month, day.day, hour, minute))
+                run_at = local_run.astimezone(pytz.utc) + offset
+                if run_at > after:
+                    candidates.append(run_at)
+        return min(candidates) if candidates else None
+
+    def priority_key(self, user_config: UserConfig, due_at: datetime, now: datetime) -> tuple:
+        next_event = self.app.next_event_starts.get(user_config.name)
+        minutes_to_meeting = float('inf')
+        if next_event and next_event > now:
+            minutes_to_meeting = (next_event - now).total_seconds() / 60
+        imminent = minutes_to_meeting <= self.config.imminent_meeting_minutes
+        return (0 if imminent else 1, minutes_to_meeting if imminent else 0, -user_config.schedule.priority, due_at, user_config.name)
+
+    def enqueue_due_runs(self, users: List[UserConfig], now: datetime):
+        for user_config in users:
+            if user_config.name not in self.next_run_at:
+                self.next_run_at[user_config.name] = self.compute_next_run(user_config, now)
+                logger.info(f"Next run for {user_config.name} scheduled at {self.next_run_at[user_config.name]}")
+            due_at = self.next_run_at[user_config.name]
+            if due_at is None or due_at > now or user_config.name in self.queued_users:
+                continue
+            heapq.heappush(self.queue, ScheduledRun(self.priority_key(user_config, due_at, now), user_config.name, due_at))
+            self.queued_users.add(user_config.name)
+            self.next_run_at[user_config.name] = self.compute_next_run(user_config, now)
+
+    def seconds_until_next_due(self, now: datetime) -> float:
+        upcoming = [run_at for run_at in self.next_run_at.values() if run_at]
+        if not upcoming:
+            return float(self.config.poll_interval_seconds)
+        return max(0.0, min((min(upcoming) - now).total_seconds(), self.config.poll_interval_seconds))
+
+    def dispatch_next(self, users_by_name: Dict[str, UserConfig]) -> float:
+        """Runs the highest-priority queued user if the rate limits allow. Returns seconds to wait otherwise."""
+        scheduled = self.queue[0]
+        user_config = users_by_name.get(scheduled.user_name)
+        if user_config is None:
+            heapq.heappop(self.queue)
+            self.queued_users.discard(scheduled.user_name)
+            return 0.0
+
+        costs = downstream_costs(user_config)
+        # A budget of 0 per minute never refills; polling again picks up a raised limit or a removed user.
+        wait = min(self.rate_limiter.seconds_until_available(costs), self.config.poll_interval_seconds)
+        if wait > 0:
+            logger.info(f"Rate limits exhausted; holding run for {scheduled.user_name} for {wait:.1f}s.")
+            return wait
+
+        heapq.heappop(self.queue)
+        self.queued_users.discard(scheduled.user_name)
+        self.rate_limiter.consume(costs)
+        logger.info(f"Dispatching scheduled run for {scheduled.user_name} (due {scheduled.due_at}).")
+        try:
+            self.app.run_for_user(user_config)
+        except Exception:
+            logger.exception(f"Scheduled run failed for {scheduled.user_name}")
+        return 0.0
+
+    def apply_retention_if_due(self, now: datetime):
+        """Runs the app's retention at startup and then every `retention_interval_hours`, as one-off runs do at their start."""
+        if self.retention_due_at is not None and now < self.retention_due_at:
+            return
+        self.retention_due_at = now + timedelta(hours=self.config.retention_interval_hours)
+        try:
+            self.app.apply_retention()
+        except Exception:
+            logger.exception("Retention failed; it is retried at the next interval.")
+
+    def stop(self, *_args):
+        logger.info("Stop requested. Scheduler will exit after the current run.")
+        self.stop_event.set()
+
+    def run_forever(self):
+        logger.info("Starting CalMind scheduler daemon...")
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stop_event.is_set():
+            users = self.app.config.get_users_config()
+            users_by_name = {user.name: user for user in users}
+            now = datetime.now(pytz.utc)
+            self.apply_retention_if_due(now)
+            self.enqueue_due_runs(users, now)
+
+            if self.queue:
+                wait = self.dispatch_next(users_by_name)
+            else:
+                wait = self.seconds_until_next_due(now)
+            if wait > 0:
+                self.stop_event.wait(wait)
+
+        logger.info("Scheduler daemon stopped.")
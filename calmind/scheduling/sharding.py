@@ -0,0 +1,120 @@
+import bisect
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import List, Optional
+
+from calmind.config import UserConfig
+from calmind.scheduling.summary import RunSummary
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    index: int # Zero-based shard index
+    count: int
+
+    @classmethod
+    def parse(cls, value: str) -> "ShardSpec":
+        """Parses an `i/N` shard specification, e.g. `0/4` for the first of four shards."""
+        try:
+            index_text, count_text = value.split('/')
+            index, count = int(index_text), int(count_text)
+        except ValueError:
+            raise ValueError(f"Invalid shard '{value}'. Expected the form i/N, e.g. 0/4.")
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard '{value}'. Index must be between 0 and {count - 1}.")
+        return cls(index, count)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to shards using a hash ring with virtual nodes.
+
+    Assignment depends only on the key and the shard count, so every node computes the same split
+    without coordination, and changing the shard count only moves a fraction of the users.
+    """
+
+    def __init__(self, shard_count: int, virtual_nodes: int = 128, salt: str = ""):
+        self.shard_count = shard_count
+        self.salt = salt
+        self._ring = sorted(
+            (self._hash(f"shard-{shard}-vnode-{vnode}"), shard)
+            for shard in range(shard_count)
+            for vnode in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    def _hash(self, key: str) -> int:
+        return int(hashlib.sha1(f"{self.salt}{key}".encode('utf-8')).hexdigest()[:16], 16)
+
+    def shard_for(self, key: str) -> int:
+        position = bisect.bisect(self._points, self._hash(key)) % len(self._ring)
+        return self._ring[position][1]
+
+
+def select_users(users: List[UserConfig], shard: ShardSpec, salt: str = "") -> List[UserConfig]:
+    """Returns the users that belong to the given shard."""
+    if shard.count == 1:
+        return list(users)
+    ring = ConsistentHashRing(shard.count, salt=salt)
+    return [user for user in users if ring.shard_for(user.name) == shard.index]
+
+
+def run_shard(config_path: str, node_shard: Optional[ShardSpec] = None, local_shard: Optional[ShardSpec] = None,
+              profile_dir: Optional[str] = None) -> dict:
+    """
+    Runs one shard in the current process and returns its summary as a dict.
+
+    `node_shard` selects this machine's users; `local_shard` further splits them between the
+    processes of the local pool. Defined at module level so it can be used as a pool task.
+    """
+    from calmind.main import CalMindApp
+
+    app = CalMindApp(config_path=config_path)
+    app.profile_dir = profile_dir
+    users = app.config.get_users_config()
+    labels = []
+    if node_shard:
+        users = select_users(users, node_shard)
+        labels.append(str(node_shard))
+    if local_shard:
+        users = select_users(users, local_shard, salt="local")
+        labels.append(f"local {local_shard}")
+    label = " ".join(labels) or "all"
+
+    logger.info(f"Running shard {label} with {len(users)} users (pid {os.getpid()}).")
+    summary = app.run(users=users, apply_retention=False, shard_label=label)
+    return summary.to_dict()
+
+
+def run_sharded_locally(config_path: str, processes: Optional[int] = None, node_shard: Optional[ShardSpec] = None,
+                        profile_dir: Optional[str] = None) -> RunSummary:
+    """Runs all local shards in a process pool (one per core by default) and merges their summaries."""
+    processes = processes or os.cpu_count() or 1
+    logger.info(f"Running {processes} local shards in a process pool.")
+    summaries = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(run_shard, config_path, node_shard, ShardSpec(index, processes), profile_dir): index
+            for index in range(processes)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                summary = RunSummary.from_dict(future.result())
+                counts = summary.counts()
+                logger.info(f"Local shard {index}/{processes} finished: {len(summary.users)} users, {counts['ok']} ok, {counts['error']} errors.")
+                summaries.append(summary)
+            except Exception:
+                logger.exception(f"Local shard {index}/{processes} failed")
+    merged = RunSummary.merge(summaries)
+    counts = merged.counts()
+    logger.info(f"All local shards finished: {len(merged.users)} users, {counts['ok']} ok, {counts['skipped']} skipped, {counts['error']} errors.")
+    return merged
@@ -0,0 +1,83 @@
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from calmind.monitoring.metrics import merge_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserRunResult:
+    user_name: str
+    status: str # "ok", "unchanged", "skipped" or "error"
+    duration_seconds: float
+    shard: Optional[str] = None
+    error: Optional[str] = None
+    stale_sources: List[str] = field(default_factory=list) # Sources served from their last successful fetch
+
+
+@dataclass
+class RunSummary:
+    started_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: Optional[str] = None
+    shards: List[str] = field(default_factory=list)
+    users: List[UserRunResult] = field(default_factory=list)
+    metrics: dict = field(default_factory=dict) # MetricsRegistry snapshot of the run
+
+    def add(self, result: UserRunResult):
+        self.users.append(result)
+
+    def finish(self):
+        self.finished_at = datetime.now().isoformat()
+
+    def counts(self) -> dict:
+        counts = {"ok": 0, "unchanged": 0, "skipped": 0, "error": 0}
+        for result in self.users:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return counts
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "shards": self.shards,
+            "total_users": len(self.users),
+            "counts": self.counts(),
+            "total_user_seconds": round(sum(r.duration_seconds for r in self.users), 3),
+            "users": [asdict(r) for r in self.users],
+            "metrics": self.metrics,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunSummary":
+        return cls(
+            started_at=data["started_at"],
+            finished_at=data.get("finished_at"),
+            shards=list(data.get("shards", [])),
+            users=[UserRunResult(**user) for user in data.get("users", [])],
+            metrics=data.get("metrics", {}),
+        )
+
+    @classmethod
+    def merge(cls, summaries: List["RunSummary"]) -> "RunSummary":
+        """Combines per-shard summaries into one run summary spanning all of them."""
+        merged = cls()
+        if not summaries:
+            merged.finish()
+            return merged
+        merged.started_at = min(s.started_at for s in summaries)
+        finished = [s.finished_at for s in summaries if s.finished_at]
+        merged.finished_at = max(finished) if finished else None
+        for summary in summaries:
+            merged.shards.extend(summary.shards)
+            merged.users.extend(summary.users)
+        merged.metrics = merge_snapshots([summary.metrics for summary in summaries])
+        return merged
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Run summary written to {path}")
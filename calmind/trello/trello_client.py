@@ -1,6 +1,10 @@
+from typing import Optional
+
 import requests
 from trello import TrelloClient
 from dotenv import load_dotenv
+from calmind.monitoring import metrics
+from calmind.pipeline.resilience import SAFE_METHODS, EndpointPolicy
 
 load_dotenv()
 
@@ -20,11 +24,35 @@ class TrelloCard:
             "url": self.url,
         }
 
+TRELLO_API_BASE_URL = 'https://api.trello.com/1'
+
+class TrelloSession(requests.Session):
+    """
+    Requests session for py-trello that applies the endpoint's timeouts and circuit breaker, and optionally
+    redirects Trello API calls to another base URL (e.g. a local stand-in server).
+    """
+
+    def __init__(self, base_url=None, policy: Optional[EndpointPolicy] = None):
+        super().__init__()
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.policy = policy or EndpointPolicy()
+
+    def request(self, method, url, *args, **kwargs):
+        if self.base_url and url.startswith(TRELLO_API_BASE_URL):
+            url = self.base_url + url[len(TRELLO_API_BASE_URL):]
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.policy.timeout
+        request = super().request
+        return self.policy.call(lambda: request(method, url, *args, **kwargs),
+                                failed_result=lambda response: response.status_code >= 500 or response.status_code == 429,
+                                idempotent=method.upper() in SAFE_METHODS)
+
 class TrelloService:
-    def __init__(self, api_key, api_token, board_id):
+    def __init__(self, api_key, api_token, board_id, api_base_url=None, policy: Optional[EndpointPolicy] = None):
         self.client = TrelloClient(
             api_key=api_key,
             token=api_token,
+            http_service=TrelloSession(api_base_url, policy),
         )
         # If you are encountering SSL issues on macOS, you can try to uncomment the following lines
         # to disable SSL verification. This is not recommended for production environments.
@@ -34,15 +62,23 @@ class TrelloService:
         self.board_id = board_id
 
     def get_cards(self):
-        board = self.client.get_board(self.board_id)
-        cards = board.all_cards()
-        trello_cards = []
-        for card in cards:
-            trello_cards.append(
-                TrelloCard(
-                    name=card.name,
-                    description=card.description,
-                    url=card.url,
-                )
+        return list(self.iter_cards())
+
+    def iter_cards(self):
+        """
+        Yields the board's cards. Only the fields CalMind uses are requested, and cards are converted one
+        at a time instead of building py-trello Card objects for the whole board.
+        """
+        with metrics.timed("trello_fetch", source="trello"):
+            cards_json = self.client.fetch_json(
+                f'/boards/{self.board_id}/cards/',
+                query_params={'filter': 'all', 'fields': 'name,desc,url'},
             )
-        return trello_cards
\ No newline at end of file
+        cards_json.reverse()
+        while cards_json:
+            card = cards_json.pop()
+            yield TrelloCard(
+                name=card.get('name'),
+                description=card.get('desc', ''),
+                url=card.get('url'),
+            )
\ No newline at end of file
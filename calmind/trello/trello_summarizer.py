@@ -1,27 +1,47 @@
 
+from typing import Iterable, Optional
 from calmind.llm.client import LLMClient
+from calmind.llm.context import prompt_file
+from calmind.llm.delta import CARDS, SnapshotDiff, format_changes
+from calmind.llm.prompt import PromptBuffer, write_items
 from calmind.trello.trello_client import TrelloCard
 
 class TrelloSummarizer:
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, context_file: str = "calmind/llm/trello_summary_context.md"):
         self.llm_client = llm_client
+        self.context_file = context_file
+        self.context = prompt_file(context_file)
 
-    def summarize_cards(self, cards: list[TrelloCard]) -> str:
-        """Summarizes a list of Trello cards using the LLM."""
+    def load_context(self) -> str:
+        """The summary instructions, re-read when the context file changes."""
+        return self.context.text
+
+    def summarize_cards(self, cards: Iterable[TrelloCard], previous_summary: Optional[str] = None, diff: Optional[SnapshotDiff] = None,
+                        max_prompt_chars: Optional[int] = None) -> str:
+        """
+        Summarizes Trello cards (any iterable) using the LLM. The prompt is built incrementally and cards
+        beyond `max_prompt_chars` are only included as a digest. Given the previous summary and a diff,
+        only the changed cards and a digest of the others are sent.
+        """
         if not cards:
             return "No Trello cards to summarize."
 
-        # Create a single string with all card details
-        cards_text = "\n".join([str(card) for card in cards])
+        if previous_summary and diff is not None:
+            full_prompt = (
+                f"This is the summary of my Trello cards you wrote earlier:\n\n{previous_summary}\n\n---\n"
+                "Since then the cards changed as listed below. Rewrite the complete summary so it reflects the changes "
+                f"and keep the same format.\n\nCard Changes:\n{format_changes(diff)}"
+            )
+            return self.llm_client.generate_content(full_prompt, context=self.load_context())
 
-        # Load the summarization context/prompt
-        # (Assuming a trello_summary_context.md file exists)
-        with open("calmind/llm/trello_summary_context.md", "r") as f:
-            prompt = f.read()
+        # The summarization context (trello_summary_context.md) is sent separately, so the LLM client can cache it
+        prompt = PromptBuffer(max_prompt_chars)
+        prompt.write("Here are the Trello cards:\n\n")
 
-        # Combine the prompt and the card data
-        full_prompt = f"{prompt}\n\nHere are the Trello cards:\n\n{cards_text}"
+        # Stream the card details into the prompt
+        write_items(prompt, cards, CARDS)
+        full_prompt = prompt.getvalue()
 
         # Get the summary from the LLM
-        summary = self.llm_client.generate_text(full_prompt)
+        summary = self.llm_client.generate_content(full_prompt, context=self.load_context())
         return summary
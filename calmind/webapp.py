@@ -1,36 +1,239 @@
 
 import os
 import json
-from flask import Flask, render_template, request
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+import pytz
+from flask import Flask, Response, abort, jsonify, make_response, render_template, request
 from calmind.main import CalMindApp
-from calmind.config import Config
+from calmind.config import UserConfig
+from calmind.monitoring import metrics
+
+logger = logging.getLogger(__name__)
 
 # Get the absolute path to the project root
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 app = Flask(__name__, template_folder=os.path.join(project_root, 'templates'))
+PROFILE_DIR = os.environ.get('CALMIND_PROFILE_DIR', os.path.join(project_root, 'profiles'))
+CONFIG_PATH = os.environ.get('CALMIND_CONFIG', 'config.yaml')
+
+class ReportRunner:
+    """
+    Runs requested reports on a bounded pool of worker threads shared by all requests. A request for a
+    user and source whose report is already running waits for that run instead of starting another.
+    """
+
+    def __init__(self, calmind_app: CalMindApp, max_concurrent_runs: int):
+        self.calmind_app = calmind_app
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent_runs), thread_name_prefix="calmind-report")
+        self._running: Dict[Tuple[str, Optional[str]], Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_config: UserConfig, source_name: Optional[str] = None) -> Future:
+        key = (user_config.name, source_name)
+        with self._lock:
+            future = self._running.get(key)
+            started = future is None
+            if started:
+                future = self._running[key] = self._executor.submit(self.calmind_app.run_for_user, user_config, source_name)
+        metrics.REPORT_REQUESTS.inc(result="started" if started else "joined")
+        if started:
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logger.info(f"Report for {user_config.name} is already running. Waiting for it.")
+        return future
+
+    def run(self, user_config: UserConfig, source_name: Optional[str] = None) -> str:
+        return self.submit(user_config, source_name).result()
+
+    def _forget(self, key, future: Future):
+        with self._lock:
+            if self._running.get(key) is future:
+                del self._running[key]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+_calmind_app: Optional[CalMindApp] = None
+_report_runner: Optional[ReportRunner] = None
+_startup_lock = threading.Lock()
+
+def get_calmind_app() -> CalMindApp:
+    """
+    The CalMindApp shared by all requests, with its LLM, email and source clients. It is created on first
+    use rather than on import, so the server starts quickly and worker processes don't build unused clients.
+    """
+    global _calmind_app, _report_runner
+    if _calmind_app is None:
+        with _startup_lock:
+            if _calmind_app is None:
+                calmind_app = CalMindApp(CONFIG_PATH)
+                calmind_app._initialize_llm()
+                calmind_app._initialize_email_sender()
+                _report_runner = ReportRunner(calmind_app, calmind_app.config.get_webapp_config().max_concurrent_runs)
+                _calmind_app = calmind_app
+    return _calmind_app
+
+def get_report_runner() -> ReportRunner:
+    get_calmind_app()
+    return _report_runner
+
+def shutdown():
+    """Waits for running reports, pending report writes and queued emails, if the app was started."""
+    global _calmind_app, _report_runner
+    with _startup_lock:
+        calmind_app, runner = _calmind_app, _report_runner
+        _calmind_app = _report_runner = None
+    if calmind_app is None:
+        return
+    runner.close()
+    calmind_app.report_generator.close()
+    calmind_app._drain_outbox()
+
+def find_user(user_name: Optional[str]) -> Optional[UserConfig]:
+    return next((u for u in get_calmind_app().config.get_users_config() if u.name == user_name), None)
 
-# Initialize CalMindApp
-calmind_app_instance = CalMindApp()
-calmind_app_instance._initialize_llm()
-calmind_app_instance._initialize_email_sender()
+def report_result(user_config: UserConfig, source_name: Optional[str], result: str) -> dict:
+    return {"user": user_config.name, "source": source_name, "status": get_calmind_app().result_status(user_config.name, result),
+            "report": result}
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    config = Config()
-    users_config = config.get_users_config()
-    users = [user.model_dump() for user in users_config]
+    calmind_app = get_calmind_app()
+    users = [user.model_dump(mode='json') for user in calmind_app.config.get_users_config()]
     report_content = None
+    profile_files = None
 
     if request.method == 'POST':
-        user_name = request.form.get('user')
         source_name = request.form.get('source')
-        user_to_run = next((u for u in users_config if u.name == user_name), None)
+        user_to_run = find_user(request.form.get('user'))
 
         if user_to_run:
-            report_content = calmind_app_instance.run_for_user(user_to_run, source_name)
+            if _profiling_requested():
+                # Profiled in this thread, with all stages on it, since the profiler only sees the calling thread.
+                report_content, profile_files = calmind_app.profile_for_user(user_to_run, PROFILE_DIR, source_name, stage="webapp_index")
+            else:
+                report_content = get_report_runner().run(user_to_run, source_name)
+
+    past_reports = []
+    if calmind_app.report_generator.store:
+        past_reports = [r.to_dict() for r in calmind_app.report_generator.store.list_reports(fmt='html', limit=20)]
+
+    response = make_response(render_template('index.html', users=users, report_content=report_content, past_reports=past_reports))
+    if profile_files:
+        response.headers['X-CalMind-Profile'] = f"{profile_files['pstats']}, {profile_files['collapsed']}"
+    return response
+
+def _profiling_requested() -> bool:
+    """Profiling is opt-in per request via the X-CalMind-Profile header or the ?profile=1 query parameter."""
+    value = request.headers.get('X-CalMind-Profile') or request.args.get('profile')
+    return value is not None and value.lower() in ('1', 'true', 'yes')
+
+@app.route('/reports/run', methods=['POST'])
+def run_report():
+    """Runs the report of ?user= (optionally only ?source=) and returns it as JSON; parameters may also be form or JSON fields."""
+    values = dict(request.values.items())
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        values.update(body)
+    user_config = find_user(values.get('user'))
+    if not user_config:
+        abort(404)
+    result = get_report_runner().run(user_config, values.get('source'))
+    return jsonify(report_result(user_config, values.get('source'), result))
+
+@app.route('/reports', methods=['GET'])
+def list_reports():
+    store = get_calmind_app().report_generator.store
+    if not store:
+        return jsonify([])
+    reports = store.list_reports(
+        user_name=request.args.get('user'),
+        fmt=request.args.get('format'),
+        limit=request.args.get('limit', default=50, type=int),
+    )
+    return jsonify([r.to_dict() for r in reports])
+
+@app.route('/reports/<int:report_id>', methods=['GET'])
+def get_report(report_id):
+    store = get_calmind_app().report_generator.store
+    report = store.get_report(report_id) if store else None
+    if not report:
+        abort(404)
+    try:
+        content = store.read_report(report)
+    except FileNotFoundError:
+        abort(404)
+    mimetype = 'text/html' if report.format == 'html' else 'text/markdown'
+    return Response(content, mimetype=mimetype)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+def _event_query_user():
+    """The user named by ?user= and their timezone (?tz= overrides the schedule's); aborts when unusable."""
+    store = get_calmind_app().event_store
+    user_name = request.args.get('user')
+    if not store or not user_name:
+        abort(404 if not store else 400)
+    user_config = find_user(user_name)
+    timezone = request.args.get('tz') or (user_config.schedule.timezone if user_config else "UTC")
+    try:
+        return store, user_name, pytz.timezone(timezone)
+    except pytz.UnknownTimeZoneError:
+        abort(400)
+
+def _parse_day(value: str, tz) -> date:
+    """An ISO date, 'today', 'tomorrow' or a weekday name (its next occurrence, today included)."""
+    today = datetime.now(tz).date()
+    value = value.strip().lower()
+    if value == 'today':
+        return today
+    if value == 'tomorrow':
+        return today + timedelta(days=1)
+    if value in WEEKDAYS:
+        return today + timedelta(days=(WEEKDAYS.index(value) - today.weekday()) % 7)
+    return date.fromisoformat(value)
+
+def _parse_time(value, tz):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else tz.localize(parsed)
+
+@app.route('/events', methods=['GET'])
+def list_events():
+    """Stored events of ?user= on ?date= (ISO date, today, tomorrow or a weekday) or between ?start= and ?end=."""
+    store, user_name, tz = _event_query_user()
+    limit = request.args.get('limit', default=500, type=int)
+    try:
+        if request.args.get('date'):
+            events = store.events_on(user_name, _parse_day(request.args['date'], tz), tz.zone, limit)
+        else:
+            start = _parse_time(request.args.get('start'), tz) or datetime.now(tz)
+            end = _parse_time(request.args.get('end'), tz) or start + timedelta(days=7)
+            events = store.events_between(user_name, start, end, limit)
+    except ValueError:
+        abort(400)
+    return jsonify([event.to_dict() for event in events])
+
+@app.route('/events/search', methods=['GET'])
+def search_events():
+    """Stored events of ?user= mentioning all words of ?q= in their title, location or description, optionally between ?start= and ?end=."""
+    store, user_name, tz = _event_query_user()
+    try:
+        start, end = _parse_time(request.args.get('start'), tz), _parse_time(request.args.get('end'), tz)
+    except ValueError:
+        abort(400)
+    events = store.search(user_name, request.args.get('q', ''), start, end, request.args.get('limit', default=100, type=int))
+    return jsonify([event.to_dict() for event in events])
 
-    return render_template('index.html', users=users, report_content=report_content)
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True)
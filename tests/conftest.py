@@ -0,0 +1,22 @@
+import pytest
+
+from benchmarks.e2e.datagen import generate_dataset
+from benchmarks.e2e.servers import FakeCalDAVServer, FakeGoogleCalendarServer, FakeLLMServer, FakeTrelloServer, SMTPSink
+
+
+@pytest.fixture
+def stand_ins():
+    """A one-user synthetic dataset and the local stand-in servers serving it, as (dataset, servers)."""
+    dataset = generate_dataset(1, 10, 0.2, 2, 3, 14, 7)
+    servers = {
+        "google": FakeGoogleCalendarServer(dataset).start(),
+        "caldav": FakeCalDAVServer(dataset).start(),
+        "trello": FakeTrelloServer(dataset).start(),
+        "llm": FakeLLMServer(dataset).start(),
+        "smtp": SMTPSink().start(),
+    }
+    try:
+        yield dataset, servers
+    finally:
+        for server in servers.values():
+            server.stop()
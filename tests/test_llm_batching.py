@@ -0,0 +1,76 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from calmind.config import LLMBatchConfig
+from calmind.llm.batching import PromptBatcher
+
+MAX_WAIT_SECONDS = 5.0
+
+
+class FakeLLMClient:
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, context="", generation_config=None):
+        with self._lock:
+            self.requests.append(prompt)
+        if generation_config is None:
+            return f"answer to {prompt}"
+        ids = re.findall(r'<request id="(\d+)">', prompt)
+        return json.dumps({"responses": [{"id": request_id, "text": f"packed answer {request_id}"} for request_id in ids]})
+
+
+def make_batcher():
+    client = FakeLLMClient()
+    return client, PromptBatcher(client, LLMBatchConfig(enabled=True, max_wait_seconds=MAX_WAIT_SECONDS))
+
+
+def test_only_run_in_flight_is_sent_without_waiting():
+    client, batcher = make_batcher()
+    started = time.perf_counter()
+    with batcher.run_in_flight():
+        answer = batcher.generate_content("summarize ada", "instructions")
+    assert time.perf_counter() - started < MAX_WAIT_SECONDS / 2
+    assert answer == "answer to summarize ada"
+    assert client.requests == ["summarize ada"]
+
+
+def test_pack_is_sent_once_every_run_in_flight_has_joined():
+    client, batcher = make_batcher()
+    both_in_flight = threading.Barrier(2)
+
+    def run(name):
+        with batcher.run_in_flight():
+            both_in_flight.wait()
+            return batcher.generate_content(f"summarize {name}", "instructions")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        answers = list(executor.map(run, ("ada", "bob")))
+    assert time.perf_counter() - started < MAX_WAIT_SECONDS / 2
+    assert sorted(answers) == ["packed answer 1", "packed answer 2"]
+    assert len(client.requests) == 1
+
+
+def test_pack_stops_waiting_when_the_other_run_finishes():
+    client, batcher = make_batcher()
+    other_in_flight = threading.Event()
+
+    def run_without_prompts():
+        with batcher.run_in_flight():
+            other_in_flight.set()
+            time.sleep(0.2)
+
+    with ThreadPoolExecutor(max_workers=1) as executor, batcher.run_in_flight():
+        other = executor.submit(run_without_prompts)
+        other_in_flight.wait()
+        started = time.perf_counter()
+        answer = batcher.generate_content("summarize ada", "instructions")
+        other.result()
+    assert time.perf_counter() - started < MAX_WAIT_SECONDS / 2
+    assert answer == "answer to summarize ada"
+    assert client.requests == ["summarize ada"]
@@ -0,0 +1,45 @@
+import signal
+import threading
+from datetime import datetime, timedelta
+
+import pytz
+
+from calmind.config import SchedulerConfig, UserConfig
+from calmind.scheduling.scheduler import ReportScheduler
+
+
+class FakeApp:
+    def __init__(self, users):
+        self.users = users
+        self.next_event_starts = {}
+        self.runs = []
+        self.config = self
+
+    def get_users_config(self):
+        return self.users
+
+    def apply_retention(self):
+        pass
+
+    def run_for_user(self, user_config):
+        self.runs.append(user_config.name)
+
+
+def test_zero_rate_limit_holds_runs_without_failing(monkeypatch):
+    monkeypatch.setattr(signal, "signal", lambda *_args: None)
+    users = [UserConfig(name=name, report_to_email=f"{name}@example.com") for name in ("ada", "bob")]
+    app = FakeApp(users)
+    scheduler = ReportScheduler(app, SchedulerConfig(poll_interval_seconds=1, rate_limits={"smtp": 0}))
+    due_at = datetime.now(pytz.utc) - timedelta(minutes=1)
+    scheduler.next_run_at = {user.name: due_at for user in users}
+
+    stopper = threading.Timer(0.5, scheduler.stop)
+    stopper.start()
+    try:
+        scheduler.run_forever()
+    finally:
+        stopper.cancel()
+
+    # The bucket starts full, so one run goes out and the other waits for a refill that never comes.
+    assert len(app.runs) == 1
+    assert scheduler.dispatch_next({user.name: user for user in users}) == 1
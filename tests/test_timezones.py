@@ -0,0 +1,27 @@
+import yaml
+
+from benchmarks.e2e.harness import write_config
+from calmind.main import CalMindApp
+
+
+def test_unknown_timezone_falls_back_to_utc(stand_ins, tmp_path):
+    dataset, servers = stand_ins
+    config_path = write_config(str(tmp_path), dataset, servers)
+    with open(config_path, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config["users"][0]["schedule"] = {"timezone": "Europe/Berln"}
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+
+    app = CalMindApp(config_path)
+    try:
+        user_config = app.config.get_users_config()[0]
+        assert user_config.schedule.timezone == "UTC"
+        app.initialize_services()
+        report = app.run_for_user(user_config)
+        app._drain_outbox()
+    finally:
+        if app.email_delivery:
+            app.email_delivery.stop()
+    assert "Schedule at a Glance" in report
+    assert len(servers["smtp"].messages) == 1
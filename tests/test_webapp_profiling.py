@@ -0,0 +1,33 @@
+import pstats
+
+import pytest
+
+from benchmarks.e2e.harness import write_config
+from calmind import webapp
+
+PIPELINE_FUNCTIONS = ("iter_events", "_fetch_sources", "summarize_events", "summarize_cards", "render_html_report")
+
+
+@pytest.fixture
+def profiled_webapp(stand_ins, tmp_path, monkeypatch):
+    dataset, servers = stand_ins
+    monkeypatch.setattr(webapp, "CONFIG_PATH", write_config(str(tmp_path), dataset, servers))
+    monkeypatch.setattr(webapp, "PROFILE_DIR", str(tmp_path / "profiles"))
+    try:
+        yield webapp.app.test_client(), dataset.users[0].name
+    finally:
+        webapp.shutdown()
+
+
+def test_profiled_request_sees_pipeline_stages(profiled_webapp):
+    client, user_name = profiled_webapp
+    response = client.post("/?profile=1", data={"user": user_name})
+
+    assert response.status_code == 200
+    pstats_path, collapsed_path = response.headers["X-CalMind-Profile"].split(", ")
+    profiled = {function for _, _, function in pstats.Stats(pstats_path).stats}
+    with open(collapsed_path, encoding="utf-8") as f:
+        stacks = f.read()
+    for function in PIPELINE_FUNCTIONS:
+        assert function in profiled
+    assert any(function in stacks for function in PIPELINE_FUNCTIONS) # Sampled, so short stages may be missing